@@ -5,6 +5,8 @@ from beagles.backend.darknet.convolution import *
 from beagles.backend.darknet.connected import *
 from beagles.backend.darknet.rnn import *
 from beagles.backend.io.config_parser import ConfigParser
+from beagles.backend.io.darknet_weights_file import DarknetWeightsFile
+from beagles.base import Timer
 from beagles.io.flags import SharedFlagIO
 from beagles.base.constants import CFG_EXT, WGT_EXT
 
@@ -96,6 +98,16 @@ class route_layer(Layer):
         pass
 
 
+# noinspection PyAttributeOutsideInit
+class yolo_layer(Layer):
+    def setup(self, mask):
+        self.mask = mask
+
+    def finalize(self, *args):
+        """Not Implemented"""
+        pass
+
+
 # noinspection PyAttributeOutsideInit
 class reorg_layer(Layer):
     def setup(self, stride):
@@ -120,6 +132,7 @@ darkops = {
     'select': select_layer,
     'route': route_layer,
     'reorg': reorg_layer,
+    'yolo': yolo_layer,
     'conv-select': conv_select_layer,
     'conv-extract': conv_extract_layer,
     'extract': extract_layer,
@@ -156,6 +169,8 @@ darkops = {
 
          'reorg': :obj:`beagles.backend.darknet.reorg_layer`
 
+         'yolo': :obj:`beagles.backend.darknet.yolo_layer`
+
          'conv-select': :obj:`beagles.backend.darknet.conv_select_layer`
 
          'conv-extract': :obj:`beagles.backend.darknet.conv_extract_layer`
@@ -189,6 +204,8 @@ class Darknet(object):
         self.io.logger.info('Parsing {}'.format(self.src_cfg))
         src_parsed = self.create_ops()
         self.meta, self.layers = src_parsed
+        if self.src_bin is not None:
+            self.load_weights()
 
     def get_weight_src(self, flags):
         """
@@ -196,8 +213,8 @@ class Darknet(object):
         source binary and what is its config.
         can be: None, flags.model, or some other
         """
-        self.src_bin = flags.model + WGT_EXT
-        self.src_bin = flags.binary + self.src_bin
+        model = os.path.splitext(os.path.basename(flags.model))[0]
+        self.src_bin = os.path.join(flags.binary, model + WGT_EXT)
         self.src_bin = os.path.abspath(self.src_bin)
         exist = os.path.isfile(self.src_bin)
 
@@ -234,6 +251,16 @@ class Darknet(object):
         if ext == 'weights':
             return file_name
 
+    def load_weights(self):
+        """
+        Reads `src_bin` into the layers, the views it leaves in each layer's `w`
+        become the initial values of the matching :obj:`Net` variables.
+        """
+        self.io.logger.info(f'Loading {self.src_bin} ...')
+        with Timer() as t:
+            loaded = DarknetWeightsFile(self.src_bin).load(self.layers)
+        self.io.logger.info(f'Loaded {loaded} layers in {t.elapsed_secs:.2f}s')
+
     def create_ops(self):
         """
         return a list of `layers` objects (darkop.py)
@@ -300,6 +327,9 @@ route_layer = route_layer
 reorg_layer = reorg_layer
 """:class:`reorg_layer`"""
 
+yolo_layer = yolo_layer
+""":class:`yolo_layer`"""
+
 conv_select_layer = conv_select_layer
 """:class:`conv_select_layer`"""
 
@@ -21,6 +21,9 @@ CONNECTED = 'connected'
 TYPE = 'type'
 INP_SIZE = 'inp_size'
 OUT_SIZE = 'out_size'
+HEADS = 'heads'
+YOLO = '[yolo]'
+MASK = 'mask'
 KEEP = 'keep'
 BINS = 'bins'
 LINEAR = 'linear'
@@ -67,10 +70,15 @@ class ConfigParser(SubsystemPrototype):
             layer_handler = cls.get_register().get(_fix_name(section[TYPE]))
             handler = layer_handler(cls.create_key, cls)
             try:
+                # only the first op of a section is kept, a [convolutional] applies its own activation
                 yield [layer for layer in handler(section, i)][0]
             except TypeError:
                 raise TypeError('Layer {} not implemented'.format(section[TYPE]))
             section['_size'] = list([cls.h, cls.w, cls.c, cls.l, cls.flat])
+        if cls.metadata.get(TYPE) == YOLO:
+            # the last [yolo] section is only tokenized as metadata but is still a detection head
+            handler = cls.get_register().get(_fix_name(YOLO))(cls.create_key, cls)
+            yield [layer for layer in handler(cls.metadata, len(cls.layers))][0]
         if not cls.flat:
             cls.metadata[OUT_SIZE] = [cls.h, cls.w, cls.c]
         else:
@@ -380,8 +388,23 @@ class Upsample(DarknetConfigLayer):
         w = p.w * stride
         h = p.h * stride
         yield [self.layer_name, i, stride, h, w]
+        p.w, p.h = w, h
         p.l = p.w * p.h * p.c
 
+@register_subsystem('yolo', ConfigParser)
+class Yolo(DarknetConfigLayer):
+    constructor = DarknetConfigLayer.constructor
+
+    def __call__(self, section, i):
+        p = self.parser
+        mask = _list_keep(str(section[MASK]))
+        assert p.c == len(mask) * (section['classes'] + 5), \
+            'Layer {} input has {} channels, expected {}'.format(
+                section[TYPE], p.c, len(mask) * (section['classes'] + 5))
+        # each head is recorded as (grid height, grid width, anchor mask) for decoding
+        p.metadata.setdefault(HEADS, list()).append([p.h, p.w, mask])
+        yield [self.layer_name, i, mask]
+
 @register_subsystem(token='reorg', prototype=ConfigParser)
 class Reorg(DarknetConfigLayer):
     constructor = DarknetConfigLayer.constructor
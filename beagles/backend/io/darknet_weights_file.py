@@ -0,0 +1,58 @@
+import os
+import numpy as np
+from beagles.base.constants import WEIGHTS_FILE_KEYS
+
+
+class DarknetWeightsFile:
+    """Reads a darknet .weights file into darknet layers as zero-copy views of one memory map"""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        major, minor, revision = np.memmap(path, shape=(3,), mode='r', dtype=np.int32)
+        # darknet 0.2 and later store the seen image count as 64 bits
+        header = 20 if major * 10 + minor >= 2 and major < 1000 and minor < 1000 else 16
+        self.transpose = major > 1000 or minor > 1000
+        self.data = np.memmap(path, mode='r', dtype=np.float32, offset=header)
+        self.offset = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def eof(self):
+        return self.offset == len(self.data)
+
+    def walk(self, size):
+        """Returns a view of the next `size` floats"""
+        end_point = self.offset + size
+        assert end_point <= len(self.data), f'Over-read {self.path}'
+        view = self.data[self.offset:end_point]
+        self.offset = end_point
+        return view
+
+    def load(self, layers):
+        """
+        Fills the `w` of every layer in :data:`WEIGHTS_FILE_KEYS` in file order and
+        applies its `finalize` transposes. Layers past the end of a partial
+        (.conv.N) file are left as they are.
+
+        Returns:
+            number of layers loaded
+        """
+        loaded = 0
+        for layer in layers:
+            order = WEIGHTS_FILE_KEYS.get(layer.type)
+            if order is None:
+                continue
+            if self.eof:
+                break
+            for par in order:
+                if par not in layer.wshape:
+                    continue
+                layer.w[par] = self.walk(layer.wsize[par])
+            layer.finalize(self.transpose)
+            loaded += 1
+        else:
+            assert self.eof, f'expect {4 * self.offset} bytes of weights, found {4 * len(self.data)}'
+        return loaded
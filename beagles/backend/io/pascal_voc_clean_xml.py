@@ -1,56 +1,159 @@
 import sys
 import os
+import math
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import defusedxml.ElementTree as ET
-import glob
+import numpy as np
+from beagles.base.constants import XML_EXT
 from beagles.io.flags import SharedFlagIO
 
+ANNOTATION_INDEX = '.annotations.npz'
+CHUNKS_PER_WORKER = 4
+
+
+def parse_annotation(path):
+    """Parses a single PASCAL VOC XML annotation.
+
+    Args:
+        path: Path to the XML file.
+
+    Returns:
+        (filename, width, height, [[name, xmin, ymin, xmax, ymax], ...]) for every object
+    """
+    with open(path) as in_file:
+        tree = ET.parse(in_file)
+    root = tree.getroot()
+    jpg = str(root.find('filename').text)
+    imsize = root.find('size')
+    w = int(imsize.find('width').text)
+    h = int(imsize.find('height').text)
+    objects = list()
+    for obj in root.iter('object'):
+        name = obj.find('name').text
+        xmlbox = obj.find('bndbox')
+        xn = int(float(xmlbox.find('xmin').text))
+        xx = int(float(xmlbox.find('xmax').text))
+        yn = int(float(xmlbox.find('ymin').text))
+        yx = int(float(xmlbox.find('ymax').text))
+        objects.append([name, xn, yn, xx, yx])
+    return jpg, w, h, objects
+
+
+def parse_annotations(paths):
+    """Parses a chunk of PASCAL VOC XML annotations with :func:`parse_annotation`.
+
+    Returns:
+        (list of parsed annotations, :obj:`collections.Counter` of object names in the chunk)
+    """
+    parsed = [parse_annotation(path) for path in paths]
+    return parsed, Counter(obj[0] for *_, objects in parsed for obj in objects)
+
+
+def parallel_parse(paths, workers):
+    """Spreads `paths` across `workers` processes in chunks, see :func:`parse_annotations`.
+    Workers are spawned, as forking a process already running TensorFlow and logging threads can deadlock.
+    """
+    workers = workers if workers > 0 else os.cpu_count()
+    size = max(1, math.ceil(len(paths) / (workers * CHUNKS_PER_WORKER)))
+    chunks = [paths[i:i + size] for i in range(0, len(paths), size)]
+    parsed, counts = list(), Counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for chunk, count in executor.map(parse_annotations, chunks):
+            parsed += chunk
+            counts.update(count)
+    return parsed, counts
+
+
+def list_annotations(annotation_dir):
+    """Returns {file name: (mtime_ns, size)} for every XML file in `annotation_dir`"""
+    stats = dict()
+    with os.scandir(annotation_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.name.endswith(XML_EXT):
+                continue
+            stat = entry.stat()
+            stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+
+def load_index(annotation_dir):
+    """Loads the annotation index stored in `annotation_dir`.
+
+    Returns:
+        {file name: ((mtime_ns, size), parsed annotation)} or an empty dict if there is no usable index
+    """
+    path = os.path.join(annotation_dir, ANNOTATION_INDEX)
+    try:
+        with np.load(path) as index:
+            files, stats, jpgs = index['files'], index['stats'], index['jpgs'].tolist()
+            dims, offsets = index['dims'].tolist(), index['offsets']
+            names, boxes = index['names'].tolist(), index['boxes'].tolist()
+    except (OSError, KeyError, ValueError):
+        return dict()
+    entries = dict()
+    for i, file in enumerate(files.tolist()):
+        start, stop = offsets[i], offsets[i + 1]
+        objects = [[name] + box for name, box in zip(names[start:stop], boxes[start:stop])]
+        entries[file] = (tuple(stats[i].tolist()), (jpgs[i], *dims[i], objects))
+    return entries
+
+
+def save_index(annotation_dir, entries):
+    """Atomically writes `entries` as returned by :func:`load_index` to `annotation_dir`"""
+    files = list(entries)
+    parsed = [entries[file][1] for file in files]
+    objects = [obj for _, _, _, objs in parsed for obj in objs]
+    index = {
+        'files': np.array(files, dtype=str),
+        'stats': np.array([entries[file][0] for file in files], dtype=np.int64).reshape(-1, 2),
+        'jpgs': np.array([jpg for jpg, *_ in parsed], dtype=str),
+        'dims': np.array([[w, h] for _, w, h, _ in parsed], dtype=np.int64).reshape(-1, 2),
+        'offsets': np.cumsum([0] + [len(objs) for *_, objs in parsed], dtype=np.int64),
+        'names': np.array([obj[0] for obj in objects], dtype=str),
+        'boxes': np.array([obj[1:] for obj in objects], dtype=np.int64).reshape(-1, 4)
+    }
+    path = os.path.join(annotation_dir, ANNOTATION_INDEX)
+    tmp = os.path.join(annotation_dir, f'.{os.getpid()}{ANNOTATION_INDEX}')
+    np.savez(tmp, **index)
+    os.replace(tmp, path)
+
 
 def pascal_voc_clean_xml(self, annotation_dir, pick, exclusive=False):
     self.logger.info(f'Parsing {os.path.join(annotation_dir,"*.xml")} for {pick} {"exclusively" * int(exclusive)}')
+    stats = list_annotations(annotation_dir)
+    cached = load_index(annotation_dir)
+    changed = [file for file, stat in stats.items() if cached.get(file, [None])[0] != stat]
+    paths = [os.path.join(annotation_dir, file) for file in changed]
+    workers = self.flags.workers
+    if workers != 1 and len(paths) > 1:
+        self.logger.info(f'Parsing {len(paths)} annotations with {workers if workers > 0 else os.cpu_count()} workers')
+        parsed, counts = parallel_parse(paths, workers)
+    else:
+        parsed, counts = parse_annotations(paths)
+    parsed = dict(zip(changed, parsed))
+    entries = dict()
+    for file, stat in stats.items():
+        entries[file] = (stat, parsed[file]) if file in parsed else cached[file]
+    self.logger.info(f'Parsed {len(parsed)} new or changed of {len(entries)} annotations')
+    if parsed or len(cached) != len(entries):
+        try:
+            save_index(annotation_dir, entries)
+        except OSError as e:
+            self.logger.warning(f'Unable to write annotation index: {e}')
+
     dumps = list()
-    cur_dir = os.getcwd()
-    os.chdir(annotation_dir)
-    annotations = glob.glob('*.xml')
-    size = len(annotations)
-
-    for i, file in enumerate(annotations):
-        with open(file) as in_file:
-            tree = ET.parse(in_file)
-            root = tree.getroot()
-            jpg = str(root.find('filename').text)
-            imsize = root.find('size')
-            w = int(imsize.find('width').text)
-            h = int(imsize.find('height').text)
-            all = list()
-
-            for obj in root.iter('object'):
-                # noinspection PyUnusedLocal
-                current = list()
-                name = obj.find('name').text
-                if name not in pick:
-                    continue
-
-                xmlbox = obj.find('bndbox')
-                xn = int(float(xmlbox.find('xmin').text))
-                xx = int(float(xmlbox.find('xmax').text))
-                yn = int(float(xmlbox.find('ymin').text))
-                yx = int(float(xmlbox.find('ymax').text))
-                current = [name, xn, yn, xx, yx]
-                all += [current]
-
-            add = [[jpg, [w, h, all]]]
-            dumps += add
-
-    # gather all stats
-    stat = dict()
-    for dump in dumps:
-        all = dump[1][2]
-        for current in all:
-            if current[0] in pick:
-                if current[0] in stat:
-                    stat[current[0]] += 1
-                else:
-                    stat[current[0]] = 1
+    for stat, (jpg, w, h, objects) in entries.values():
+        all = [current for current in objects if current[0] in pick]
+        add = [[jpg, [w, h, all]]]
+        dumps += add
+
+    # gather all stats, counts for unchanged files come from the index
+    for file, (_, annotation) in entries.items():
+        if file not in parsed:
+            counts.update(obj[0] for obj in annotation[3])
+    stat = {name: counts[name] for name in counts if name in pick}
     count = 0
     for i in stat:
         self.logger.info('{}: {}'.format(i, stat[i]))
@@ -65,5 +168,4 @@ def pascal_voc_clean_xml(self, annotation_dir, pick, exclusive=False):
         raise
     self.logger.info('Dataset size: {}'.format(len(dumps)))
 
-    os.chdir(cur_dir)
     return dumps, weights
@@ -4,17 +4,27 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 import sys
 import csv
 import math
+from queue import Queue
+from threading import Thread, Event
 from functools import partial
+from contextlib import contextmanager
+from time import perf_counter
 from multiprocessing.pool import ThreadPool
 import cv2
 import numpy as np
 import tensorflow as tf
 from beagles.base import GradientNaN, Timer
 from beagles.io import get_logger
+from beagles.io.logs import Throttle
+from beagles.io.metrics import METRICS, Profiler, summary_dir
 from beagles.io.flags import SharedFlagIO
+from beagles.io.progress import ProgressEvents
 from beagles.backend.darknet import Darknet
-from beagles.backend.net.ops import op_create
+from beagles.backend.io.config_parser import YOLO
+from beagles.backend.net.ops import op_create, fuse
+from beagles.backend.net.ops.convolution import Convolutional, LINEAR
 from beagles.backend.net.framework import Framework
+from beagles.backend.net.export import SavedGraph, export
 from beagles.backend.net.hyperparameters import cyclic_learning_rate as clr
 
 MOMENTUM = 'momentum'
@@ -26,6 +36,7 @@ ADAGRAD = 'adagrad'
 ADAM = 'adam'
 FTRL = 'ftrl'
 SGD = 'sgd'
+NAN_LOSS = 'Non-finite loss'
 
 MOMENTUM_USERS = [MOMENTUM, RMSPROP, NESTEROV]
 TRAINERS = {
@@ -53,13 +64,67 @@ class Net(tf.keras.Model):
             setattr(self, '_'.join([layer.lay.type, str(i)]), layer)
         self.step = step
         self.first = True
+        self.infer = self.forward
+        self.train_op = self.apply_step
+        self.jit_compile = False
+
+    def forward(self, x, training=False):
+        """Runs `x` through every layer, batch normalized with batch statistics when `training`.
+        Route and shortcut layers are also passed the outputs of the layers they
+        read from. Nets with detection heads return every head flattened and
+        concatenated, one row per image.
+        """
+        outputs, heads = dict(), list()
+        for layer in self.layers:
+            if layer.sources:
+                x = layer(x, training=training, routed=[outputs[number] for number in layer.sources])
+            else:
+                x = layer(x, training=training)
+            outputs[layer.lay.number] = x
+            if layer.head:
+                heads.append(tf.reshape(x, [tf.shape(x)[0], -1]))
+        return tf.concat(heads, 1) if heads else x
+
+    def build_inference(self, inp_size, jit_compile=False):
+        """Replaces :meth:`infer` with a :obj:`tf.function` of :meth:`forward` traced once
+        for float32 batches of `inp_size` inputs, optionally XLA compiled.
+        """
+        signature = [tf.TensorSpec([None, *inp_size], dtype=tf.float32, name='input')]
+        self.infer = tf.function(self.forward, input_signature=signature, jit_compile=jit_compile)
+        return self.infer
+
+    def optimize(self, inp_size):
+        """Returns a lean inference only :obj:`Net` of these layers passed through :func:`fuse`.
+        One batch of zeros builds any layers not yet built so restored weights are folded.
+        """
+        self.forward(tf.zeros([1, *inp_size]))
+        return Net(fuse(self.layers), self.step, dtype=tf.float32)
+
+    def apply_step(self, x, loss_feed, increment):
+        """Runs one optimization step on a batch and advances the step counter by `increment`.
+        A non-finite loss fails an assertion before any gradients are applied.
+        """
+        with tf.GradientTape() as tape:
+            loss = self.loss(self.forward(x, training=True), **loss_feed)
+        with tf.control_dependencies([tf.debugging.assert_all_finite(loss, NAN_LOSS)]):
+            variables = self.trainable_variables
+            gradients = tape.gradient(loss, variables)
+            self.optimizer.apply_gradients(zip(gradients, variables))
+            self.step.assign_add(increment)
+        return loss
+
+    def build_train_step(self, jit_compile=False):
+        """Replaces :attr:`train_op` with a :obj:`tf.function` of :meth:`apply_step`,
+        optionally XLA compiled. XLA drops the loss assertion so :meth:`call` checks the loss instead.
+        """
+        self.jit_compile = jit_compile
+        self.train_op = tf.function(self.apply_step, jit_compile=jit_compile, reduce_retracing=True)
+        return self.train_op
 
     def train_step(self, data):
         x, y = data
         with tf.GradientTape() as tape:
-            for layer in self.layers:
-                x = layer(x)
-            loss = self.loss(x, **y)
+            loss = self.loss(self.forward(x, training=True), **y)
         if not tf.math.is_finite(loss):
             raise GradientNaN
         variables = self.trainable_variables
@@ -68,26 +133,27 @@ class Net(tf.keras.Model):
         return loss
 
     def call(self, x, training=False, **loss_feed):
-        with tf.GradientTape() as t:
-            for layer in self.layers:
-                x = layer(x)
-            if training:
-                loss = self.loss(x, **loss_feed)
-                if not tf.math.is_finite(loss):
-                    raise GradientNaN
-                variables = self.trainable_variables
-                gradients = t.gradient(loss, variables)
-                self.optimizer.apply_gradients(zip(gradients, variables))
-                if not self.first:
-                    # just remembering weights on the first train step
-                    self.step.assign_add(1)
-                self.first = False
+        if not training:
+            return self.forward(x)
+        # just remembering weights on the first train step
+        increment = tf.constant(0 if self.first else 1, dtype=self.step.dtype)
+        try:
+            loss = self.train_op(x, loss_feed, increment)
+        except tf.errors.InvalidArgumentError as e:
+            if NAN_LOSS not in e.message:
+                raise
+            raise GradientNaN from e
+        if self.jit_compile and not tf.math.is_finite(loss):
+            raise GradientNaN
+        self.first = False
+        return loss
 
-        return loss if training else x
 
 class NetBuilder(tf.Module):
     """Initializes with flags that build a Darknet or with a prebuilt Darknet.
     Constructs the actual :obj:`Net` object upon being called.
+    With `flags.prebuilt` set outside training, the latest export of the model
+    is loaded as a :obj:`SavedGraph` instead and the cfg is not parsed.
 
     """
     def __init__(self, flags, darknet=None):
@@ -97,28 +163,71 @@ class NetBuilder(tf.Module):
         self.flags = self.io.read_flags() if self.io.read_flags() is not None else flags
         self.io_flags = self.io.io_flags
         self.logger = get_logger()
-        self.darknet = Darknet(flags) if darknet is None else darknet
+        self.graph = None
+        self.started = perf_counter()
+        if darknet is None and self.flags.prebuilt and not self.flags.train and SavedGraph.exists(self.flags):
+            with self.phase('Loading prebuilt graph'):
+                self.graph = SavedGraph(self.flags)
+            self.logger.info(f'Loaded prebuilt graph {self.graph.path}')
+            self.darknet, self.meta = None, self.graph.meta
+            self.num_layer = self.ntrain = 0
+            return
+        with self.phase('Parsing cfg'):
+            self.darknet = Darknet(flags) if darknet is None else darknet
         self.num_layer = self.ntrain = len(self.darknet.layers) or 0
         self.meta = self.darknet.meta
 
+    @contextmanager
+    def phase(self, name):
+        """Logs how long the body of the with statement took as the startup phase `name`"""
+        with Timer() as t:
+            yield
+        self.logger.info(f'{name} took {t.elapsed_secs:.3f}s')
+
     def __call__(self):
+        """Builds the :obj:`Net`, its :obj:`Framework` and checkpoint manager.
+        Outside training the annotations are not parsed and no optimizer is built.
+        """
+        if self.graph is not None:
+            with self.phase('Creating framework'):
+                framework = Framework.create(self.meta, self.flags)
+            self.log_startup()
+            return self.graph, framework, None
         self.global_step = tf.Variable(0, trainable=False)
-        framework = Framework.create(self.darknet.meta, self.flags)
-        self.annotation_data, self.class_weights = framework.parse()
-        optimizer = self.build_optimizer()
-        layers = self.compile_darknet()
-        net = Net(layers, self.global_step, dtype=tf.float32)
-        ckpt_kwargs = {'net': net, 'optimizer': optimizer}
-        self.checkpoint = tf.train.Checkpoint(**ckpt_kwargs)
+        with self.phase('Creating framework'):
+            framework = Framework.create(self.darknet.meta, self.flags)
+        self.annotation_data, self.class_weights, optimizer = None, None, None
+        ckpt_kwargs = dict()
+        if self.flags.train:
+            with self.phase('Parsing annotations'):
+                self.annotation_data, self.class_weights = framework.parse()
+            optimizer = self.build_optimizer()
+            ckpt_kwargs.update(optimizer=optimizer)
+        with self.phase('Building layers'):
+            layers = self.compile_darknet()
+            net = Net(layers, self.global_step, dtype=tf.float32)
+        self.checkpoint = tf.train.Checkpoint(net=net, **ckpt_kwargs)
         name = f"{self.meta['name']}"
         manager = tf.train.CheckpointManager(self.checkpoint, self.flags.backup,
                                              self.flags.keep, checkpoint_name=name)
         # try to load a checkpoint from flags.load
-        self.load_checkpoint(manager)
+        with self.phase('Restoring weights'):
+            self.load_checkpoint(manager)
         self.logger.info('Compiling Net...')
-        net.compile(loss=framework.loss, optimizer=optimizer)
+        with self.phase('Compiling'):
+            if self.flags.fuse and not self.flags.train:
+                self.logger.info('Folding batch norm and dropping identity ops for inference')
+                net = net.optimize(self.meta['inp_size'])
+            net.build_inference(self.meta['inp_size'], jit_compile=self.flags.xla)
+            if self.flags.train:
+                net.compile(loss=framework.loss, optimizer=optimizer)
+                net.build_train_step(jit_compile=self.flags.xla)
+        self.log_startup()
         return net, framework, manager
 
+    def log_startup(self):
+        self.logger.info(f'Started up in {perf_counter() - self.started:.3f}s')
+
     def build_optimizer(self):
         # setup kwargs for trainer
         kwargs = dict()
@@ -144,30 +253,43 @@ class NetBuilder(tf.Module):
         return TRAINERS[self.flags.trainer](learning_rate=lambda: clr(**clr_kwargs), **kwargs)
 
     def compile_darknet(self):
+        """Creates the ops of the darknet layers. Convolutions stay linear, as checkpoints of
+        YOLOv1 and YOLOv2 nets were trained, unless `flags.activations` is set or the net is a YOLOv3.
+        """
         layers = list()
         roof = self.num_layer - self.ntrain
         prev = None
+        linear = not (self.flags.activations or self.meta.get('type') == YOLO)
         for i, layer in enumerate(self.darknet.layers):
             layer = op_create(layer, prev, i, roof)
+            if linear and isinstance(layer, Convolutional):
+                layer.activation = LINEAR
             layers.append(layer)
             prev = layer
         return layers
 
     def load_checkpoint(self, manager):
+        """Restores the checkpoint chosen by `flags.load`. Outside training the optimizer
+        slots of a training checkpoint are expected to stay unmatched.
+        """
         if isinstance(self.flags.load, str):
             checkpoint = [i for i in manager.checkpoints if self.flags.load in i]
             assert len(checkpoint) == 1
-            self.checkpoint.restore(checkpoint)
-            self.logger.info(f"Restored from {checkpoint}")
+            path = checkpoint[0]
         elif self.flags.load < 0:
-            self.checkpoint.restore(manager.latest_checkpoint)
-            self.logger.info(f"Restored from {manager.latest_checkpoint}")
+            path = manager.latest_checkpoint
         elif self.flags.load >= 1:
-            idx = self.flags.load - 1
-            self.checkpoint.restore(manager.checkpoints[idx])
-            self.logger.info(f"Restored from {manager.checkpoints[idx]}")
+            path = manager.checkpoints[self.flags.load - 1]
+        elif self.darknet.src_bin is not None:
+            self.logger.info(f"Initializing network weights from {self.darknet.src_bin}")
+            return
         else:
             self.logger.info("Initializing network weights from scratch.")
+            return
+        status = self.checkpoint.restore(path)
+        if not self.flags.train:
+            status.expect_partial()
+        self.logger.info(f"Restored from {path}")
 
 
 def train(data, class_weights, flags, net: Net, framework: Framework, manager: tf.train.CheckpointManager):
@@ -176,24 +298,41 @@ def train(data, class_weights, flags, net: Net, framework: Framework, manager: t
     flags = io.read_flags() if io.read_flags() is not None else flags
     log.info('Building {} train op'.format(flags.model))
     goal = len(data) * flags.epoch
+    throttle = Throttle(flags.log_steps, flags.log_seconds)
+    summarize = Throttle(flags.summary_steps, flags.summary_seconds)
+    logdir = summary_dir(flags)
+    profiler = Profiler(flags.profile, logdir, flags.profile_start, flags.profile_steps)
     first = True
-    for i, (x_batch, loss_feed) in enumerate(framework.shuffle(data, class_weights)):
-        loss = net(x_batch, training=True, **loss_feed)
-        step = net.step.numpy()
-        lr = net.optimizer.learning_rate.numpy()
-        line = 'step: {} loss: {:f} lr: {:.2e} progress: {:.2f}%'
-        if not first:
-            flags.progress = i * flags.batch / goal * 100
-            log.info(line.format(step, loss, lr, flags.progress))
-        else:
-            log.info(f"Following gradient from step {step}...")
-        io.send_flags()
-        flags = io.read_flags()
-        ckpt = bool(not step % flags.save)
-        if ckpt and not first:
-            save = manager.save()
-            log.info(f"Saved checkpoint: {save}")
-        first = False
+    batches = framework.dataset if flags.pipeline else framework.shuffle
+    with ProgressEvents(flags.events) as events:
+        for i, (x_batch, loss_feed) in enumerate(METRICS.timed_iter('data', batches(data, class_weights))):
+            profiler.step()
+            # forward, backward and the optimizer update run as one graph
+            with METRICS.timed('train_step'):
+                loss = net(x_batch, training=True, **loss_feed)
+                step = net.step.numpy()
+            METRICS.counter('steps').inc()
+            METRICS.counter('images').inc(len(x_batch))
+            lr = net.optimizer.learning_rate.numpy()
+            line = 'step: {} loss: {:f} lr: {:.2e} progress: {:.2f}%'
+            if not first:
+                flags.progress = i * flags.batch / goal * 100
+                if throttle():
+                    log.info(line.format(step, loss, lr, flags.progress))
+                if summarize():
+                    METRICS.write_tensorboard(logdir, int(step))
+                events.progress('step', i * flags.batch, goal, step=int(step), loss=float(loss), lr=float(lr))
+            else:
+                log.info(f"Following gradient from step {step}...")
+            io.send_flags()
+            flags = io.read_flags()
+            ckpt = bool(not step % flags.save)
+            if ckpt and not first:
+                save = manager.save()
+                log.info(f"Saved checkpoint: {save}")
+            first = False
+    profiler.stop()
+    METRICS.write_tensorboard(logdir, int(step), flush=True)
     if not ckpt:
         save = manager.save()
         log.info(f"Finished training at checkpoint: {save}")
@@ -208,59 +347,158 @@ def predict(flags, net: Net, framework: Framework):
         raise FileNotFoundError(f'Failed to find any images in {flags.imgdir}')
     batch = min(flags.batch, len(all_inps))
     n_batch = int(math.ceil(len(all_inps) / batch))
-    for j in range(n_batch):
-        start = j * batch
-        stop = min(start + batch, len(all_inps))
-        this_batch = all_inps[start:stop]
-        img_path = partial(os.path.join, flags.imgdir)
-        log.info(f'Preprocessing {batch} inputs...')
-        with Timer() as t:
-            x = pool.map(lambda inp: framework.preprocess(img_path(inp)), this_batch)
-        log.info(f'Done! ({batch/t.elapsed_secs:.2f} inputs/s)')
-        log.info(f'Forwarding {batch} inputs...')
-        with Timer() as t:
-            x = [np.concatenate(net(np.expand_dims(i, 0)), 0) for i in x]
-        log.info(f'Done! ({batch/t.elapsed_secs:.2f} inputs/s)')
-        log.info(f'Postprocessing {batch} inputs...')
-        with Timer() as t:
-            postprocess = lambda i, pred: framework.postprocess(pred, img_path(this_batch[i]))
-            pool.map(lambda p: postprocess(*p), enumerate(x))
-        log.info(f'Done! ({batch/t.elapsed_secs:.2f} inputs/s)')
+    logdir = summary_dir(flags)
+    profiler = Profiler(flags.profile, logdir, flags.profile_start, flags.profile_steps)
+    # a partial final batch is zero padded so every forward pass has the same shape
+    inputs = np.zeros([batch] + list(framework.meta['inp_size']), dtype=np.float32)
+    with ProgressEvents(flags.events) as events:
+        for j in range(n_batch):
+            profiler.step()
+            start = j * batch
+            stop = min(start + batch, len(all_inps))
+            this_batch = all_inps[start:stop]
+            img_path = partial(os.path.join, flags.imgdir)
+            log.info(f'Preprocessing {batch} inputs...')
+            with Timer() as t:
+                x = pool.map(lambda inp: framework.preprocess(img_path(inp)), this_batch)
+            log.info(f'Done! ({batch/t.elapsed_secs:.2f} inputs/s)')
+            log.info(f'Forwarding {batch} inputs...')
+            with Timer() as t, METRICS.timed('forward'):
+                inputs[:len(x)] = x
+                inputs[len(x):] = 0.
+                x = np.asarray(net.infer(inputs))[:len(x)]
+            log.info(f'Done! ({batch/t.elapsed_secs:.2f} inputs/s)')
+            log.info(f'Postprocessing {batch} inputs...')
+            with Timer() as t:
+                postprocess = lambda i, pred: framework.postprocess(pred, img_path(this_batch[i]))
+                pool.map(lambda p: postprocess(*p), enumerate(x))
+            log.info(f'Done! ({batch/t.elapsed_secs:.2f} inputs/s)')
+            METRICS.counter('images').inc(len(this_batch))
+            events.progress('predict', stop, len(all_inps))
+    profiler.stop()
+    METRICS.write_tensorboard(logdir, n_batch, flush=True)
+
+
+def _frame_stride(capture, flags):
+    """Returns how many frames to advance per analyzed frame, from `flags.fps` if set else `flags.stride`"""
+    native_fps = capture.get(cv2.CAP_PROP_FPS)
+    if flags.fps > 0 and native_fps > 0:
+        return max(1, int(round(native_fps / flags.fps)))
+    return max(1, flags.stride)
+
+
+def _decode_frames(capture, framework, frames, stop, stride=1, errors=None):
+    """Decoder stage: puts (timestamp, height, width, resized frame) of every
+    `stride`-th frame on `frames`, then None. Skipped frames are grabbed but not decoded.
+    An exception is appended to `errors` and None is still put, so the consumer never waits forever.
+    """
+    skip = 0
+    try:
+        while capture.isOpened() and not stop.is_set():
+            if skip:
+                skip -= 1
+                if not capture.grab():
+                    break
+                continue
+            ret, frame = capture.read()
+            if not ret:
+                break
+            skip = stride - 1
+            frame = np.asarray(frame)
+            h, w, _ = frame.shape
+            time_elapsed = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            frames.put((time_elapsed, h, w, framework.resize_input(frame)))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        frames.put(None)
+
+
+def _write_rows(file_writer, rows, errors=None):
+    """Writer stage: writes each list of rows taken from `rows` until None.
+    After an exception, which is appended to `errors`, it keeps taking rows so producers never block.
+    """
+    try:
+        for batch in iter(rows.get, None):
+            with METRICS.timed('write'):
+                file_writer.writerows(batch)
+    except Exception as e:
+        errors.append(e)
+        for _ in iter(rows.get, None):
+            pass
+
 
 def annotate(flags, net, framework):
     log = get_logger()
     io = SharedFlagIO(flags, subprogram=True)
     flags = io.read_flags() if io.read_flags() is not None else flags
+    batch = flags.batch
+    logdir = summary_dir(flags)
+    profiler = Profiler(flags.profile, logdir, flags.profile_start, flags.profile_steps)
+    # a partial final batch is zero padded so every forward pass has the same shape
+    inputs = np.zeros([batch] + list(framework.meta['inp_size']), dtype=np.float32)
     for video in flags.video:
         frame_count = 0
         capture = cv2.VideoCapture(video)
-        total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        stride = _frame_stride(capture, flags)
+        total_frames = math.ceil(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) / stride)
         annotation_file = f'{os.path.splitext(video)[0]}_annotations.csv'
         if os.path.exists(annotation_file):
             log.info("Overwriting existing annotations")
             os.remove(annotation_file)
-        log.info(f'Annotating {video}')
-        with open(annotation_file, mode='a') as file:
+        log.info(f'Annotating {video}{f" every {stride} frames" if stride > 1 else ""}')
+        with open(annotation_file, mode='a') as file, ProgressEvents(flags.events) as events:
             file_writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            while capture.isOpened():
-                frame_count += 1
-                if frame_count % 10 == 0:
+            frames, rows, stop, errors = Queue(maxsize=2 * batch), Queue(maxsize=2), Event(), list()
+            decoder = Thread(target=_decode_frames, args=(capture, framework, frames, stop, stride, errors),
+                             daemon=True)
+            writer = Thread(target=_write_rows, args=(file_writer, rows, errors), daemon=True)
+            decoder.start()
+            writer.start()
+            decoded = True
+            try:
+                while decoded and not errors:
+                    items = list()
+                    while len(items) < batch:
+                        item = frames.get()
+                        if item is None:
+                            decoded = False
+                            break
+                        items.append(item)
+                    if not items:
+                        break
+                    profiler.step()
+                    with METRICS.timed('forward'):
+                        inputs[:len(items)] = [im for *_, im in items]
+                        inputs[len(items):] = 0.
+                        net_out = np.asarray(net.infer(inputs))
+                    results = list()
+                    for (time_elapsed, h, w, _), out in zip(items, net_out):
+                        pred = framework.process_boxes(framework.findboxes(out), h, w, flags.threshold)
+                        results += [[time_elapsed, *result] for result in pred]
+                    rows.put(results)
+                    frame_count += len(items)
+                    METRICS.counter('frames').inc(len(items))
                     flags.progress = round((100 * frame_count / total_frames), 0)
                     io.io_flags()
-                ret, frame = capture.read()
-                if ret:
-                    frame = np.asarray(frame)
-                    h, w, _ = frame.shape
-                    im = framework.resize_input(frame)
-                    this_inp = np.expand_dims(im, 0)
-                    boxes = framework.findboxes(np.concatenate(net(this_inp), 0))
-                    pred = [framework.process_box(b, h, w, flags.threshold) for b in boxes]
-                    pred = filter(None, pred)
-                    time_elapsed = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
-                    [file_writer.writerow([time_elapsed, *result]) for result in pred]
-                else:
-                    break
-                if flags.kill:
-                    capture.release()
-                    exit(1)
+                    events.progress('annotate', frame_count, total_frames, video=video)
+                    if flags.kill:
+                        break
+            finally:
+                # drain frames so the decoder can put its None, then let the writer finish
+                stop.set()
+                while decoded:
+                    decoded = frames.get() is not None
+                decoder.join()
+                rows.put(None)
+                writer.join()
+        if errors:
+            capture.release()
+            raise errors[0]
+        if flags.kill:
+            profiler.stop()
+            capture.release()
+            exit(1)
         capture.release()
+        METRICS.write_tensorboard(logdir, frame_count, flush=True)
+    profiler.stop()
@@ -0,0 +1,81 @@
+"""Versioned SavedModel export of a :obj:`beagles.backend.net.Net` to `flags.built_graph`"""
+import os
+import json
+import tensorflow as tf
+from beagles.io import get_logger
+
+META_FILE = 'meta.json'
+QUANTIZATIONS = ['float16', 'int8']
+""":obj:`list`: post-training quantizations of the TFLite converter selectable with `flags.quantize`"""
+
+
+def graph_dir(flags):
+    """Returns the directory holding the numbered SavedModel versions of `flags.model`"""
+    name = os.path.splitext(os.path.basename(flags.model))[0]
+    return os.path.join(flags.built_graph, name)
+
+
+def versions(flags):
+    """Returns the exported versions of `flags.model` in ascending order"""
+    root = graph_dir(flags)
+    if not os.path.isdir(root):
+        return list()
+    return sorted(int(v) for v in os.listdir(root) if v.isdigit() and os.path.isdir(os.path.join(root, v)))
+
+
+def _to_json(value):
+    return value.tolist() if hasattr(value, 'tolist') else str(value)
+
+
+def export(flags, net, framework):
+    """
+    Writes `net` as the next version of `flags.model` in `flags.built_graph` with a
+    serving signature over float32 batches of `inp_size` inputs. The framework meta is
+    written to the assets of the SavedModel, so :class:`SavedGraph` needs no cfg.
+    `flags.quantize` also converts it to a float16 or dynamic range int8 TFLite model.
+
+    Returns:
+        path of the written SavedModel
+    """
+    if flags.quantize and flags.quantize not in QUANTIZATIONS:
+        raise ValueError(f'Unknown quantization {flags.quantize}, expected one of {", ".join(QUANTIZATIONS)}')
+    log = get_logger()
+    meta = framework.meta
+    version = (versions(flags) or [0])[-1] + 1
+    path = os.path.join(graph_dir(flags), str(version))
+    module = tf.Module()
+    module.net = net
+    module.infer = tf.function(net.forward, input_signature=[
+        tf.TensorSpec([None, *meta['inp_size']], dtype=tf.float32, name='input')])
+    log.info(f'Exporting {meta["name"]} to {path}')
+    tf.saved_model.save(module, path, signatures={'serving_default': module.infer})
+    os.makedirs(os.path.join(path, 'assets'), exist_ok=True)
+    with open(os.path.join(path, 'assets', META_FILE), 'w') as file:
+        json.dump(meta, file, default=_to_json)
+    if flags.quantize:
+        converter = tf.lite.TFLiteConverter.from_saved_model(path)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if flags.quantize == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        lite = os.path.join(path, f'{meta["name"]}.{flags.quantize}.tflite')
+        with open(lite, 'wb') as file:
+            file.write(converter.convert())
+        log.info(f'Wrote {flags.quantize} TFLite model {lite}')
+    return path
+
+
+class SavedGraph:
+    """
+    Inference only stand-in for a :obj:`beagles.backend.net.Net` loaded from the
+    latest export of `flags.model`, its :attr:`meta` replaces parsing the cfg.
+    """
+    def __init__(self, flags):
+        self.path = os.path.join(graph_dir(flags), str(versions(flags)[-1]))
+        self.model = tf.saved_model.load(self.path)
+        self.infer = self.model.infer
+        with open(os.path.join(self.path, 'assets', META_FILE)) as file:
+            self.meta = json.load(file)
+
+    @staticmethod
+    def exists(flags):
+        return bool(versions(flags))
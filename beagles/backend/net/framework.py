@@ -3,6 +3,7 @@ from beagles.base import SubsystemPrototype, Subsystem, register_subsystem
 from beagles.backend.net.frameworks import vanilla
 from beagles.backend.net.frameworks import yolo
 from beagles.backend.net.frameworks import yolov2
+from beagles.backend.net.frameworks import yolov3
 
 class Framework(SubsystemPrototype):
     """
@@ -49,12 +50,15 @@ class Yolo(NeuralNet):
 
     parse = yolo.data.parse
     shuffle = yolo.data.shuffle
+    dataset = yolo.data.dataset
 
     postprocess = yolo.predict.postprocess
     loss = yolo.train.loss
     is_input = yolo.misc.is_input
 
     batch = yolo.data.batch
+    grid = yolo.data.grid
+    feed_buffers = yolo.data.feed_buffers
     get_feed_values = yolo.data.get_feed_values
     get_preprocessed_img = yolo.data.get_preprocessed_img
     preprocess = yolo.predict.preprocess
@@ -62,6 +66,7 @@ class Yolo(NeuralNet):
 
     findboxes = yolo.predict.findboxes
     process_box = yolo.predict.process_box
+    process_boxes = yolo.predict.process_boxes
 
 
 @register_subsystem(token='[region]', prototype=Framework)
@@ -70,12 +75,15 @@ class YoloV2(Yolo):
 
     parse = Yolo.parse
     shuffle = Yolo.shuffle
+    dataset = Yolo.dataset
 
     postprocess = Yolo.postprocess
     loss = yolov2.train.loss
     is_input = Yolo.is_input
 
     batch = yolov2.data.batch
+    grid = yolov2.data.grid
+    feed_buffers = Yolo.feed_buffers
     get_feed_values = Yolo.get_feed_values
     get_preprocessed_img = Yolo.get_preprocessed_img
     preprocess = Yolo.preprocess
@@ -83,7 +91,29 @@ class YoloV2(Yolo):
 
     findboxes = yolov2.predict.findboxes
     process_box = Yolo.process_box
+    process_boxes = Yolo.process_boxes
 
 
+@register_subsystem(token='[yolo]', prototype=Framework)
+class YoloV3(YoloV2):
+    constructor = yolov3.constructor
 
+    parse = YoloV2.parse
+    shuffle = YoloV2.shuffle
+    dataset = YoloV2.dataset
 
+    postprocess = YoloV2.postprocess
+    loss = yolov3.train.loss
+    is_input = YoloV2.is_input
+
+    batch = yolov3.data.batch
+    grid = YoloV2.grid
+    feed_buffers = yolov3.data.feed_buffers
+    get_feed_values = YoloV2.get_feed_values
+    get_preprocessed_img = YoloV2.get_preprocessed_img
+    preprocess = YoloV2.preprocess
+    resize_input = YoloV2.resize_input
+
+    findboxes = yolov3.predict.findboxes
+    process_box = YoloV2.process_box
+    process_boxes = YoloV2.process_boxes
@@ -1,97 +1,78 @@
 import numpy as np
 cimport numpy as np
 cimport cython
-#from cython.parallel import prange
+from cython.parallel import prange
 ctypedef np.float_t DTYPE_t
 from libc.math cimport exp
 from nms cimport nms
 
 #expit
-@cython.boundscheck(False) # turn off bounds-checking for entire function
-@cython.wraparound(False)  # turn off negative index wrapping for entire function
 @cython.cdivision(True)
-cdef float expit_c(float x):
-    cdef float y = 1/(1+exp(-x))
-    return y
+cdef inline double expit_c(double x) nogil:
+    return 1. / (1. + exp(-x))
 
-#MAX
+#DECODE ONE ANCHOR
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
 @cython.cdivision(True)
-cdef float max_c(float a, float b):
-    if a > b:
-        return a
-    return b
-
-"""
-#SOFTMAX!
-@cython.cdivision(True)
-@cython.boundscheck(False) # turn off bounds-checking for entire function
-@cython.wraparound(False)  # turn off negative index wrapping for entire function
-cdef void _softmax_c(float* x, int classes):
+cdef void decode_anchor_c(const float[:, :, :, ::1] net_out, const double[::1] anchors,
+                          float[:, :, :, ::1] bbox, float[:, :, :, ::1] probs, float threshold,
+                          np.intp_t row, np.intp_t col, np.intp_t anchor) nogil:
     cdef:
-        float sum = 0
-        np.intp_t k
-        float arr_max = 0
-    with nogil, parallel():
-        for k in prange(classes, schedule='guided'):
-            arr_max = max(arr_max,x[k])
+        np.intp_t H = net_out.shape[0], W = net_out.shape[1], C = probs.shape[3], k
+        double conf, arr_max, total = 0.
+        float prob
 
-        for k in prange(classes, schedule='guided'):
-            x[k] = exp(x[k]-arr_max)
-            sum += x[k]
+    conf = expit_c(net_out[row, col, anchor, 4])
+    bbox[row, col, anchor, 0] = (col + expit_c(net_out[row, col, anchor, 0])) / W
+    bbox[row, col, anchor, 1] = (row + expit_c(net_out[row, col, anchor, 1])) / H
+    bbox[row, col, anchor, 2] = exp(net_out[row, col, anchor, 2]) * anchors[2 * anchor + 0] / W
+    bbox[row, col, anchor, 3] = exp(net_out[row, col, anchor, 3]) * anchors[2 * anchor + 1] / H
+    bbox[row, col, anchor, 4] = conf
 
-        for k in prange(classes, schedule='guided'):
-            x[k] = x[k]/sum
-"""
-        
-        
+    #SOFTMAX, one max pass, one exp pass, one normalizing pass
+    arr_max = net_out[row, col, anchor, 5]
+    for k in range(1, C):
+        if net_out[row, col, anchor, 5 + k] > arr_max:
+            arr_max = net_out[row, col, anchor, 5 + k]
+    for k in range(C):
+        total = total + exp(net_out[row, col, anchor, 5 + k] - arr_max)
+    for k in range(C):
+        prob = exp(net_out[row, col, anchor, 5 + k] - arr_max) * conf / total
+        if prob > threshold:
+            probs[row, col, anchor, k] = prob
 
-#BOX CONSTRUCTOR
-@cython.cdivision(True)
+#BOX DECODER
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
-def box_constructor(meta,np.ndarray[float,ndim=3] net_out_in):
+def box_decoder(meta, net_out_in):
+    """Decodes a YOLOv2 output into (H*W*B, C) thresholded class probabilities
+    and (H*W*B, 5) [x, y, w, h, confidence] boxes, rows of the grid are decoded in parallel.
+    `net_out_in` is only read, so read-only arrays such as views of a :obj:`tf.Tensor` are accepted.
+    """
     cdef:
-        np.intp_t H, W, _, C, B, row, col, box_loop, class_loop
-        np.intp_t row1, col1, box_loop1,index,index2
-        float  threshold = meta['thresh']
-        float tempc,arr_max=0,sum=0
-        double[:] anchors = np.asarray(meta['anchors'])
-        list boxes = list()
+        np.intp_t H, W, _, C, B, row, col, anchor
+        float threshold = meta['thresh']
+        double[::1] anchors = np.ascontiguousarray(meta['anchors'], dtype=np.float64)
 
     H, W, _ = meta['out_size']
     C = meta['classes']
     B = meta['num']
-    
+
     cdef:
-        float[:, :, :, ::1] net_out = net_out_in.reshape([H, W, B, net_out_in.shape[2]/B])
-        float[:, :, :, ::1] Classes = net_out[:, :, :, 5:]
-        float[:, :, :, ::1] Bbox_pred =  net_out[:, :, :, :5]
+        const float[:, :, :, ::1] net_out = np.ascontiguousarray(net_out_in, dtype=np.float32).reshape([H, W, B, C + 5])
+        float[:, :, :, ::1] bbox = np.empty((H, W, B, 5), dtype=np.float32)
         float[:, :, :, ::1] probs = np.zeros((H, W, B, C), dtype=np.float32)
 
-    for row in range(H):
+    for row in prange(H, nogil=True, schedule='static'):
         for col in range(W):
-            for box_loop in range(B):
-                arr_max=0
-                sum=0;
-                Bbox_pred[row, col, box_loop, 4] = expit_c(Bbox_pred[row, col, box_loop, 4])
-                Bbox_pred[row, col, box_loop, 0] = (col + expit_c(Bbox_pred[row, col, box_loop, 0])) / W
-                Bbox_pred[row, col, box_loop, 1] = (row + expit_c(Bbox_pred[row, col, box_loop, 1])) / H
-                Bbox_pred[row, col, box_loop, 2] = exp(Bbox_pred[row, col, box_loop, 2]) * anchors[2 * box_loop + 0] / W
-                Bbox_pred[row, col, box_loop, 3] = exp(Bbox_pred[row, col, box_loop, 3]) * anchors[2 * box_loop + 1] / H
-                #SOFTMAX BLOCK, no more pointer juggling
-                for class_loop in range(C):
-                    arr_max=max_c(arr_max,Classes[row,col,box_loop,class_loop])
-                    for class_loop in range(C):
-                        Classes[row,col,box_loop,class_loop]=exp(Classes[row,col,box_loop,class_loop]-arr_max)
-                        sum+=Classes[row,col,box_loop,class_loop]
+            for anchor in range(B):
+                decode_anchor_c(net_out, anchors, bbox, probs, threshold, row, col, anchor)
 
-                    for class_loop in range(C):
-                        tempc = Classes[row, col, box_loop, class_loop] * Bbox_pred[row, col, box_loop, 4]/sum
-                        if(tempc > threshold):
-                            probs[row, col, box_loop, class_loop] = tempc
-    
-    
-    #NMS                    
-    return nms(np.ascontiguousarray(probs).reshape(H*W*B,C), np.ascontiguousarray(Bbox_pred).reshape(H*B*W,5))
+    return np.asarray(probs).reshape(H * W * B, C), np.asarray(bbox).reshape(H * W * B, 5)
+
+#BOX CONSTRUCTOR
+def box_constructor(meta, net_out_in):
+    probs, bbox = box_decoder(meta, net_out_in)
+    #NMS
+    return nms(probs, bbox, meta['nms_thresh'], meta['nms_method'], meta['nms_sigma'], meta['thresh'])
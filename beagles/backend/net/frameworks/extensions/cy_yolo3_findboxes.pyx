@@ -1,40 +1,79 @@
 import numpy as np
 cimport numpy as np
 cimport cython
-
-ctypedef np.float_t DTYPE_t
+from cython.parallel import prange
 from libc.math cimport exp
-from beagles.utils.box import BoundingBox
-from nms cimport NMS
+from nms cimport nms
 
-@cython.boundscheck(False)
-@cython.wraparound(False)
+#expit
 @cython.cdivision(True)
-cdef logit_c(float x):
-    cdef float y = 1/(1 + exp(x))
-    return y
+cdef inline double expit_c(double x) nogil:
+    return 1. / (1. + exp(-x))
 
-# noinspection DuplicatedCode
+#DECODE ONE HEAD
+@cython.boundscheck(False) # turn off bounds-checking for entire function
+@cython.wraparound(False)  # turn off negative index wrapping for entire function
 @cython.cdivision(True)
-@cython.boundscheck(False)
-@cython.wraparound(False)
-def box_constructor(meta,np.ndarray[float,ndim=3] net_out_in):
+cdef void decode_head_c(const float[:, :, :, ::1] net_out, const double[:, ::1] anchors,
+                        float[:, :, :, ::1] bbox, float[:, :, :, ::1] probs, float threshold) nogil:
     cdef:
-        np.intp_t H, W, _, C, B, row, col, box_loop, class_loop
-        np.intp_t row1, col1, box_loop1,index,index2
-        float truth_thresh = meta['truth_thresh']
-        float ignore_thresh = meta['ignore_thresh']
-        float tempc,arr_max=0,sum=0
-        double[:] anchors = np.asarray(meta['anchors'])
-        list boxes = list()
-
-    H, W, _ = meta['out_size']
-    C = meta['classes']
-    B = meta['num']
+        np.intp_t H = net_out.shape[0], W = net_out.shape[1], B = net_out.shape[2], C = probs.shape[3]
+        np.intp_t row, col, anchor, k
+        double conf
+        float prob
+
+    for row in prange(H, schedule='static'):
+        for col in range(W):
+            for anchor in range(B):
+                conf = expit_c(net_out[row, col, anchor, 4])
+                bbox[row, col, anchor, 0] = (col + expit_c(net_out[row, col, anchor, 0])) / W
+                bbox[row, col, anchor, 1] = (row + expit_c(net_out[row, col, anchor, 1])) / H
+                bbox[row, col, anchor, 2] = exp(net_out[row, col, anchor, 2]) * anchors[anchor, 0]
+                bbox[row, col, anchor, 3] = exp(net_out[row, col, anchor, 3]) * anchors[anchor, 1]
+                bbox[row, col, anchor, 4] = conf
+                # classes are independent logistic outputs rather than a softmax
+                for k in range(C):
+                    prob = expit_c(net_out[row, col, anchor, 5 + k]) * conf
+                    if prob > threshold:
+                        probs[row, col, anchor, k] = prob
 
+#BOX DECODER
+def box_decoder(meta, net_out_in):
+    """Decodes the flattened and concatenated YOLOv3 heads of one image into (N, C) thresholded
+    class probabilities and (N, 5) [x, y, w, h, confidence] boxes, N = sum(H * W * B).
+    Rows of each head grid are decoded in parallel.
+    """
     cdef:
-        float[:, :, :, ::1] net_out = net_out_in.reshape([H, W, B, net_out_in.shape[2]/B])
-        float[:, :, :, ::1] Classes = net_out[:, :, :, 5:]
-        float[:, :, :, ::1] Bbox_pred =  net_out[:, :, :, :5]
-        float[:, :, :, ::1] probs = np.zeros((H, W, B, C), dtype=np.float32)
+        np.intp_t C = meta['classes'], H, W, B, start = 0, stop
+        float threshold = meta['thresh']
+        const float[:, :, :, ::1] head_out
+        const double[:, ::1] head_anchors
+        float[:, :, :, ::1] head_bbox, head_probs
+
+    h, w, _ = meta['inp_size']
+    # anchors are in input pixels, scale them to fractions of the input like the boxes
+    anchors = np.asarray(meta['anchors'], dtype=np.float64).reshape(-1, 2) / [w, h]
+    rows = sum(H * W * len(mask) for H, W, mask in meta['heads'])
+    net_out = np.ascontiguousarray(net_out_in, dtype=np.float32).reshape(rows, C + 5)
+    bbox = np.empty((rows, 5), dtype=np.float32)
+    probs = np.zeros((rows, C), dtype=np.float32)
+
+    for H, W, mask in meta['heads']:
+        B = len(mask)
+        stop = start + H * W * B
+        head_out = net_out[start:stop].reshape(H, W, B, C + 5)
+        head_anchors = np.ascontiguousarray(anchors[mask])
+        head_bbox = bbox[start:stop].reshape(H, W, B, 5)
+        head_probs = probs[start:stop].reshape(H, W, B, C)
+        with nogil:
+            decode_head_c(head_out, head_anchors, head_bbox, head_probs, threshold)
+        start = stop
+
+    return probs, bbox
 
+#BOX CONSTRUCTOR
+def box_constructor(meta, net_out_in):
+    # detections of every scale are suppressed together
+    probs, bbox = box_decoder(meta, net_out_in)
+    #NMS
+    return nms(probs, bbox, meta['nms_thresh'], meta['nms_method'], meta['nms_sigma'], meta['thresh'])
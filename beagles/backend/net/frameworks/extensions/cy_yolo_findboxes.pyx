@@ -9,7 +9,7 @@ from nms cimport nms
 @cython.cdivision(True)
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
-def yolo_box_constructor(meta,np.ndarray[float] net_out, float threshold):
+def yolo_box_constructor(meta, net_out_in, float threshold):
 
     cdef:
         float sqrt
@@ -26,10 +26,12 @@ def yolo_box_constructor(meta,np.ndarray[float] net_out, float threshold):
     prob_size = SS * C # class probabilities
     conf_size = SS * B # confidences for each grid cell
 
+    # probs and coords are rescaled in place, so they are copies and read-only outputs are accepted
+    net_out = np.asarray(net_out_in, dtype=np.float32).ravel()
     cdef:
-        float [:,::1] probs =  np.ascontiguousarray(net_out[0 : prob_size]).reshape([SS,C])
-        float [:,::1] confs =  np.ascontiguousarray(net_out[prob_size : (prob_size + conf_size)]).reshape([SS,B])
-        float [: , : ,::1] coords =  np.ascontiguousarray(net_out[(prob_size + conf_size) : ]).reshape([SS, B, 4])
+        float [:,::1] probs =  np.array(net_out[0 : prob_size]).reshape([SS,C])
+        const float [:,::1] confs =  np.ascontiguousarray(net_out[prob_size : (prob_size + conf_size)]).reshape([SS,B])
+        float [: , : ,::1] coords =  np.array(net_out[(prob_size + conf_size) : ]).reshape([SS, B, 4])
         float [:,:,::1] final_probs = np.zeros([SS,B,C],dtype=np.float32)
         
     
@@ -46,4 +48,5 @@ def yolo_box_constructor(meta,np.ndarray[float] net_out, float threshold):
                     final_probs[grid, b, class_loop] = probs[grid, class_loop]
     
     
-    return nms(np.ascontiguousarray(final_probs).reshape(SS*B, C) , np.ascontiguousarray(coords).reshape(SS*B, 4))
+    return nms(np.ascontiguousarray(final_probs).reshape(SS*B, C) , np.ascontiguousarray(coords).reshape(SS*B, 4),
+               meta['nms_thresh'], meta['nms_method'], meta['nms_sigma'], threshold)
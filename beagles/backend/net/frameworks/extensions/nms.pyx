@@ -1,16 +1,18 @@
 import numpy as np
 cimport numpy as np
 cimport cython
+from cython.parallel import prange
 from libc.math cimport exp
-from beagles.base.box import PreprocessedBox
+from beagles.backend.net.frameworks.extensions.numpy_nms import (sort_candidates, split_boxes, box_corners,
+                                                               NMS_THRESHOLD, NMS_METHODS, NMS_SIGMA)
 
 #OVERLAP
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
 @cython.cdivision(True)
-cdef float box_overlap_c(float x1, float d1 , float x2 , float d2):
+cdef double box_overlap_c(double x1, double d1 , double x2 , double d2) nogil:
     cdef:
-        float l1,l2,left,right
+        double l1,l2,r1,r2,left,right
     l1 = x1 - d1 / 2.
     l2 = x2 - d2 / 2.
     left = max(l1,l2)
@@ -23,9 +25,9 @@ cdef float box_overlap_c(float x1, float d1 , float x2 , float d2):
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
 @cython.cdivision(True)
-cdef float box_intersection_c(float a_x, float a_y, float a_w, float a_h, float b_x, float b_y, float b_w, float b_h):
+cdef double box_intersection_c(double a_x, double a_y, double a_w, double a_h, double b_x, double b_y, double b_w, double b_h) nogil:
     cdef:
-        float w,h,area
+        double w,h,area
     w = box_overlap_c(a_x, a_w, b_x, b_w)
     h = box_overlap_c(a_y, a_h, b_y, b_h)
     if w < 0 or h < 0: return 0
@@ -39,9 +41,9 @@ def intersection_c(a_x, a_y, a_w, a_h, b_x, b_y, b_w, b_h):
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
 @cython.cdivision(True)
-cdef float box_union_c(float a_x, float a_y, float a_w, float a_h, float b_x, float b_y, float b_w, float b_h):
+cdef double box_union_c(double a_x, double a_y, double a_w, double a_h, double b_x, double b_y, double b_w, double b_h) nogil:
     cdef:
-        float i,u
+        double i,u
     i = box_intersection_c(a_x, a_y, a_w, a_h, b_x, b_y, b_w, b_h)
     u = a_w * a_h + b_w * b_h -i
     return u
@@ -53,83 +55,114 @@ def union_c(a_x, a_y, a_w, a_h, b_x, b_y, b_w, b_h):
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
 @cython.cdivision(True)
-cdef float box_iou_c(float a_x, float a_y, float a_w, float a_h, float b_x, float b_y, float b_w, float b_h):
+cdef double box_iou_c(double a_x, double a_y, double a_w, double a_h, double b_x, double b_y, double b_w, double b_h) nogil:
     return box_intersection_c(a_x, a_y, a_w, a_h, b_x, b_y, b_w, b_h) / box_union_c(a_x, a_y, a_w, a_h, b_x, b_y, b_w, b_h)
 
 def iou_c(a_x, a_y, a_w, a_h, b_x, b_y, b_w, b_h):
     return box_iou_c(a_x, a_y, a_w, a_h, b_x, b_y, b_w, b_h)
 
-#NMS
+#SUPPRESSION
+cdef enum Method:
+    HARD, LINEAR, GAUSSIAN, DIOU
+
 @cython.boundscheck(False) # turn off bounds-checking for entire function
 @cython.wraparound(False)  # turn off negative index wrapping for entire function
 @cython.cdivision(True)
-cdef nms(float[:, ::1] final_probs , float[:, ::1] final_bbox):
-
-    cdef set indices = set()
+cdef void suppress_c(const double[:, ::1] corners, const np.intp_t[::1] bounds, float[::1] scores,
+                     np.uint8_t[::1] kept, Method method, double iou_threshold, double sigma,
+                     double score_threshold) nogil:
     cdef:
-        np.intp_t pred_length,class_length,class_loop,index,index2
-
-    pred_length = final_bbox.shape[0]
-    class_length = final_probs.shape[1]
-    boxes = list()
-    for class_loop in range(class_length):
-        for index in range(pred_length):
-            if final_probs[index,class_loop] == 0: continue
-            for index2 in range(index+1,pred_length):
-                if final_probs[index2,class_loop] == 0: continue
-                if index==index2 : continue
-                if box_iou_c(final_bbox[index,0],final_bbox[index,1],final_bbox[index,2],final_bbox[index,3],final_bbox[index2,0],final_bbox[index2,1],final_bbox[index2,2],final_bbox[index2,3]) >= 0.4:
-                    if final_probs[index2,class_loop] > final_probs[index, class_loop] :
-                        final_probs[index, class_loop] =0
-                        break
-                    final_probs[index2,class_loop]=0
-            if index not in indices:
-                bb = PreprocessedBox(x=final_bbox[index, 0],
-                                     y=final_bbox[index, 1],
-                                     w=final_bbox[index, 2],
-                                     h=final_bbox[index, 3],
-                                     c=final_bbox[index, 4],
-                                     probs=np.asarray(final_probs[index,:]))
-                boxes.append(bb)
-                indices.add(index)
-    return boxes
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-@cython.cdivision(True)
-cdef soft_nms(float[:, ::1] final_probs , float[:, ::1] final_bbox):
-    cdef list boxes = list()
-    cdef set indices = set()
+        np.intp_t segment, start, stop, first, a, b
+        double w, h, intersection, iou, dx, dy, ex, ey
+        bint soft = method == LINEAR or method == GAUSSIAN
+    # segments are independent so they are spread across threads
+    for segment in prange(bounds.shape[0] - 1, schedule='dynamic'):
+        start = bounds[segment]
+        stop = bounds[segment + 1]
+        a = start - 1
+        while True:
+            # keep the highest remaining score, candidates of one (image, class) start
+            # sorted by descending score so hard and DIoU suppression just take the next one
+            first = start if soft else a + 1
+            a = -1
+            for b in range(first, stop):
+                if kept[b] or scores[b] == 0: continue
+                if a < 0 or scores[b] > scores[a]:
+                    a = b
+                if not soft: break
+            if a < 0: break
+            kept[a] = 1
+            for b in range(start if soft else a + 1, stop):
+                if kept[b] or scores[b] == 0: continue
+                w = min(corners[a, 2], corners[b, 2]) - max(corners[a, 0], corners[b, 0])
+                if w < 0: continue
+                h = min(corners[a, 3], corners[b, 3]) - max(corners[a, 1], corners[b, 1])
+                if h < 0: continue
+                intersection = w * h
+                iou = intersection / (corners[a, 4] + corners[b, 4] - intersection)
+                if method == DIOU:
+                    # squared center distance over the squared diagonal of the enclosing box
+                    dx = (corners[a, 0] + corners[a, 2]) / 2. - (corners[b, 0] + corners[b, 2]) / 2.
+                    dy = (corners[a, 1] + corners[a, 3]) / 2. - (corners[b, 1] + corners[b, 3]) / 2.
+                    ex = max(corners[a, 2], corners[b, 2]) - min(corners[a, 0], corners[b, 0])
+                    ey = max(corners[a, 3], corners[b, 3]) - min(corners[a, 1], corners[b, 1])
+                    iou = iou - (dx * dx + dy * dy) / (ex * ex + ey * ey)
+                if iou != iou: continue
+                if soft:
+                    if method == GAUSSIAN:
+                        scores[b] = scores[b] * exp(-(iou * iou) / sigma)
+                    elif iou >= iou_threshold:
+                        scores[b] = scores[b] * (1. - iou)
+                    else:
+                        continue
+                    if scores[b] < score_threshold:
+                        scores[b] = 0
+                elif iou >= iou_threshold:
+                    scores[b] = 0
+
+#BATCH NMS
+def batch_nms(final_probs, final_bbox, float iou_threshold=NMS_THRESHOLD, str method=NMS_METHODS[0],
+              float sigma=NMS_SIGMA, float score_threshold=0.):
+    """
+    Per-class non-maximum suppression over a whole inference batch.
+
+    Args:
+        final_probs: (batch, N, C) thresholded class probabilities.
+
+        final_bbox: (batch, N, 4 or 5) [x, y, w, h(, confidence)] boxes.
+
+        iou_threshold: Boxes overlapping a higher scoring box of the same class by this much are suppressed.
+
+        method: One of :data:`NMS_METHODS`, `hard` drops overlapping boxes, `linear` and `gaussian`
+            soft-NMS decay their scores and `diou` drops them by IOU less normalized center distance.
+
+        sigma: Spread of the `gaussian` score decay.
+
+        score_threshold: Soft-NMS drops boxes whose decayed score falls below this.
+
+    Returns:
+        list of one :class:`PreprocessedBoxes` per image
+    """
+    if method not in NMS_METHODS:
+        raise ValueError(f'Unknown NMS method {method}, expected one of {", ".join(NMS_METHODS)}')
+    images, n, classes = np.shape(final_probs)
+    probs = np.array(final_probs, dtype=np.float32).reshape(images * n, classes)
+    bbox = np.ascontiguousarray(final_bbox, dtype=np.float32).reshape(images * n, -1)
+    rows, candidate_classes, bounds = sort_candidates(probs, n)
+    scores = np.ascontiguousarray(probs[rows, candidate_classes])
     cdef:
-        np.intp_t pred_length,class_length,class_loop,index,index2
-
-
-    pred_length = final_bbox.shape[0]
-    class_length = final_probs.shape[1]
-    for class_loop in range(class_length):
-        # first box
-        for index in range(pred_length):
-            if final_probs[index,class_loop] == 0:
-                continue
-            # second box
-            for index2 in range(index + 1, pred_length):
-                if final_probs[index2,class_loop] == 0:
-                    continue
-                if index==index2 :
-                    continue
-                else:
-                    final_probs[index, class_loop] = final_probs[index, class_loop] * box_iou_c(final_bbox[index,0],final_bbox[index,1],final_bbox[index,2],final_bbox[index,3],final_bbox[index2,0],final_bbox[index2,1],final_bbox[index2,2],final_bbox[index2,3])
-                    final_probs[index2, class_loop] = final_probs[index2, class_loop] * box_iou_c(final_bbox[index,0],final_bbox[index,1],final_bbox[index,2],final_bbox[index,3],final_bbox[index2,0],final_bbox[index2,1],final_bbox[index2,2],final_bbox[index2,3])
-                    break
-
-            if index or index2 not in indices:
-                for i in [index, index2]:
-                    bb = PreprocessedBox(x=final_bbox[i, 0],
-                                         y=final_bbox[i, 1],
-                                         w=final_bbox[i, 2],
-                                         h=final_bbox[i, 3],
-                                         c=final_bbox[i, 4],
-                                         probs=np.asarray(final_probs[i,:]))
-                    boxes.append(bb)
-                    indices.add(i)
-    return boxes
\ No newline at end of file
+        double[:, ::1] corners_view = box_corners(bbox[rows])
+        np.intp_t[::1] bounds_view = bounds
+        float[::1] scores_view = scores
+        np.uint8_t[::1] kept_view = np.zeros(len(rows), dtype=np.uint8)
+        int method_index = NMS_METHODS.index(method)
+    with nogil:
+        suppress_c(corners_view, bounds_view, scores_view, kept_view, <Method> method_index,
+                   iou_threshold, sigma, score_threshold)
+    return split_boxes(probs, bbox, rows, candidate_classes, scores, images, n)
+
+#NMS
+cdef nms(float[:, ::1] final_probs , float[:, ::1] final_bbox, float iou_threshold, str method,
+         float sigma, float score_threshold):
+    return batch_nms(np.asarray(final_probs)[None], np.asarray(final_bbox)[None],
+                     iou_threshold, method, sigma, score_threshold)[0]
@@ -0,0 +1,148 @@
+"""
+Box containers and the NumPy NMS engine shared with the compiled `nms` extension.
+
+Candidates are every nonzero (row, class) probability, sorted once by image, class
+and descending score. Greedy suppression then runs over each (image, class) segment,
+so zero-probability rows are never visited and each class only compares its own candidates.
+"""
+import numpy as np
+from beagles.base.box import PreprocessedBox, PreprocessedBoxes
+
+NMS_THRESHOLD = 0.4
+NMS_METHODS = ('hard', 'linear', 'gaussian', 'diou')
+NMS_SIGMA = 0.5
+BOX_FIELDS = PreprocessedBox._fields[:-1]
+
+
+def to_boxes(probs, bbox, rows):
+    """Gathers `rows` of (N, C) `probs` and (N, 4 or 5) `bbox` into a :class:`PreprocessedBoxes`"""
+    boxes = np.zeros(len(rows), dtype=PreprocessedBoxes.dtype(probs.shape[1]))
+    for i, field in enumerate(BOX_FIELDS[:bbox.shape[1]]):
+        boxes[field] = bbox[rows, i]
+    boxes['probs'] = probs[rows]
+    return PreprocessedBoxes(boxes)
+
+
+def sort_candidates(probs, rows_per_image):
+    """
+    Returns (rows, classes, bounds) of the nonzero entries in (N, C) `probs`
+    sorted by image, class and descending score, (image, class) segment `i`
+    spans `bounds[i]:bounds[i + 1]`
+    """
+    rows, classes = np.nonzero(probs)
+    key = rows // rows_per_image * probs.shape[1] + classes
+    order = np.lexsort((-probs[rows, classes], key))
+    rows, classes, key = rows[order], classes[order], key[order]
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(key)) + 1, [len(key)]]).astype(np.intp)
+    return rows, classes, bounds
+
+
+def split_boxes(probs, bbox, rows, classes, scores, images, rows_per_image):
+    """Writes candidate `scores` back to `probs` and returns the boxes with a nonzero score of each of `images`"""
+    probs[rows, classes] = scores
+    keep = np.unique(rows[scores > 0])
+    boxes = to_boxes(probs, bbox, keep)
+    bounds = np.searchsorted(keep // rows_per_image, np.arange(images + 1)).tolist()
+    return [boxes[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def box_corners(boxes):
+    """Returns (N, 5) float64 [left, top, right, bottom, area] of (N, 4 or more) [x, y, w, h, ...] `boxes`"""
+    boxes = np.asarray(boxes, dtype=np.float64)
+    x, y, w, h = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    return np.ascontiguousarray(np.stack([x - w / 2., y - h / 2., x + w / 2., y + h / 2., w * h], 1))
+
+
+def box_iou(corner, corners):
+    """IOU of one :func:`box_corners` row with each row of `corners`, NaN where they are disjoint"""
+    w = np.minimum(corner[2], corners[:, 2]) - np.maximum(corner[0], corners[:, 0])
+    h = np.minimum(corner[3], corners[:, 3]) - np.maximum(corner[1], corners[:, 1])
+    intersection = np.where((w < 0) | (h < 0), np.nan, w * h)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return intersection / (corner[4] + corners[:, 4] - intersection)
+
+
+def distance_penalty(corner, corners):
+    """DIoU penalty, squared center distance over the squared diagonal of the enclosing box"""
+    dx = (corner[0] + corner[2]) / 2. - (corners[:, 0] + corners[:, 2]) / 2.
+    dy = (corner[1] + corner[3]) / 2. - (corners[:, 1] + corners[:, 3]) / 2.
+    ex = np.maximum(corner[2], corners[:, 2]) - np.minimum(corner[0], corners[:, 0])
+    ey = np.maximum(corner[3], corners[:, 3]) - np.minimum(corner[1], corners[:, 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (dx * dx + dy * dy) / (ex * ex + ey * ey)
+
+
+def suppress(corners, bounds, scores, method, iou_threshold, sigma, score_threshold):
+    """
+    Applies `method` suppression within every segment of candidate `scores`,
+    `corners` are in candidate order. Returns the new scores, zero where suppressed.
+    """
+    scores = scores.copy()
+    soft = method in ('linear', 'gaussian')
+    iou_threshold, sigma = np.float32(iou_threshold), np.float64(np.float32(sigma))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        segment, kept = scores[start:stop], np.zeros(stop - start, dtype=bool)
+        while True:
+            live = np.flatnonzero(~kept & (segment > 0))
+            if not len(live):
+                break
+            # keep the highest remaining score, the first one for hard and DIoU suppression
+            a = live[np.argmax(segment[live])] if soft else live[0]
+            kept[a] = True
+            rest = live[live != a] if soft else live[live > a]
+            iou = box_iou(corners[start + a], corners[start + rest])
+            if method == 'diou':
+                iou = iou - distance_penalty(corners[start + a], corners[start + rest])
+            with np.errstate(invalid='ignore'):
+                if method == 'linear':
+                    hit = iou >= iou_threshold
+                    segment[rest[hit]] = segment[rest[hit]] * (1. - iou[hit])
+                elif method == 'gaussian':
+                    hit = ~np.isnan(iou)
+                    segment[rest[hit]] = segment[rest[hit]] * np.exp(-(iou[hit] * iou[hit]) / sigma)
+                else:
+                    hit = iou >= iou_threshold
+                    segment[rest[hit]] = 0.
+            if soft:
+                decayed = rest[hit]
+                segment[decayed[segment[decayed] < np.float32(score_threshold)]] = 0.
+    return scores
+
+
+def batch_nms(final_probs, final_bbox, iou_threshold=NMS_THRESHOLD, method=NMS_METHODS[0],
+              sigma=NMS_SIGMA, score_threshold=0.):
+    """
+    Per-class non-maximum suppression over a whole inference batch.
+
+    Args:
+        final_probs: (batch, N, C) thresholded class probabilities.
+
+        final_bbox: (batch, N, 4 or 5) [x, y, w, h(, confidence)] boxes.
+
+        iou_threshold: Boxes overlapping a higher scoring box of the same class by this much are suppressed.
+
+        method: One of :data:`NMS_METHODS`, `hard` drops overlapping boxes, `linear` and `gaussian`
+            soft-NMS decay their scores and `diou` drops them by IOU less normalized center distance.
+
+        sigma: Spread of the `gaussian` score decay.
+
+        score_threshold: Soft-NMS drops boxes whose decayed score falls below this.
+
+    Returns:
+        list of one :class:`PreprocessedBoxes` per image
+    """
+    if method not in NMS_METHODS:
+        raise ValueError(f'Unknown NMS method {method}, expected one of {", ".join(NMS_METHODS)}')
+    images, n, classes = np.shape(final_probs)
+    probs = np.array(final_probs, dtype=np.float32).reshape(images * n, classes)
+    bbox = np.asarray(final_bbox, dtype=np.float32).reshape(images * n, -1)
+    rows, classes, bounds = sort_candidates(probs, n)
+    scores = suppress(box_corners(bbox[rows]), bounds, probs[rows, classes], method,
+                      iou_threshold, sigma, score_threshold)
+    return split_boxes(probs, bbox, rows, classes, scores, images, n)
+
+
+def nms(final_probs, final_bbox, iou_threshold=NMS_THRESHOLD, method=NMS_METHODS[0],
+        sigma=NMS_SIGMA, score_threshold=0.):
+    """:func:`batch_nms` of a single image"""
+    return batch_nms(final_probs[None], final_bbox[None], iou_threshold, method, sigma, score_threshold)[0]
@@ -1,4 +1,5 @@
 from beagles.backend.net.frameworks.yolo import data, misc, train, predict
+from beagles.backend.net.frameworks.extensions.numpy_nms import NMS_THRESHOLD, NMS_METHODS
 from beagles.io.flags import SharedFlagIO
 from beagles.io.logs import get_logger
 import numpy as np
@@ -46,3 +47,17 @@ def constructor(self, meta, flags):
     # over-ride the threshold in meta if flags has it.
     if flags.threshold > 0.0:
         self.meta['thresh'] = flags.threshold
+
+    # the cfg may set an NMS IOU threshold, over-ride it if flags has one.
+    self.meta.setdefault('nms_thresh', NMS_THRESHOLD)
+    if flags.nms_threshold > 0.0:
+        self.meta['nms_thresh'] = flags.nms_threshold
+    try:
+        assert flags.nms_method in NMS_METHODS, (
+            'Unknown NMS method {}, expected one of {}').format(flags.nms_method, ', '.join(NMS_METHODS))
+    except AssertionError as e:
+        self.flags.error = str(e)
+        self.logger.error(str(e))
+        raise
+    self.meta['nms_method'] = flags.nms_method
+    self.meta['nms_sigma'] = flags.nms_sigma
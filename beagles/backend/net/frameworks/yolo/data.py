@@ -4,6 +4,7 @@ from copy import deepcopy
 import numpy as np
 import os
 import tensorflow as tf
+from beagles.io.metrics import METRICS
 
 
 def parse(self, exclusive=False):
@@ -16,7 +17,13 @@ def parse(self, exclusive=False):
     return dumps, weights
 
 
-def batch(self, chunk):
+def grid(self):
+    """Returns the (H, W) size of the output grid"""
+    S = self.meta['side']
+    return S, S
+
+
+def batch(self, chunk, feed=None):
     """
     Takes a chunk of parsed annotations
     returns value for placeholders of net's 
@@ -24,8 +31,89 @@ def batch(self, chunk):
     """
     # sizes are passed to avoid having separate get_feed_values methods for
     # YOLO and YOLOv2
-    S = self.meta['side']
-    return self.get_feed_values(chunk, S, S)
+    return self.get_feed_values(chunk, *self.grid(), feed)
+
+
+def feed_shapes(grid, num, classes):
+    """Returns {loss feed: shape} for one train instance on a `grid` of (H, W) cells"""
+    HW, B, C = grid[0] * grid[1], num, classes
+    return {
+        '_probs': [HW, B, C], '_confs': [HW, B],
+        '_coord': [HW, B, 4], '_proid': [HW, B, C],
+        '_areas': [HW, B], '_upleft': [HW, B, 2],
+        '_botright': [HW, B, 2]
+    }
+
+
+def feed_buffers(self, size):
+    """
+    Allocates zeroed float32 loss feed buffers for `size` train instances,
+    indexing the first axis gives a view :meth:`get_feed_values` can fill in place
+    """
+    shapes = feed_shapes(self.grid(), self.meta['num'], self.meta['classes'])
+    return {key: np.zeros([size] + shape, dtype=np.float32) for key, shape in shapes.items()}
+
+
+def encode_targets(boxes, size, grid, num, classes, feed=None):
+    """
+    Vectorized YOLO/YOLOv2 regression target encoder.
+
+    Args:
+        boxes: (N, 5) array of [class index, xmin, ymin, xmax, ymax] in pixels.
+
+        size: (width, height) of the image in pixels.
+
+        grid: Grid side as an int (YOLO `side`) or (H, W, ...) (YOLOv2 `out_size`).
+
+        num: Number of boxes per grid cell.
+
+        classes: Number of classes.
+
+        feed: Optional dict of zeroed arrays shaped like :func:`feed_shapes`
+            to fill in place, float64 arrays are allocated otherwise.
+
+    Returns:
+        dict of the seven loss feeds or None if a box center falls outside the grid
+    """
+    H, W = (grid, grid) if np.isscalar(grid) else grid[:2]
+    w, h = size
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 5)
+    if feed is None:
+        feed = {k: np.zeros(v) for k, v in feed_shapes((H, W), num, classes).items()}
+
+    cellx = 1. * w / W
+    celly = 1. * h / H
+    cx = .5 * (boxes[:, 1] + boxes[:, 3]) / cellx
+    cy = .5 * (boxes[:, 2] + boxes[:, 4]) / celly
+    if np.any(cx >= W) or np.any(cy >= H):
+        return None
+    if not len(boxes):
+        return feed
+    coords = np.stack([
+        cx - np.floor(cx),  # centerx
+        cy - np.floor(cy),  # centery
+        np.sqrt((boxes[:, 3] - boxes[:, 1]) / w),
+        np.sqrt((boxes[:, 4] - boxes[:, 2]) / h)
+    ], 1)
+    cells = (np.floor(cy) * W + np.floor(cx)).astype(np.intp)
+
+    # objects sharing a cell overwrite each other, only the last one is kept
+    last = len(cells) - 1 - np.unique(cells[::-1], return_index=True)[1]
+    cells, coords = cells[last], coords[last]
+    half_w = coords[:, 2] ** 2 * .5 * W
+    half_h = coords[:, 3] ** 2 * .5 * H
+    upleft = np.stack([coords[:, 0] - half_w, coords[:, 1] - half_h], 1)  # xleft, yup
+    botright = np.stack([coords[:, 0] + half_w, coords[:, 1] + half_h], 1)  # xright, ybot
+    wh = botright - upleft
+
+    feed['_probs'][cells, :, boxes[last, 0].astype(np.intp)] = 1.
+    feed['_proid'][cells] = 1.
+    feed['_confs'][cells] = 1.
+    feed['_coord'][cells] = coords[:, None, :]
+    feed['_upleft'][cells] = upleft[:, None, :]
+    feed['_botright'][cells] = botright[:, None, :]
+    feed['_areas'][cells] = (wh[:, 0] * wh[:, 1])[:, None]
+    return feed
 
 
 def get_preprocessed_img(self, chunk):
@@ -37,8 +125,12 @@ def get_preprocessed_img(self, chunk):
     return img, w, h, allobj
 
 
-def get_feed_values(self, chunk, dim1, dim2):
-
+def get_feed_values(self, chunk, dim1, dim2, feed=None):
+    """
+    Computes the input and loss feed values for one train instance.
+    If `feed` is given it must hold zeroed arrays shaped like one instance
+    of :meth:`feed_buffers`, they are filled in place and returned.
+    """
     H = dim1
     W = dim2
     C = self.meta['classes']
@@ -48,95 +140,75 @@ def get_feed_values(self, chunk, dim1, dim2):
     # preprocess
     img, w, h, allobj = self.get_preprocessed_img(chunk)
 
-    # Calculate regression target
-    cellx = 1. * w / W
-    celly = 1. * h / H
-    for obj in allobj:
-        centerx = .5 * (obj[1] + obj[3])  # xmin, xmax
-        centery = .5 * (obj[2] + obj[4])  # ymin, ymax
-        cx = centerx / cellx
-        cy = centery / celly
-        if cx >= W or cy >= H:
-            return None, None
-        obj[3] = float(obj[3] - obj[1]) / w
-        obj[4] = float(obj[4] - obj[2]) / h
-        obj[3] = np.sqrt(obj[3])
-        obj[4] = np.sqrt(obj[4])
-        obj[1] = cx - np.floor(cx)  # centerx
-        obj[2] = cy - np.floor(cy)  # centery
-        obj += [int(np.floor(cy) * W + np.floor(cx))]
-
-    # show(im, allobj, S, w, h, cellx, celly) # unit test
-
-    # Calculate placeholders' values
-    probs = np.zeros([H * W, B, C])
-    confs = np.zeros([H * W, B])
-    coord = np.zeros([H * W, B, 4])
-    proid = np.zeros([H * W, B, C])
-    prear = np.zeros([H * W, 4])
-    for obj in allobj:
-        probs[obj[5], :, :] = [[0.] * C] * B
-        probs[obj[5], :, labels.index(obj[0])] = 1.
-        proid[obj[5], :, :] = [[1.] * C] * B
-        coord[obj[5], :, :] = [obj[1:5]] * B
-        prear[obj[5], 0] = obj[1] - obj[3] ** 2 * .5 * W  # xleft
-        prear[obj[5], 1] = obj[2] - obj[4] ** 2 * .5 * H  # yup
-        prear[obj[5], 2] = obj[1] + obj[3] ** 2 * .5 * W  # xright
-        prear[obj[5], 3] = obj[2] + obj[4] ** 2 * .5 * H  # ybot
-        confs[obj[5], :] = [1.] * B
-
-    # Finalise the placeholders' values
-    upleft = np.expand_dims(prear[:, 0:2], 1)
-    botright = np.expand_dims(prear[:, 2:4], 1)
-    wh = botright - upleft
-    area = wh[:, :, 0] * wh[:, :, 1]
-    upleft = np.concatenate([upleft] * B, 1)
-    botright = np.concatenate([botright] * B, 1)
-    areas = np.concatenate([area] * B, 1)
+    # Calculate regression target and placeholders' values
+    if feed is None:
+        feed = {key: value[0] for key, value in self.feed_buffers(1).items()}
+    boxes = [[labels.index(obj[0])] + obj[1:5] for obj in allobj]
+    with METRICS.timed('encode'):
+        feed = encode_targets(boxes, (w, h), (H, W), B, C, feed)
+    if feed is None:
+        return None, None
 
     # value for placeholder at input layer
     inp_feed_val = img
     # value for placeholder at loss layer
-    loss_feed_val = {
-        '_probs': probs, '_confs': confs,
-        '_coord': coord, '_proid': proid,
-        '_areas': areas, '_upleft': upleft,
-        '_botright': botright
-    }
+    loss_feed_val = feed
 
     return inp_feed_val, loss_feed_val
 
-def shuffle(self, data, weights=None):
+
+def _epoch_indices(self, data, weights=None):
+    """Samples the order of :obj:`data` for one epoch, weighted by class if `weights` is given"""
+    if weights:
+        _weights = list()
+        score = list()
+        for img in data:
+            for box in img[1][2]:
+                score.append(weights.get(str(box[0])))
+            _weights.append(np.subtract(1, np.mean(score)))
+        _weights = np.divide(_weights, np.sum(_weights))
+        return np.random.choice(np.arange(self.flags.size), self.flags.size, p=_weights)
+    return np.random.permutation(np.arange(self.flags.size))
+
+
+def _batch_size(self, data):
     batch = self.flags.batch
     self.flags.size = len(data)
     self.logger.info('Dataset of {} instance(s)'.format(self.flags.size))
     if batch > self.flags.size:
         self.flags.batch = batch = self.flags.size
+    return batch
+
+
+def shuffle(self, data, weights=None):
+    """
+    Yields (x_batch, loss_feed) tuples for `flags.epoch` epochs of
+    :obj:`data`, sampled by class if `weights` is given. The batches are
+    views into two sets of preallocated buffers used in turn: a yielded
+    batch stays intact while the next one is assembled, but is
+    overwritten two batches later. Copy any batch kept past that.
+    """
+    batch = _batch_size(self, data)
     batch_per_epoch = int(self.flags.size / batch)
+    ring = [(np.zeros([batch] + list(self.meta['inp_size']), dtype=np.float32),
+             self.feed_buffers(batch)) for _ in range(2)]
 
     for i in range(self.flags.epoch):
-        if weights:
-            _weights = list()
-            score = list()
-            for img in data:
-                for box in img[1][2]:
-                    score.append(weights.get(str(box[0])))
-                _weights.append(np.subtract(1, np.mean(score)))
-            _weights = np.divide(_weights, np.sum(_weights))
-            shuffle_idx = np.random.choice(np.arange(self.flags.size), self.flags.size, p=_weights)
-        else:
-            shuffle_idx = np.random.permutation(np.arange(self.flags.size))
+        shuffle_idx = _epoch_indices(self, data, weights)
 
         for b in range(batch_per_epoch):
 
             # yield these
-            x_batch = list()
-            feed_batch = dict()
+            x_batch, feed_batch = ring[b % 2]
+            for buffer in feed_batch.values():
+                buffer.fill(0.)
+            n = 0
 
             for j in range(b*batch, b*batch+batch):
                 train_instance = data[shuffle_idx[j]]
+                feed = {key: buffer[n] for key, buffer in feed_batch.items()}
                 try:
-                    inp, new_feed = self.batch(train_instance)
+                    inp, new_feed = self.batch(train_instance, feed)
                 except ZeroDivisionError:
                     self.logger.error("This image's width or height are zeros: ", train_instance[0])
                     self.logger.error('train_instance:', train_instance)
@@ -145,15 +217,58 @@ def shuffle(self, data, weights=None):
 
                 if inp is None:
                     continue
-                x_batch += [np.expand_dims(inp, 0)]
+                x_batch[n] = inp
+                n += 1
 
-                for key in new_feed:
-                    new = new_feed[key]
-                    old_feed = feed_batch.get(key, np.zeros((0,) + new.shape))
-                    feed_batch[key] = np.concatenate([old_feed, [new]])
-
-            x_batch = np.concatenate(x_batch, 0)
-            yield x_batch, feed_batch
+            yield x_batch[:n], {key: buffer[:n] for key, buffer in feed_batch.items()}
         
         self.logger.info(f'Finish {i + 1} epoch{"es" if i == 0 else ""}')
 
+
+def dataset(self, data, weights=None):
+    """
+    Builds a :obj:`tf.data.Dataset` yielding the same (x_batch, loss_feed)
+    tuples as :meth:`shuffle`. Reading, augmenting and encoding each
+    train instance runs in `flags.parallel_calls` parallel map calls
+    (-1 lets tf.data autotune) and batches are prefetched while the
+    previous step trains. An instance with a box outside the grid is
+    replaced by the next usable one, so every epoch has the same number
+    of full batches.
+    """
+    batch = _batch_size(self, data)
+    batch_per_epoch = int(self.flags.size / batch)
+    shapes = {key: buffer.shape[1:] for key, buffer in self.feed_buffers(0).items()}
+    feeds = list(shapes)
+
+    def load(idx):
+        for offset in range(len(data)):
+            train_instance = data[(idx + offset) % len(data)]
+            try:
+                inp, new_feed = self.batch(train_instance)
+            except ZeroDivisionError:
+                self.logger.error(f"This image's width or height are zeros: {train_instance[0]}")
+                raise
+            if inp is not None:
+                values = [inp] + [new_feed[key] for key in feeds]
+                return tuple(np.asarray(v, dtype=np.float32) for v in values)
+        raise ValueError('No train instance has every box inside the grid')
+
+    def read(idx):
+        inp, *values = tf.numpy_function(load, [idx], [tf.float32] * (len(feeds) + 1))
+        inp.set_shape(self.meta['inp_size'])
+        for key, value in zip(feeds, values):
+            value.set_shape(shapes[key])
+        return (inp, *values)
+
+    def to_feed(inp, *values):
+        return inp, dict(zip(feeds, values))
+
+    # sample every epoch up front so ordering matches shuffle()
+    order = [_epoch_indices(self, data, weights)[:batch_per_epoch * batch]
+             for _ in range(self.flags.epoch)]
+    parallel_calls = self.flags.parallel_calls
+    parallel_calls = tf.data.experimental.AUTOTUNE if parallel_calls < 1 else parallel_calls
+    pipeline = tf.data.Dataset.from_tensor_slices(np.concatenate(order))
+    pipeline = pipeline.map(read, num_parallel_calls=parallel_calls).map(to_feed)
+    pipeline = pipeline.batch(batch, drop_remainder=True)
+    return pipeline.prefetch(tf.data.experimental.AUTOTUNE)
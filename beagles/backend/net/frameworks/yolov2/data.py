@@ -1,4 +1,10 @@
-def batch(self, chunk):
+def grid(self):
+    """Returns the (H, W) size of the output grid"""
+    H, W, _ = self.meta['out_size']
+    return H, W
+
+
+def batch(self, chunk, feed=None):
     """
     Takes a chunk of parsed annotations
     returns value for placeholders of net's 
@@ -6,7 +12,6 @@ def batch(self, chunk):
     """
     # sizes are passed to avoid having duplicate get_feed_values methods for
     # YOLO and YOLOv2
-    H, W, _ = self.meta['out_size']
-    return self.get_feed_values(chunk, H, W)
+    return self.get_feed_values(chunk, *self.grid(), feed)
 
 
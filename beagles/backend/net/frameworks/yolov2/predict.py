@@ -1,5 +1,14 @@
 import numpy as np
-from beagles.backend.net.frameworks.extensions.cy_yolo2_findboxes import box_constructor
+from beagles.io.metrics import METRICS
+from beagles.backend.net.frameworks.extensions import numpy_nms
+from beagles.backend.net.frameworks.extensions.numpy_nms import nms
+try:
+    from beagles.backend.net.frameworks.extensions.cy_yolo2_findboxes import box_constructor
+    from beagles.backend.net.frameworks.extensions.cy_yolo2_findboxes import box_decoder as compiled_box_decoder
+    from beagles.backend.net.frameworks.extensions.nms import batch_nms
+except ImportError:  # extensions were not compiled
+    box_constructor = compiled_box_decoder = None
+    batch_nms = numpy_nms.batch_nms
 
 
 def expit(x):
@@ -7,14 +16,53 @@ def expit(x):
 
 
 def _softmax(x):
-    e_x = np.exp(x - np.max(x))
-    out = e_x / e_x.sum()
+    e_x = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    out = e_x / e_x.sum(axis=-1, keepdims=True)
     return out
 
 
+def box_decoder(meta, net_out):
+    """
+    NumPy equivalent of the compiled `box_decoder`, math runs in float64 and
+    is rounded to float32 at the same points so both give identical boxes.
+
+    Returns:
+        (H*W*B, C) thresholded class probabilities and (H*W*B, 5) [x, y, w, h, confidence] boxes
+    """
+    H, W, _ = meta['out_size']
+    C, B = meta['classes'], meta['num']
+    net_out = np.asarray(net_out, dtype=np.float32).reshape([H, W, B, C + 5]).astype(np.float64)
+    anchors = np.asarray(meta['anchors'], dtype=np.float64).reshape([B, 2])
+    col = np.arange(W, dtype=np.float64)[None, :, None]
+    row = np.arange(H, dtype=np.float64)[:, None, None]
+
+    conf = expit(net_out[..., 4])
+    bbox = np.stack([
+        (col + expit(net_out[..., 0])) / W,
+        (row + expit(net_out[..., 1])) / H,
+        np.exp(net_out[..., 2]) * anchors[:, 0] / W,
+        np.exp(net_out[..., 3]) * anchors[:, 1] / H,
+        conf
+    ], -1).astype(np.float32)
+    probs = (_softmax(net_out[..., 5:]) * conf[..., None]).astype(np.float32)
+    probs[probs <= np.float32(meta['thresh'])] = 0.
+    return probs.reshape(H * W * B, C), bbox.reshape(H * W * B, 5)
+
+
+def numpy_box_constructor(meta, net_out):
+    return nms(*box_decoder(meta, net_out), meta['nms_thresh'], meta['nms_method'], meta['nms_sigma'], meta['thresh'])
+
+
+def suppress(meta, probs, bbox):
+    """NMS of one image's decoded boxes, by the compiled engine if it was built"""
+    return batch_nms(probs[None], bbox[None], meta['nms_thresh'], meta['nms_method'],
+                     meta['nms_sigma'], meta['thresh'])[0]
+
+
 def findboxes(self, net_out):
-    # meta
-    meta = self.meta
-    boxes = list()
-    boxes = box_constructor(meta, net_out)
-    return boxes
+    """Same boxes as :func:`box_constructor`, with decoding and NMS timed as separate phases"""
+    decoder = compiled_box_decoder or box_decoder
+    with METRICS.timed('decode'):
+        probs, bbox = decoder(self.meta, net_out)
+    with METRICS.timed('nms'):
+        return suppress(self.meta, probs, bbox)
@@ -0,0 +1,10 @@
+from beagles.backend.net.frameworks.yolov3 import data, predict, train
+from beagles.backend.net.frameworks import yolo
+
+THRESHOLD = .5
+""":obj:`float`: darknet's default detection threshold, `[yolo]` layers do not set one"""
+
+
+def constructor(self, meta, flags):
+    meta.setdefault('thresh', THRESHOLD)
+    yolo.constructor(self, meta, flags)
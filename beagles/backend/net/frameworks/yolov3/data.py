@@ -0,0 +1,124 @@
+import numpy as np
+from beagles.io.metrics import METRICS
+
+MAX_BOXES = 90
+""":obj:`int`: most ground truth boxes per image compared against predictions for the ignore mask"""
+
+
+def anchor_slots(meta):
+    """
+    Per-row constants of the flattened and concatenated detection heads in `meta['heads']`.
+
+    Returns:
+        (N, 2) [column, row] of the grid cell, (N, 2) [W, H] of the head grid and
+        (N, 2) [width, height] of the anchor relative to the input size, N = sum(H * W * B)
+    """
+    h, w, _ = meta['inp_size']
+    anchors = np.asarray(meta['anchors'], dtype=np.float64).reshape(-1, 2) / [w, h]
+    cells, grids, slots = list(), list(), list()
+    for H, W, mask in meta['heads']:
+        row, col, anchor = np.meshgrid(np.arange(H), np.arange(W), np.arange(len(mask)), indexing='ij')
+        cells.append(np.stack([col.ravel(), row.ravel()], 1))
+        grids.append(np.tile([W, H], [col.size, 1]))
+        slots.append(anchors[mask][anchor.ravel()])
+    return (np.concatenate(cells).astype(np.float64), np.concatenate(grids).astype(np.float64),
+            np.concatenate(slots))
+
+
+def feed_shapes(meta):
+    """Returns {loss feed: shape} for one train instance of the heads in `meta`"""
+    N = sum(H * W * len(mask) for H, W, mask in meta['heads'])
+    return {
+        '_coord': [N, 4], '_confs': [N],
+        '_probs': [N, meta['classes']], '_scale': [N],
+        '_truth': [MAX_BOXES, 4]
+    }
+
+
+def feed_buffers(self, size):
+    """
+    Allocates zeroed float32 loss feed buffers for `size` train instances,
+    indexing the first axis gives a view :meth:`batch` can fill in place
+    """
+    return {key: np.zeros([size] + shape, dtype=np.float32) for key, shape in feed_shapes(self.meta).items()}
+
+
+def encode_targets(boxes, size, meta, feed=None):
+    """
+    Vectorized YOLOv3 regression target encoder. Each box is assigned to the
+    anchor, across all heads, whose shape overlaps it best and to the grid cell
+    of its center in the head owning that anchor.
+
+    Args:
+        boxes: (N, 5) array of [class index, xmin, ymin, xmax, ymax] in pixels.
+
+        size: (width, height) of the image in pixels.
+
+        meta: Framework metadata holding `heads`, `anchors`, `inp_size` and `classes`.
+
+        feed: Optional dict of zeroed arrays shaped like :func:`feed_shapes`
+            to fill in place, float64 arrays are allocated otherwise.
+
+    Returns:
+        dict of the five loss feeds or None if a box center falls outside the image
+    """
+    w, h = size
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 5)
+    if feed is None:
+        feed = {k: np.zeros(v) for k, v in feed_shapes(meta).items()}
+
+    x = .5 * (boxes[:, 1] + boxes[:, 3]) / w
+    y = .5 * (boxes[:, 2] + boxes[:, 4]) / h
+    if np.any(x >= 1.) or np.any(y >= 1.):
+        return None
+    if not len(boxes):
+        return feed
+    bw = np.maximum(boxes[:, 3] - boxes[:, 1], 1.) / w
+    bh = np.maximum(boxes[:, 4] - boxes[:, 2], 1.) / h
+    truth = np.stack([x, y, bw, bh], 1)[:MAX_BOXES]
+    feed['_truth'][:len(truth)] = truth
+
+    inp_h, inp_w, _ = meta['inp_size']
+    anchors = np.asarray(meta['anchors'], dtype=np.float64).reshape(-1, 2) / [inp_w, inp_h]
+    intersect = np.minimum(bw[:, None], anchors[:, 0]) * np.minimum(bh[:, None], anchors[:, 1])
+    iou = intersect / ((bw * bh)[:, None] + anchors[:, 0] * anchors[:, 1] - intersect)
+    best = np.argmax(iou, 1)
+    offset = 0
+    for H, W, mask in meta['heads']:
+        B = len(mask)
+        lookup = np.full(len(anchors), -1)
+        lookup[mask] = np.arange(B)
+        anchor = lookup[best]
+        mine = anchor >= 0
+        col, row = np.floor(x[mine] * W), np.floor(y[mine] * H)
+        # objects sharing a slot overwrite each other, only the last one is kept
+        slots = offset + ((row * W + col) * B + anchor[mine]).astype(np.intp)
+        feed['_coord'][slots] = np.stack([
+            x[mine] * W - col,
+            y[mine] * H - row,
+            np.log(bw[mine] / anchors[best[mine], 0]),
+            np.log(bh[mine] / anchors[best[mine], 1])
+        ], 1)
+        feed['_confs'][slots] = 1.
+        feed['_probs'][slots, boxes[mine, 0].astype(np.intp)] = 1.
+        feed['_scale'][slots] = 2. - bw[mine] * bh[mine]
+        offset += H * W * B
+    return feed
+
+
+def batch(self, chunk, feed=None):
+    """
+    Takes a chunk of parsed annotations
+    returns value for placeholders of net's
+    input & loss layer correspond to this chunk
+    """
+    labels = self.meta['labels']
+    img, w, h, allobj = self.get_preprocessed_img(chunk)
+    if feed is None:
+        feed = {key: value[0] for key, value in self.feed_buffers(1).items()}
+    boxes = [[labels.index(obj[0])] + obj[1:5] for obj in allobj]
+    with METRICS.timed('encode'):
+        feed = encode_targets(boxes, (w, h), self.meta, feed)
+    if feed is None:
+        return None, None
+    return img, feed
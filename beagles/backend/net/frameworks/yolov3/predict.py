@@ -0,0 +1,48 @@
+import numpy as np
+from beagles.backend.net.frameworks.extensions.numpy_nms import nms
+from beagles.io.metrics import METRICS
+from beagles.backend.net.frameworks.yolov2.predict import expit, suppress
+from beagles.backend.net.frameworks.yolov3.data import anchor_slots
+try:
+    from beagles.backend.net.frameworks.extensions.cy_yolo3_findboxes import box_constructor
+    from beagles.backend.net.frameworks.extensions.cy_yolo3_findboxes import box_decoder as compiled_box_decoder
+except ImportError:  # extensions were not compiled
+    box_constructor = compiled_box_decoder = None
+
+
+def box_decoder(meta, net_out):
+    """
+    NumPy equivalent of the compiled `box_decoder`, every head is decoded into one
+    set of rows so detections of all scales meet in a single NMS. Math runs in
+    float64 and is rounded to float32 at the same points as the compiled decoder.
+
+    Returns:
+        (N, C) thresholded class probabilities and (N, 5) [x, y, w, h, confidence] boxes, N = sum(H * W * B)
+    """
+    C = meta['classes']
+    cells, grids, anchors = anchor_slots(meta)
+    net_out = np.asarray(net_out, dtype=np.float32).reshape([len(cells), C + 5]).astype(np.float64)
+
+    conf = expit(net_out[:, 4])
+    bbox = np.concatenate([
+        (cells + expit(net_out[:, 0:2])) / grids,
+        np.exp(net_out[:, 2:4]) * anchors,
+        conf[:, None]
+    ], 1).astype(np.float32)
+    # classes are independent logistic outputs rather than a softmax
+    probs = (expit(net_out[:, 5:]) * conf[:, None]).astype(np.float32)
+    probs[probs <= np.float32(meta['thresh'])] = 0.
+    return probs, bbox
+
+
+def numpy_box_constructor(meta, net_out):
+    return nms(*box_decoder(meta, net_out), meta['nms_thresh'], meta['nms_method'], meta['nms_sigma'], meta['thresh'])
+
+
+def findboxes(self, net_out):
+    """Same boxes as :func:`box_constructor`, with decoding and NMS timed as separate phases"""
+    decoder = compiled_box_decoder or box_decoder
+    with METRICS.timed('decode'):
+        probs, bbox = decoder(self.meta, net_out)
+    with METRICS.timed('nms'):
+        return suppress(self.meta, probs, bbox)
@@ -0,0 +1,66 @@
+import tensorflow as tf
+import os
+from beagles.backend.net.frameworks.yolov3.data import anchor_slots
+
+IGNORE_THRESHOLD = .5
+
+
+@tf.function
+def loss(self, y_pred, _coord, _confs, _probs, _scale, _truth):
+    """
+    Takes net.out and placeholders value
+    returned in batch() func above,
+    to build train_op and loss
+    """
+    _coord = tf.cast(_coord, tf.float32)
+    _confs = tf.cast(_confs, tf.float32)
+    _probs = tf.cast(_probs, tf.float32)
+    _scale = tf.cast(_scale, tf.float32)
+    _truth = tf.cast(_truth, tf.float32)
+
+    # meta
+    m = self.meta
+    C = m['classes']
+    ignore = float(m.get('ignore_thresh', IGNORE_THRESHOLD))
+    cells, grids, anchors = [tf.constant(c, tf.float32) for c in anchor_slots(m)]
+    if self.first:
+        self.logger.info('{} loss hyper-parameters:'.format(m['model']))
+        self.logger.info('heads   = {}'.format([(H, W) for H, W, _ in m['heads']]))
+        self.logger.info('masks   = {}'.format([mask for *_, mask in m['heads']]))
+        self.logger.info('classes = {}'.format(C))
+        self.logger.info('ignore  = {}'.format(ignore))
+        # Anchors logged as a list of ordered pairs for readability
+        self.logger.info('anchors = {}'.format(list(zip(*[iter(m['anchors'])] * 2))))
+        self.first = False
+
+    net_out = tf.reshape(y_pred, [-1, cells.shape[0], C + 5])
+    adjusted_xy = tf.math.sigmoid(net_out[:, :, 0:2])
+    adjusted_wh = net_out[:, :, 2:4]
+
+    # predictions overlapping any truth by more than ignore_thresh are not pushed towards no object
+    pred_xy = (cells + adjusted_xy) / grids
+    pred_wh = tf.math.exp(adjusted_wh) * anchors
+    truth_xy = _truth[:, None, :, 0:2]
+    truth_wh = _truth[:, None, :, 2:4]
+    intersect_upleft = tf.math.maximum(pred_xy[:, :, None] - pred_wh[:, :, None] * .5, truth_xy - truth_wh * .5)
+    intersect_botright = tf.math.minimum(pred_xy[:, :, None] + pred_wh[:, :, None] * .5, truth_xy + truth_wh * .5)
+    intersect_wh = tf.math.maximum(intersect_botright - intersect_upleft, 0.0)
+    intersect = intersect_wh[..., 0] * intersect_wh[..., 1]
+    areas = pred_wh[:, :, None, 0] * pred_wh[:, :, None, 1] + truth_wh[..., 0] * truth_wh[..., 1]
+    best_iou = tf.math.reduce_max(tf.math.divide_no_nan(intersect, areas - intersect), 2)
+    noobj = (1. - _confs) * tf.cast(best_iou <= ignore, tf.float32)
+
+    # darknet's deltas, squared error of cell offsets and log sizes weighted by 2 - w * h
+    # and logistic cross entropy of objectness and of every class
+    coord_loss = tf.math.pow(tf.concat([adjusted_xy, adjusted_wh], 2) - _coord, 2)
+    coord_loss = tf.math.reduce_sum(coord_loss * (_confs * _scale)[:, :, None], [1, 2])
+    conf_loss = tf.nn.sigmoid_cross_entropy_with_logits(labels=_confs, logits=net_out[:, :, 4])
+    conf_loss = tf.math.reduce_sum(conf_loss * (_confs + noobj), 1)
+    class_loss = tf.nn.sigmoid_cross_entropy_with_logits(labels=_probs, logits=net_out[:, :, 5:])
+    class_loss = tf.math.reduce_sum(class_loss * _confs[:, :, None], [1, 2])
+
+    self.logger.info('Building {} loss'.format(m['model']))
+    loss = tf.math.reduce_mean(coord_loss + conf_loss + class_loss)
+    scope = "/".join([os.path.basename(m['model']), self.flags.trainer, "loss"])
+    tf.compat.v1.summary.scalar(scope, loss)
+    return loss
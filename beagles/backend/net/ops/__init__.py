@@ -1,6 +1,7 @@
 from beagles.backend.net.ops.simple import *
 from beagles.backend.net.ops.rnn import *
 from beagles.backend.net.ops.convolution import *
+from beagles.backend.net.ops.fusion import fuse
 
 op_types = {
     'convolutional': Convolutional,
@@ -34,6 +35,7 @@ op_types = {
     'local': Local,
     'route': Route,
     'reorg': Reorg,
+    'yolo': Yolo,
 }
 
 
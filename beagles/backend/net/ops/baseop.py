@@ -2,6 +2,9 @@ import tensorflow as tf
 
 
 class BaseOp(tf.keras.layers.Layer):
+    head = False
+    """bool: whether the output of this op is a detection head of the :obj:`Net`"""
+
     def __init__(self, layer, inp, num, roof):
         super(BaseOp, self).__init__()
         self.lay = layer
@@ -11,3 +14,15 @@ class BaseOp(tf.keras.layers.Layer):
         self.var = not self.gap > 0
         self.scope = '{}-{}'.format(str(self.num), self.lay.type)
 
+
+    @property
+    def sources(self):
+        """Numbers of earlier layers whose outputs are passed to :meth:`call` as `routed`"""
+        return list()
+
+    def initializer(self, var, default='random_normal'):
+        """Initializes `var` from the darknet weights loaded into :attr:`lay` if any, otherwise with `default`"""
+        value = self.lay.w.get(var)
+        if value is None:
+            return default
+        return lambda shape, dtype=None, **kwargs: tf.reshape(tf.constant(value, dtype=dtype or tf.float32), shape)
@@ -2,6 +2,19 @@ from beagles.backend.net.ops.baseop import BaseOp
 import tensorflow as tf
 import numpy as np
 
+ACTIVATIONS = {
+    'linear': tf.identity,
+    'leaky': lambda x: tf.maximum(.1 * x, x),
+    'relu': tf.nn.relu,
+    'logistic': tf.nn.sigmoid,
+    'tanh': tf.nn.tanh,
+    'elu': tf.nn.elu,
+    'selu': tf.nn.selu,
+}
+""":obj:`dict`: darknet activation name to the function a :class:`Convolutional` applies to its output"""
+LINEAR = 'linear'
+
+
 class Reorg(BaseOp):
     def __init__(self, *args):
         super(Reorg, self).__init__(*args)
@@ -20,8 +33,18 @@ class Local(BaseOp):
         filt = self.lay.wshape['kernels'][-1]
         stride = (self.lay.stride,) * 2
         self._lay = tf.keras.layers.LocallyConnected2D(filt, ksz, stride,
+                                                       kernel_initializer=self.initializer('kernels', 'glorot_uniform'),
+                                                       bias_initializer=self.bias_initializer(),
                                                        trainable=True, name=self.scope)
 
+    def bias_initializer(self):
+        """Initializes the biases from darknet's channel major layout, which the v1 loader keeps as it is"""
+        biases = self.lay.w.get('biases')
+        if biases is None:
+            return 'zeros'
+        biases = np.asarray(biases).reshape(self.lay.dnshape[1], self.lay.dnshape[0]).T
+        return lambda shape, dtype=None, **kwargs: tf.reshape(tf.constant(biases, dtype=dtype or tf.float32), shape)
+
     def call(self, inputs, **kwargs):
         pad = [[self.lay.pad, self.lay.pad]] * 2
         temp = tf.pad(inputs, [[0, 0]] + pad + [[0, 0]])
@@ -31,37 +54,84 @@ class Local(BaseOp):
 class Convolutional(BaseOp):
     def __init__(self, *args, **kwargs):
         super(Convolutional,self).__init__(*args, **kwargs)
+        self.activation = self.lay.activation
 
     def build(self, input_shape):
         self.b = self.add_weight(
             shape=tuple(self.lay.wshape['biases']),
-            initializer="random_normal",
+            initializer=self.initializer('biases'),
+            trainable=True,
+            name=f'{self.scope}-bias'
+        )
+        self.kw = self.add_weight(
+            shape=tuple(self.lay.wshape['kernel']),
+            initializer=self.initializer('kernel', 'glorot_uniform'),
             trainable=True,
+            name=f'{self.scope}-kweight'
+        )
+        self.bn = None
+        if self.lay.batch_norm:
+            self.bn = tf.keras.layers.BatchNormalization(
+                center=False,
+                scale=True,
+                epsilon=1e-5,
+                name=f'{self.scope}-batchnorm',
+                gamma_initializer=self.initializer('gamma', 'ones'),
+                moving_mean_initializer=self.initializer('moving_mean', 'zeros'),
+                moving_variance_initializer=self.initializer('moving_variance', 'ones')
+            )
+            self.bn.build([None, None, None, self.lay.filters])
+
+    def call(self, inputs, training=False, **kwargs):
+        pad = [[self.lay.pad, self.lay.pad]] * 2
+        temp = tf.pad(inputs, [[0, 0]] + pad + [[0, 0]])
+        # layers below the roof keep their batch norm statistics frozen like at inference
+        training = training and self.var
+        kernel, biases = (self.kw, self.b) if training else self.folded()
+        temp = tf.nn.conv2d(temp, kernel, padding='VALID',
+                            name=self.scope, strides=[1] + [self.lay.stride] * 2 + [1])
+        if self.bn is not None and training:
+            temp = self.bn(temp, training=True)
+        activation = ACTIVATIONS.get(self.activation, tf.identity)
+        return activation(tf.nn.bias_add(temp, biases))
+
+    def folded(self):
+        """Returns the kernel and biases with the inference batch norm folded in,
+        gamma * (conv(x, k) - mean) / sqrt(variance + epsilon) + b is conv(x, k * scale) + b - mean * scale
+        """
+        if self.bn is None:
+            return self.kw, self.b
+        scale = self.bn.gamma * tf.math.rsqrt(self.bn.moving_variance + self.bn.epsilon)
+        return self.kw * scale, self.b - self.bn.moving_mean * scale
+
+
+class FoldedConvolutional(BaseOp):
+    """Inference only :class:`Convolutional` holding the kernel and biases of `conv` with its
+    batch norm folded in as constants.
+    """
+    def __init__(self, conv):
+        super(FoldedConvolutional, self).__init__(conv.lay, conv.inp, conv.num, conv.num)
+        self.kernel, self.biases = [value.numpy() for value in conv.folded()]
+        self.activation = conv.activation
+
+    def build(self, input_shape):
+        self.kw = self.add_weight(
+            shape=self.kernel.shape,
+            initializer=tf.constant_initializer(self.kernel),
+            trainable=False,
+            name=f'{self.scope}-kweight'
+        )
+        self.b = self.add_weight(
+            shape=self.biases.shape,
+            initializer=tf.constant_initializer(self.biases),
+            trainable=False,
             name=f'{self.scope}-bias'
         )
 
     def call(self, inputs, **kwargs):
         pad = [[self.lay.pad, self.lay.pad]] * 2
         temp = tf.pad(inputs, [[0, 0]] + pad + [[0, 0]])
-        self.kw = self.add_weight(shape=tuple(self.lay.wshape['kernel']), dtype=tf.float32,
-                                  name=f'{self.scope}-kweight' )
         temp = tf.nn.conv2d(temp, self.kw, padding='VALID',
                             name=self.scope, strides=[1] + [self.lay.stride] * 2 + [1])
-        if self.lay.batch_norm:
-            temp = self.batchnorm(temp)
-        return tf.nn.bias_add(temp, self.b)
-
-    def batchnorm(self, inputs):
-        if not self.var:
-            temp = (inputs - self.lay.w['moving_mean'])
-            temp /= (np.sqrt(self.lay.w['moving_variance']) + 1e-5)
-            temp *= self.lay.w['gamma']
-            return temp
-        else:
-            args = dict({
-                'center': False,
-                'scale': True,
-                'epsilon': 1e-5,
-                'name': self.scope,
-            })
-            return tf.keras.layers.BatchNormalization(**args)(inputs)
+        activation = ACTIVATIONS.get(self.activation, tf.identity)
+        return activation(tf.nn.bias_add(temp, self.b))
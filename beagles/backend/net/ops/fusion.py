@@ -0,0 +1,26 @@
+from beagles.backend.net.ops.convolution import Convolutional, FoldedConvolutional
+
+IDENTITIES = ['linear', 'dropout']
+""":obj:`list`: types of ops that return their input at inference"""
+
+
+def fuse(layers):
+    """
+    Inference graph pass over built ops of a :obj:`beagles.backend.net.Net`.
+    Batch norm is folded into every convolution, which already applies its own
+    activation, and identity ops are dropped. Ops whose outputs are read by a route
+    or shortcut are kept as they are.
+
+    Returns:
+        list of ops for a lean inference only :obj:`beagles.backend.net.Net`
+    """
+    routed = {number for layer in layers for number in layer.sources}
+    fused = list()
+    for layer in layers:
+        free = layer.lay.number not in routed
+        if layer.lay.type in IDENTITIES and free and not layer.head:
+            continue
+        if isinstance(layer, Convolutional):
+            layer = FoldedConvolutional(layer)
+        fused.append(layer)
+    return fused
@@ -5,16 +5,12 @@ class Route(BaseOp):
     def __init__(self, *args):
         super(Route, self).__init__(*args)
 
-    def call(self, inputs, **kwargs):
-        routes = self.lay.routes
-        routes_out = list()
-        for r in routes:
-            this = self.inp
-            while this.lay.number != r:
-                this = this.inp
-                assert this is not None, f'Routing to non-existence {r}'
-            routes_out += [this]
-        return tf.concat(routes_out, 3)
+    @property
+    def sources(self):
+        return self.lay.routes
+
+    def call(self, inputs, routed=None, **kwargs):
+        return tf.concat(routed, 3, name=self.scope)
 
 
 class Connected(BaseOp):
@@ -24,13 +20,13 @@ class Connected(BaseOp):
     def build(self, input_shape):
         self.w = self.add_weight(
             shape=tuple(self.lay.wshape['weights']),
-            initializer="random_normal",
+            initializer=self.initializer('weights'),
             trainable=True,
             name=f'{self.scope}-weights'
         )
         self.b = self.add_weight(
             shape=tuple(self.lay.wshape['biases']),
-            initializer="random_normal",
+            initializer=self.initializer('biases'),
             trainable=True,
             name=f'{self.scope}-bias'
         )
@@ -95,14 +91,12 @@ class Shortcut(BaseOp):
     def __init__(self, *args):
         super(Shortcut, self).__init__(*args)
 
-    def call(self, inputs, **kwargs):
-        from_layer = self.lay.from_layer
-        this = self.inp
-        # walk backwards thru inputs until we reach the target from_layer
-        while this.lay.number != from_layer:
-            this = this.inp
-            assert this is not None, f'Shortcut to non-existence {self.lay.from_layer}'
-        return tf.add(inputs, this, name=self.scope)
+    @property
+    def sources(self):
+        return [self.lay.from_layer]
+
+    def call(self, inputs, routed=None, **kwargs):
+        return tf.add(inputs, routed[0], name=self.scope)
 
 
 class UpSample(BaseOp):
@@ -111,7 +105,17 @@ class UpSample(BaseOp):
 
     def call(self, inputs, **kwargs):
         size = (self.lay.height, self.lay.width)
-        tf.image.resize(inputs, size, method='nearest', name=self.scope)
+        return tf.image.resize(inputs, size, method='nearest', name=self.scope)
+
+
+class Yolo(BaseOp):
+    head = True
+
+    def __init__(self, *args):
+        super(Yolo, self).__init__(*args)
+
+    def call(self, inputs, **kwargs):
+        return tf.identity(inputs, name=self.scope)
 
 
 # ---Activations---
@@ -2,17 +2,22 @@ import os
 import sys
 sys.path.append(os.getcwd())
 from beagles.io.flags import SharedFlagIO
-from beagles.backend.net import NetBuilder, train, predict, annotate
+from beagles.io.progress import ProgressEvents
+from beagles.io.metrics import METRICS, METRICS_FILE, summary_dir
+from beagles.backend.net import NetBuilder, train, predict, annotate, export
 
 if __name__ == '__main__':
     io = SharedFlagIO(subprogram=True)
     flags = io.read_flags()
     flags.started = True
+    METRICS.write_json_at_exit(os.path.join(summary_dir(flags), METRICS_FILE))
     net_builder = NetBuilder(flags=flags)
     net, framework, manager = net_builder()
     flags = io.read_flags()
     if flags.train:
         train(net_builder.annotation_data, net_builder.class_weights, flags, net, framework, manager)
+    elif flags.export:
+        export(flags, net, framework)
     elif flags.video:
         annotate(flags, net, framework)
     else:
@@ -21,4 +26,6 @@ if __name__ == '__main__':
     flags.progress = 100.0
     flags.done = True
     io.io_flags()
+    with ProgressEvents(flags.events) as events:
+        events.emit('done', progress=flags.progress)
     exit(0)
\ No newline at end of file
@@ -25,6 +25,21 @@ PostprocessedBox = PostprocessedBox
 :class:`PostprocessedBox`
 """
 
+BoxArray = BoxArray
+"""
+:class:`BoxArray`
+"""
+
+PreprocessedBoxes = PreprocessedBoxes
+"""
+:class:`PreprocessedBoxes`
+"""
+
+ProcessedBoxes = ProcessedBoxes
+"""
+:class:`ProcessedBoxes`
+"""
+
 Flags = Flags
 """
 :class:`Flags`
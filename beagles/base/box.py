@@ -39,3 +39,99 @@ class ProcessedBox(NamedTuple):
     label: str
     max_idx: int
     max_prob: float
+
+
+class BoxArray(object):
+    """
+    Columnar container of boxes backed by a NumPy structured array.
+
+    Columns are read as attributes, e.g. `boxes.probs`, and iterating or
+    indexing with an int yields :attr:`box_type` NamedTuples so code written
+    for the per-box containers above keeps working.
+    """
+    box_type = NamedTuple
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        return (self.box_type(*row) for row in zip(*self._columns()))
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.box_type(*(column[key] for column in self._columns()))
+        return type(self)(self.array[key])
+
+    def __getattr__(self, name):
+        array = self.__dict__.get('array')
+        if array is not None and name in array.dtype.names:
+            return array[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None else self.array.astype(dtype)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.array!r})'
+
+    def _columns(self):
+        # integer and string columns become python scalars like the NamedTuple fields
+        return [self.array[name].tolist() if self.array[name].dtype.kind in 'iuU' else self.array[name]
+                for name in self.array.dtype.names]
+
+
+class PreprocessedBoxes(BoxArray):
+    """
+    Boxes returned from a cython box constructor, iterates as :class:`PreprocessedBox`.
+    """
+    box_type = PreprocessedBox
+
+    @staticmethod
+    def dtype(classes: int) -> np.dtype:
+        return np.dtype([(field, np.float32) for field in PreprocessedBox._fields[:-1]] +
+                        [('probs', np.float32, (classes,))])
+
+
+def _corner(pixels: np.ndarray, low: int = np.iinfo(np.int32).min,
+            high: int = np.iinfo(np.int32).max) -> np.ndarray:
+    """Truncates `pixels` toward zero and then clamps them to [`low`, `high`] without overflowing int32."""
+    return np.clip(np.trunc(pixels.astype(np.float64)), low, high).astype(np.int32)
+
+
+class ProcessedBoxes(BoxArray):
+    """
+    Boxes returned by a backend framework's `process_boxes` method, iterates as :class:`ProcessedBox`.
+    """
+    box_type = ProcessedBox
+
+    @staticmethod
+    def dtype(labels: List[str]) -> np.dtype:
+        return np.dtype([('left', np.int32), ('right', np.int32), ('top', np.int32), ('bot', np.int32),
+                         ('label', f'U{max(map(len, labels), default=1)}'),
+                         ('max_idx', np.intp), ('max_prob', np.float32)])
+
+    @classmethod
+    def from_boxes(cls, boxes: PreprocessedBoxes, h: int, w: int, threshold: float,
+                   labels: List[str]) -> 'ProcessedBoxes':
+        """
+        Picks the most probable class of every box, keeps those above `threshold`
+        and converts them to pixel corners clipped to an image of `h` x `w`.
+        """
+        probs = boxes.probs
+        max_idx = np.argmax(probs, axis=1)
+        max_prob = np.take_along_axis(probs, max_idx[:, None], axis=1)[:, 0]
+        keep = max_prob > threshold
+        x, y, bw, bh = boxes.x[keep], boxes.y[keep], boxes.w[keep], boxes.h[keep]
+        processed = np.zeros(np.count_nonzero(keep), dtype=cls.dtype(labels))
+        # truncated first and clamped on one side only, like the per box `process_box` it replaces
+        processed['left'] = _corner((x - bw / 2.) * w, low=0)
+        processed['right'] = _corner((x + bw / 2.) * w, high=w - 1)
+        processed['top'] = _corner((y - bh / 2.) * h, low=0)
+        processed['bot'] = _corner((y + bh / 2.) * h, high=h - 1)
+        processed['label'] = np.asarray(labels)[max_idx[keep]]
+        processed['max_idx'] = max_idx[keep]
+        processed['max_prob'] = max_prob[keep]
+        return cls(processed)
@@ -7,6 +7,8 @@ _FLAGS = {
         'dataset': ('./data/committedframes/',      str, 'Images Path'),
         'backup': ('./data/ckpt/',                  str, 'Checkpoints Path'),
         'summary': ('./data/summaries/',            str, 'Tensorboard Summaries Path'),
+        'summary_seconds': (30.0,                 float, 'Write TensorBoard Metrics At Most Every N Seconds'),
+        'summary_steps': (100,                      int, 'Write TensorBoard Metrics Every Nth Train Step'),
         'log': ('./data/logs/flow.log',             str, 'Log File Path'),
         'config': ('./data/cfg/',                   str, 'Model Config Path'),
         'binary': ('./data/bin/',                   str, 'Binary Weights Path'),
@@ -14,6 +16,7 @@ _FLAGS = {
         'imgdir': ('./data/sample_img/',            str, 'Images to Predict Path'),
         'img_out': ('./data/img_out/',              str, 'Prediction Output Path'),
         'video_out': ('./data/video_out/',          str, 'Video Output Path'),
+        'activations': (False,                     bool, 'Apply Darknet Activations in Convolutions'),
         'batch': (16,                               int, 'Images per Batch'),
         'cli': (False,                             bool, 'Using Command Line'),
         'clip': (False,                            bool, 'Clipping Gradients'),
@@ -21,28 +24,47 @@ _FLAGS = {
         'clr_mode': ('triangular2',                 str, 'Cyclic Learning Policy'),
         'done': (False,                            bool, 'Done Signal'),
         'epoch': (1,                                int, 'Epochs to Train'),
+        'events': ('',                              str, 'Progress Event Stream Path'),
+        'export': (False,                          bool, 'Export SavedModel to Built Graph Path'),
+        'fps': (0.0,                              float, 'Annotation Frames per Second'),
+        'fuse': (False,                            bool, 'Fold and Fuse Ops for Inference'),
         'error': ('',                               str, 'Error Signal'),
         'video': ([],                              list, 'Videos to Annotate'),
         'gpu': (0.0,                              float, 'GPU Utilization'),
         'gpu_name': ('/gpu:0',                      str, 'Current GPU'),
         'output_type': ([],                        list, 'Predict Output Type'),
+        'parallel_calls': (-1,                      int, 'Input Pipeline Parallel Calls'),
+        'pipeline': (False,                        bool, 'Use tf.data Input Pipeline'),
         'keep': (20,                                int, 'Checkpoint to Keep'),
         'kill': (False,                            bool, 'Kill Signal'),
         'labels': ('./data/predefined_classes.txt', str, 'Class Labels File'),
         'load': (-1,                                int, 'Checkpoint to Use'),
+        'log_seconds': (0.0,                      float, 'Log Train Steps At Most Every N Seconds'),
+        'log_steps': (1,                            int, 'Log Every Nth Train Step'),
         'lr': (1e-05,                             float, 'Initial Learning Rate'),
         'max_lr': (1e-05,                         float, 'Maximum Learning Rate'),
         'model': ('',                               str, 'Model Configuration File'),
         'momentum': (0.0,                         float, 'Momentum Setting for Trainer'),
+        'nms_method': ('hard',                      str, 'NMS Strategy (hard, linear, gaussian, diou)'),
+        'nms_sigma': (0.5,                        float, 'Gaussian Soft-NMS Sigma'),
+        'nms_threshold': (0.0,                    float, 'NMS IOU Threshold'),
         'progress': (0.0,                         float, 'Progress Signal'),
+        'profile': ('',                             str, 'Profiler for a Window of Steps (tf, cprofile)'),
+        'profile_start': (10,                       int, 'First Profiled Step'),
+        'profile_steps': (10,                       int, 'Steps to Profile'),
+        'prebuilt': (False,                        bool, 'Load Latest Exported SavedModel'),
         'project_name': ('default',                 str, 'Saving Under'),
+        'quantize': ('',                            str, 'TFLite Quantization (float16, int8)'),
         'save': (16000,                             int, 'Save Checkpoint After'),
         'size': (1,                                 int, 'Dataset Size (Images)'),
         'started': (False,                          int, 'Started Signal'),
         'step_size_coefficient': (2,                int, 'Cyclic Learning Coefficient'),
+        'stride': (1,                               int, 'Annotate Every Nth Frame'),
         'threshold': (0.4,                        float, 'Detection Record Threshold'),
         'trainer': ('rmsprop',                      str, 'Optimization Algorithm'),
         'verbalise': (False,                       bool, 'Verbose Output'),
+        'workers': (1,                              int, 'Annotation Parsing Processes'),
+        'xla': (False,                             bool, 'XLA Compilation'),
         'train': (False,                           bool, 'Training Mode')
         }
 
@@ -1,75 +1,238 @@
 import os
+import json
 import time
-from json.decoder import JSONDecodeError
+import struct
 import logging
+from multiprocessing import shared_memory, resource_tracker
 from beagles.base.flags import Flags
-from beagles.io.sharedmemory import SharedMemory
 from beagles.io.logs import get_logger
 
-FLAG_FILE = ".flags.json"
+FLAG_BLOCK = 'beagles_flags'
+""":obj:`str`: prefix of the name of the shared memory block both processes open"""
+FLAG_BLOCK_ENV = 'BEAGLES_FLAG_BLOCK'
+""":obj:`str`: environment variable a parent passes its flag block name to the subprogram in"""
+READ_RETRIES = 1000
+READ_RETRY_SECS = 1e-4
+ERROR_SIZE = 1024
+CONFIG_SIZE = 1 << 16
+SEQUENCE = struct.Struct('<Q')
+STATUS = struct.Struct(f'<d??H{ERROR_SIZE}s')
+COMMAND = struct.Struct('<?')
+CONFIG = struct.Struct('<I')
+STATUS_OFFSET = 0
+COMMAND_OFFSET = STATUS_OFFSET + SEQUENCE.size + STATUS.size + 4
+CONFIG_OFFSET = COMMAND_OFFSET + SEQUENCE.size + COMMAND.size + 7
+BLOCK_SIZE = CONFIG_OFFSET + SEQUENCE.size + CONFIG.size + CONFIG_SIZE
+STATUS_FLAGS = ['progress', 'started', 'done', 'error']
+""":obj:`list`: flags the backend reports, written by the subprogram"""
+COMMAND_FLAGS = ['kill']
+""":obj:`list`: flags the GUI sends while the backend runs, written by the parent"""
+
+
+def block_name():
+    """Returns the flag block name passed by the parent, else the name of the block this process creates"""
+    return os.environ.get(FLAG_BLOCK_ENV, f'{FLAG_BLOCK}_{os.getpid()}')
+
+
+def subprogram_env():
+    """Returns the environment to start a backend subprogram with, naming the flag block of this process"""
+    return dict(os.environ, **{FLAG_BLOCK_ENV: block_name()})
+
+
+def _attach(name):
+    """Opens the flag block without tracking it, so only the instance that created it unlinks it"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:  # python < 3.13 tracks every block it opens
+        register, resource_tracker.register = resource_tracker.register, lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
 
 
 class SharedFlagIO(object):
-    """Base object for logging and shared memory flag read/write operations"""
+    """
+    Base object for logging and shared memory flag read/write operations.
+
+    Flags live in one :obj:`multiprocessing.shared_memory.SharedMemory` block.
+    The parent writes the config once as JSON and the backend reads it once.
+    Status and command flags are fixed offset records, each written by one
+    process only. Every record is guarded by a sequence number that is odd
+    while it is written, so readers retry instead of seeing a torn record.
+
+    Each parent process has its own block, named by :func:`block_name`, and
+    starts the backend with :func:`subprogram_env` so the backend opens it.
+    """
 
     def __init__(self, flags=None, subprogram=False):
         self.subprogram = subprogram
         self.flags = flags if flags else Flags()
         self.logger = get_logger()
-        self.shm = SharedMemory()
-        if not self.subprogram and not self.shm.mounted:
-            self.shm.mount()
-        self.flag_path = os.path.join(self.shm.path, FLAG_FILE)
+        self.name = block_name()
+        self._block = None
+        self._created = False
+        self._snapshots = dict()
+        self._config = None
+        self._config_sequence = None
+        self._attempts = 100
 
         if subprogram:
-            self.read_flags()
+            # the parent may start the backend before sending the config
+            for _ in range(100):
+                if self.read_flags() is not None or self.block is None:
+                    break
+                time.sleep(.01)
             try:
                 if self.flags.verbalise:
                     self.logger.setLevel(logging.DEBUG)
             except AttributeError:
                 self.logger.setLevel(logging.DEBUG)
+
+    @property
+    def block(self):
+        """:obj:`SharedMemory` flag block, created by the parent. The subprogram waits up to a
+        second for it on first use and is None without a parent, like a missing flag file.
+        """
+        if self._block is not None:
+            return self._block
+        attempts, self._attempts = self._attempts, 1
+        for _ in range(attempts):
             try:
-                f = open(self.flag_path)
-                f.close()
+                self._block = _attach(self.name)
+                return self._block
             except FileNotFoundError:
-                time.sleep(1)
+                if not self.subprogram:
+                    self._block = shared_memory.SharedMemory(self.name, create=True, size=BLOCK_SIZE)
+                    self._created = True
+                    return self._block
+                time.sleep(.01)
+        return None
+
+    def _write(self, record, offset, *values):
+        buf = self.block.buf
+        sequence, = SEQUENCE.unpack_from(buf, offset)
+        sequence += sequence % 2
+        SEQUENCE.pack_into(buf, offset, sequence + 1)
+        record.pack_into(buf, offset + SEQUENCE.size, *values)
+        SEQUENCE.pack_into(buf, offset, sequence + 2)
+
+    def _snapshot(self, offset, read):
+        """Returns (sequence, `read(buf)`) of the record at `offset` once no write overlapped
+        the read, or None after :data:`READ_RETRIES` attempts, as when a writer died mid write
+        """
+        buf = self.block.buf
+        for _ in range(READ_RETRIES):
+            sequence, = SEQUENCE.unpack_from(buf, offset)
+            values = read(buf)
+            if not sequence % 2 and SEQUENCE.unpack_from(buf, offset)[0] == sequence:
+                return sequence, values
+            time.sleep(READ_RETRY_SECS)
+        return None
+
+    def _read(self, record, offset):
+        """Returns the record at `offset`, or its last consistent values if it stays torn"""
+        snapshot = self._snapshot(offset, lambda buf: record.unpack_from(buf, offset + SEQUENCE.size))
+        if snapshot is not None:
+            self._snapshots[offset] = snapshot[1]
+        elif offset in self._snapshots:
+            self.logger.warning('Flag block record is still being written, using its last values')
+        else:
+            raise TimeoutError('Flag block record is still being written, its writer may have died')
+        return self._snapshots[offset]
+
+    def _write_status(self):
+        error = self.flags.error.encode('utf8')[:ERROR_SIZE]
+        self._write(STATUS, STATUS_OFFSET, self.flags.progress, bool(self.flags.started),
+                    self.flags.done, len(error), error)
+
+    def _write_command(self):
+        self._write(COMMAND, COMMAND_OFFSET, self.flags.kill)
+
+    def _write_config(self, config):
+        data = config.encode('utf8')
+        assert len(data) <= CONFIG_SIZE, f'Flags exceed {CONFIG_SIZE} bytes'
+        buf = self.block.buf
+        start = CONFIG_OFFSET + SEQUENCE.size + CONFIG.size
+        sequence, = SEQUENCE.unpack_from(buf, CONFIG_OFFSET)
+        sequence += sequence % 2
+        SEQUENCE.pack_into(buf, CONFIG_OFFSET, sequence + 1)
+        CONFIG.pack_into(buf, CONFIG_OFFSET + SEQUENCE.size, len(data))
+        buf[start:start + len(data)] = data
+        SEQUENCE.pack_into(buf, CONFIG_OFFSET, sequence + 2)
+        self._config, self._config_sequence = config, sequence + 2
+
+    def _read_config(self):
+        """Updates :attr:`flags` from the config if it changed. The last config read is kept if it stays torn."""
+        start = CONFIG_OFFSET + SEQUENCE.size + CONFIG.size
+
+        def read(buf):
+            size, = CONFIG.unpack_from(buf, CONFIG_OFFSET + SEQUENCE.size)
+            return bytes(buf[start:start + min(size, CONFIG_SIZE)])
+
+        if SEQUENCE.unpack_from(self.block.buf, CONFIG_OFFSET)[0] == self._config_sequence:
+            return
+        snapshot = self._snapshot(CONFIG_OFFSET, read)
+        if snapshot is None:
+            if self._config_sequence is None:
+                raise TimeoutError('Flag block config is still being written, its writer may have died')
+            self.logger.warning('Flag block config is still being written, using the last config')
+            return
+        sequence, data = snapshot
+        if sequence:
+            self._config = data.decode('utf8')
+            for attr, value in json.loads(self._config).items():
+                self.flags.__setattr__(attr, value)
+        self._config_sequence = sequence
 
     def send_flags(self):
+        """
+        Publishes :attr:`flags`. The subprogram writes only its status flags. The
+        parent writes its status and command flags and, when anything else changed,
+        the whole config. The config is one way: values the backend changes, like a
+        clamped `batch`, stay in the backend and are never read back by the parent.
+        """
         self.logger.debug(self.flags)
-        try:
-            with open(r"{}".format(self.flag_path), "w") as outfile:
-                self.flags.to_json(outfile)
-        except FileNotFoundError:
-            pass
+        if self.block is None:
+            return
+        if self.subprogram:
+            self._write_status()
+            return
+        control = STATUS_FLAGS + COMMAND_FLAGS
+        config = json.dumps({k: v for k, v in self.flags.items() if k not in control})
+        if config != self._config:
+            self._write_config(config)
+        self._write_status()
+        self._write_command()
 
     def read_flags(self):
-        file = None
-        count = 0
-        while file is None:  # retry-while file is None and count < 10:
-            count += 1
-            try:
-                with open(r"{}".format(self.flag_path), "r") as file:
-                    try:
-                        flags = self.flags.from_json(file)
-                    except JSONDecodeError as e:
-                        if not e.pos:  # char 0 == flags busy
-                            self.logger.warning("Flags Busy: Reusing old")
-                            flags = self.flags
-                        else:
-                            raise
-                    self.flags = flags
-                    self.logger.debug(self.flags)
-                    return self.flags
-            except FileNotFoundError:
-                if count > 10:
-                    break
+        """Returns :attr:`flags` updated from the flag block, or None if no parent created one"""
+        if self.block is None:
+            return None
+        self._read_config()
+        if not self._config_sequence:
+            return None
+        progress, started, done, size, error = self._read(STATUS, STATUS_OFFSET)
+        kill, = self._read(COMMAND, COMMAND_OFFSET)
+        self.flags.progress = progress
+        self.flags.started = started
+        self.flags.done = done
+        self.flags.error = error[:size].decode('utf8', 'ignore')
+        self.flags.kill = kill
+        self.logger.debug(self.flags)
+        return self.flags
 
     def io_flags(self):
         self.send_flags()
         self.flags = self.read_flags()
 
     def cleanup_flags(self):
-        os.remove(self.flag_path)
-        self.shm.unmount()
-
-
+        """Closes the flag block. Only the instance that created it unlinks it."""
+        if self.block is None:
+            return
+        self._block.close()
+        if self._created:
+            self._block.unlink()
+        self._block, self._created = None, False
+        self._snapshots.clear()
+        self._config, self._config_sequence = None, None
@@ -1,8 +1,11 @@
 import os
+import sys
+import queue
+import atexit
 import logging
-import inspect
-from logging.handlers import RotatingFileHandler
-from beagles.io.flags import Flags
+from time import perf_counter
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from beagles.base.flags import Flags
 
 FORMAT = logging.Formatter(
     '{asctime} | {levelname:7} | {name:<13} | {funcName:<20} |'
@@ -10,27 +13,71 @@ FORMAT = logging.Formatter(
 
 logging.captureWarnings(True)
 
+_QUEUE = queue.SimpleQueue()
+_LOGGERS = dict()
+_LISTENER = None
+
+
+def _listener():
+    """Starts the one :obj:`QueueListener` that writes queued records to the log file"""
+    global _LISTENER
+    if _LISTENER is None:
+        path = Flags().log
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        logfile = RotatingFileHandler(path, backupCount=20)
+        logfile.setFormatter(FORMAT)
+        _LISTENER = QueueListener(_QUEUE, logfile)
+        _LISTENER.start()
+        atexit.register(_LISTENER.stop)
+    return _LISTENER
+
 
 def get_logger(level=logging.INFO):
-    try:
-        caller = inspect.stack()[1][0].f_locals["self"].__class__.__name__
-    except KeyError:
-        caller = 'None'
-    logger = logging.getLogger(caller)
+    """Returns the logger named after the class of the caller, created once with a
+    :obj:`QueueHandler` so file writes happen on the listener thread
+    """
+    caller = sys._getframe(1).f_locals.get('self')
+    name = caller.__class__.__name__ if caller is not None else 'None'
+    logger = _LOGGERS.get(name)
+    if logger is None:
+        _listener()
+        logger = logging.getLogger(name)
+        logger.addHandler(QueueHandler(_QUEUE))
+        _LOGGERS[name] = logger
+    logger.setLevel(level)
+    return logger
 
-    root, file = os.path.splitext(Flags().log)
 
-    handler = ''.join([root, file])
-    logfile = RotatingFileHandler(handler, backupCount=20)
-    logfile.setFormatter(FORMAT)
+def rollover():
+    """Moves every non-empty log file to a backup and starts a new one"""
+    for handler in _listener().handlers:
+        handler.acquire()
+        try:
+            if os.path.isfile(handler.baseFilename) and os.stat(handler.baseFilename).st_size > 0:
+                handler.doRollover()
+        finally:
+            handler.release()
 
-    tf_handler = '.tf'.join([root, file])
-    tf_logfile = RotatingFileHandler(tf_handler, backupCount=20)
-    tf_logfile.setFormatter(FORMAT)
-    # don't re-add the same handler
-    if not str(logfile) in str(logger.handlers):
-        logger.addHandler(logfile)
 
-    logger.setLevel(level)
+class Throttle(object):
+    """
+    Rate limit for log lines in hot loops. Calling it returns True on every
+    `steps`-th call that comes at least `seconds` after the last call it let
+    through. Zero disables either limit.
+    """
+
+    def __init__(self, steps=1, seconds=0.):
+        self.steps = max(1, steps)
+        self.seconds = seconds
+        self.count = 0
+        self.last = None
 
-    return logger
\ No newline at end of file
+    def __call__(self):
+        count, self.count = self.count, self.count + 1
+        if count % self.steps:
+            return False
+        now = perf_counter()
+        if self.last is not None and now - self.last < self.seconds:
+            return False
+        self.last = now
+        return True
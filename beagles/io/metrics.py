@@ -0,0 +1,219 @@
+import os
+import json
+import atexit
+import cProfile
+from bisect import bisect_left
+from threading import Lock
+from contextlib import contextmanager
+from time import perf_counter
+
+PHASES = ['load', 'augment', 'encode', 'data', 'train_step', 'forward', 'decode', 'nms', 'write']
+""":obj:`list`: hot path phases the backend times, in the order a batch passes through them"""
+BUCKETS = tuple(1e-5 * 2 ** i for i in range(24))
+""":obj:`tuple`: histogram bucket upper bounds in seconds, 10us doubling up to about 84s"""
+PROFILERS = ['tf', 'cprofile']
+METRICS_FILE = 'metrics.json'
+
+
+def summary_dir(flags):
+    """Returns the directory TensorBoard summaries, metrics and profiles of the project are written to"""
+    return os.path.join(flags.summary, flags.project_name)
+
+
+class Counter(object):
+    """Monotonic count of events"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Histogram(object):
+    """
+    Distribution of observed values in fixed exponential buckets. Memory stays
+    constant however many values are observed, quantiles are bucket upper bounds.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.min = float('inf')
+        self.max = float('-inf')
+        self._lock = Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Returns the upper bound of the bucket holding the `q` quantile, capped at the largest value seen"""
+        if not self.count:
+            return 0.
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (self.max,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count,
+                'min': self.min, 'max': self.max, 'p50': self.quantile(.5),
+                'p90': self.quantile(.9), 'p99': self.quantile(.99)}
+
+
+class Metrics(object):
+    """
+    Registry of named :class:`Counter` and :class:`Histogram` objects, created on first use.
+    Timing a phase costs two clock reads and one locked bucket increment, so it stays on
+    in every run and is read back as a JSON summary or TensorBoard scalars.
+    """
+
+    def __init__(self):
+        self.counters = dict()
+        self.histograms = dict()
+        self.writers = dict()
+        self._lock = Lock()
+
+    def _get(self, registry, name, cls):
+        metric = registry.get(name)
+        if metric is None:
+            with self._lock:
+                metric = registry.setdefault(name, cls())
+        return metric
+
+    def counter(self, name) -> Counter:
+        return self._get(self.counters, name, Counter)
+
+    def histogram(self, name) -> Histogram:
+        return self._get(self.histograms, name, Histogram)
+
+    @contextmanager
+    def timed(self, name):
+        """Observes the seconds the body of the with statement took in the histogram `name`"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe(perf_counter() - start)
+
+    def timed_iter(self, name, iterable):
+        """Yields from `iterable`, observing how long producing each item took in the histogram `name`"""
+        iterator = iter(iterable)
+        while True:
+            with self.timed(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def summary(self):
+        return {'counters': {name: c.value for name, c in self.counters.items()},
+                'histograms': {name: h.summary() for name, h in self.histograms.items()}}
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def write_json_at_exit(self, path):
+        """Writes the summary to `path` when the interpreter exits, including through `exit`"""
+        atexit.register(self.write_json, path)
+
+    def write_tensorboard(self, logdir, step, flush=False):
+        """Writes every counter and the mean, p50 and p99 seconds of every histogram as scalars at `step`.
+        The writer flushes on its own every few minutes, so only pass `flush` at the end of a run.
+        Does nothing if TensorBoard, which implements :mod:`tf.summary`, is not installed.
+        """
+        if logdir not in self.writers:
+            try:
+                import tensorboard
+                import tensorflow as tf
+                self.writers[logdir] = tf.summary.create_file_writer(logdir)
+            except ImportError:
+                self.writers[logdir] = None
+        writer = self.writers[logdir]
+        if writer is None:
+            return
+        import tensorflow as tf
+        with writer.as_default():
+            for name, counter in self.counters.items():
+                tf.summary.scalar(f'counters/{name}', counter.value, step=step)
+            for name, histogram in self.histograms.items():
+                summary = histogram.summary()
+                for stat in ['mean', 'p50', 'p99']:
+                    if stat in summary:
+                        tf.summary.scalar(f'{name}/{stat}', summary[stat], step=step)
+        if flush:
+            writer.flush()
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+METRICS = Metrics()
+""":class:`Metrics`: registry shared by the whole backend process"""
+
+
+class Profiler(object):
+    """
+    Captures a `tf` :mod:`tf.profiler` trace or a `cprofile` :mod:`cProfile` dump into
+    `logdir` for steps `start` up to `start + steps`. Call :meth:`step` before each step.
+    An empty `kind` never profiles.
+    """
+
+    def __init__(self, kind, logdir, start=10, steps=10):
+        if kind and kind not in PROFILERS:
+            raise ValueError(f'Unknown profiler {kind}, expected one of {", ".join(PROFILERS)}')
+        self.kind = kind
+        self.logdir = logdir
+        self.start = start
+        self.stop_at = start + steps
+        self.profile = None
+        self.count = 0
+
+    @property
+    def active(self):
+        return self.profile is not None
+
+    def step(self):
+        count, self.count = self.count, self.count + 1
+        if not self.kind:
+            return
+        if count == self.start and not self.active:
+            os.makedirs(self.logdir, exist_ok=True)
+            if self.kind == 'tf':
+                import tensorflow as tf
+                tf.profiler.experimental.start(self.logdir)
+                self.profile = tf.profiler.experimental
+            else:
+                self.profile = cProfile.Profile()
+                self.profile.enable()
+        elif count == self.stop_at:
+            self.stop()
+
+    def stop(self):
+        """Ends the capture early, a no-op if nothing is being profiled"""
+        if not self.active:
+            return
+        if self.kind == 'tf':
+            self.profile.stop()
+        else:
+            self.profile.disable()
+            self.profile.dump_stats(os.path.join(self.logdir, 'profile.prof'))
+        self.profile = None
@@ -0,0 +1,48 @@
+import json
+import time
+from time import perf_counter
+
+
+class ProgressEvents(object):
+    """
+    Writes backend progress as newline delimited JSON events to `path`, a file
+    that headless runs can tail, a FIFO or a pipe inherited as /dev/fd/N.
+    Every event is one line written at once, so readers never see partial events.
+    Nothing is written if `path` is empty, and writing stops if the reader goes away.
+    Use it as a context manager so the file is closed however the run ends.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'a', buffering=1) if path else None
+        self.started = perf_counter()
+
+    def emit(self, event, **fields):
+        """Writes `fields` as an `event` stamped with the wall clock time"""
+        if self.file is None:
+            return
+        fields.update(event=event, time=time.time())
+        try:
+            self.file.write(json.dumps(fields) + '\n')
+        except (BrokenPipeError, ValueError):
+            self.file = None
+
+    def progress(self, event, done, total, **fields):
+        """Emits `event` with the percent `progress`, the `rate` in items/s and
+        the `eta` in seconds of `done` out of `total` items since the writer opened
+        """
+        elapsed = perf_counter() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.
+        eta = (total - done) / rate if rate else None
+        progress = 100. * done / total if total else 100.
+        self.emit(event, done=done, total=total, progress=progress, rate=rate, eta=eta, **fields)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
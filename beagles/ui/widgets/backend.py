@@ -1,8 +1,9 @@
 import os
-import time
+import json
 from beagles.ui.widgets.scientificQDoubleSpinBox import ScientificQDoubleSpinBox
 from beagles.base.stringBundle import getStr
 from beagles.io.flags import SharedFlagIO
+from beagles.io.logs import rollover
 from PyQt5.QtCore import QThread, QObject, pyqtSignal, Qt
 from PyQt5.QtWidgets import QComboBox, QSpinBox, QDoubleSpinBox, QCheckBox, QHBoxLayout, \
                             QDialog, QLabel, QPushButton, QGridLayout, QProgressBar, \
@@ -12,16 +13,20 @@ from PyQt5.QtWidgets import QComboBox, QSpinBox, QDoubleSpinBox, QCheckBox, QHBo
 class BackendConnection(QObject):
     """Signal other QObjects from BackendThread"""
     progressUpdate: pyqtSignal = pyqtSignal(int)
+    eventReceived: pyqtSignal = pyqtSignal(dict)
 
 
 class BackendThread(QThread, SharedFlagIO):
-    """Needed so the long-running train ops don't block Qt UI"""
+    """Needed so the long-running train ops don't block Qt UI.
+    Reads the progress events the backend writes to the `events` pipe as they
+    arrive and re-emits them, the pipe closes when the backend exits.
+    """
 
-    def __init__(self, parent, proc, flags, rate=.2):
+    def __init__(self, parent, proc, flags, events):
         super(BackendThread, self).__init__(parent)
         self.connection = BackendConnection()
-        self.rate = rate
         self.proc = proc
+        self.events = events
         self.flags = flags
         self.send_flags()
 
@@ -30,20 +35,21 @@ class BackendThread(QThread, SharedFlagIO):
             self.flags.kill = True
         self.io_flags()
         self.proc.terminate()
-        if os.stat(self.logfile.baseFilename).st_size > 0:
-            self.logfile.doRollover()
-        if os.stat(self.tf_logfile.baseFilename).st_size > 0:
-            self.tf_logfile.doRollover()
+        rollover()
         self.cleanup_flags()
 
     def run(self):
-        prg = 0
-        while self.proc.poll() is None:
-            prg_old, prg = prg, self.flags.progress
-            if prg > prg_old:
-                self.connection.progressUpdate.emit(prg)
-            time.sleep(self.rate)
-            self.read_flags()
+        with os.fdopen(self.events) as events:
+            for line in events:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                self.connection.eventReceived.emit(event)
+                if 'progress' in event:
+                    self.connection.progressUpdate.emit(int(event['progress']))
+        self.proc.wait()
+        self.read_flags()
 
 
 class BackendDialog(QDialog):
@@ -16,6 +16,7 @@ from beagles.base.stringBundle import getStr
 from beagles.ui.widgets.toolBar import ToolBar
 from beagles.ui import newAction, addActions, Struct
 from beagles.io.flags import SharedFlagIO
+from beagles.io.logs import rollover
 
 
 class BeaglesMainWindow(QMainWindow, ActionCallbacks):
@@ -293,8 +294,7 @@ class BeaglesMainWindow(QMainWindow, ActionCallbacks):
         super(BeaglesMainWindow, self).resizeEvent(event)
 
     def closeEvent(self, event):
-        for handler in self.io.logger.handlers:
-            handler.doRollover()
+        rollover()
         if not self.mayContinue():
             event.ignore()
         if self.tb_process.pid() > 0:
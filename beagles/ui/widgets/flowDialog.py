@@ -5,6 +5,8 @@ from beagles.io.labelFile import LabelFile
 from beagles.base.constants import *
 from beagles.base.flags import Flags
 from beagles.ui.widgets.backend import BackendDialog, BackendThread
+from beagles.io.logs import rollover
+from beagles.io.flags import subprogram_env
 #from libs.scripts.genConfig import genConfigYOLOv2
 from subprocess import Popen, PIPE
 import sys
@@ -159,8 +161,13 @@ class FlowDialog(BackendDialog):
                                                    os.getcwd(), filters, options=options)
             self.flags.video = filename[0]
         if [self.flowCmb.currentText() == "Train"]:
-            proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False)
-            self.thread = BackendThread(self, proc=proc, flags=self.flags)
+            # the backend writes progress events to an inherited pipe
+            read_fd, write_fd = os.pipe()
+            self.flags.events = f'/dev/fd/{write_fd}'
+            proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False, pass_fds=(write_fd,),
+                         env=subprogram_env())
+            os.close(write_fd)
+            self.thread = BackendThread(self, proc=proc, flags=self.flags, events=read_fd)
             self.thread.setTerminationEnabled(True)
             self.thread.finished.connect(self.onFinished)
             self.thread.connection.progressUpdate.connect(
@@ -220,10 +227,7 @@ class FlowDialog(BackendDialog):
             acceptEvent(True)
 
     def rolloverLogs(self):
-        logs = [self.thread.logfile, self.thread.tf_logfile]
-        for log in logs:
-            if os.stat(log.baseFilename).st_size > 0:
-                log.doRollover()
+        rollover()
 
     def onFinished(self):
         self.flags = self.thread.flags
@@ -0,0 +1 @@
+"""Reproducible throughput benchmarks for the BEAGLES backend"""
@@ -0,0 +1,65 @@
+"""
+Times a forward pass of the test model eagerly, as a traced
+tf.function, as an XLA compiled tf.function and as a traced
+tf.function of the fused inference Net on the current device.
+"""
+import sys
+import argparse
+import numpy as np
+import tensorflow as tf
+from beagles.base.flags import Flags
+from beagles.base.timer import Timer
+from beagles.backend.net import Net, NetBuilder
+
+MODEL = 'tests/resources/yolov2-lite-3c.cfg'
+LABELS = 'tests/resources/BCCD.classes'
+
+
+def model_flags(model=MODEL, labels=LABELS):
+    """Returns :obj:`Flags` for an untrained `model`"""
+    flags = Flags()
+    flags.model = model
+    flags.labels = labels
+    flags.load = 0
+    return flags
+
+
+def build_net(flags):
+    """Builds an untrained :obj:`Net` from `flags` without parsing a dataset"""
+    builder = NetBuilder(flags)
+    net = Net(builder.compile_darknet(), tf.Variable(0, trainable=False), dtype=tf.float32)
+    return net, builder.meta
+
+
+def time_forward(forward, inputs, repeats):
+    """Returns mean seconds per call of `forward` after one warm up call"""
+    forward(inputs)
+    with Timer() as t:
+        for _ in range(repeats):
+            np.asarray(forward(inputs))
+    return t.elapsed_secs / repeats
+
+
+def run(batch=8, repeats=20, model=MODEL):
+    """Returns {mode: images/s} for eager, graph, xla and fused inference"""
+    net, meta = build_net(model_flags(model))
+    inputs = np.random.uniform(size=[batch, *meta['inp_size']]).astype(np.float32)
+    modes = {'eager': net.forward,
+             'graph': net.build_inference(meta['inp_size']),
+             'xla': net.build_inference(meta['inp_size'], jit_compile=True),
+             'fused': net.optimize(meta['inp_size']).build_inference(meta['inp_size'])}
+    return {mode: batch / time_forward(forward, inputs, repeats) for mode, forward in modes.items()}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--model', type=str, default=MODEL)
+    args = parser.parse_args(argv[1:])
+    for mode, rate in run(args.batch, args.repeats, args.model).items():
+        print(f'{mode:>5}: {rate:.2f} images/s')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,63 @@
+"""
+Times non-maximum suppression of dense 13x13x5 YOLOv2 outputs with the
+NumPy engine, the compiled engine one image at a time and the compiled
+engine over the whole batch in one call.
+"""
+import sys
+import argparse
+import numpy as np
+from beagles.base.timer import Timer
+from beagles.backend.net.frameworks.yolov2.predict import box_decoder
+from beagles.backend.net.frameworks.extensions import numpy_nms
+
+GRID = 13
+ANCHORS = [1.08, 1.19, 3.42, 4.41, 6.63, 11.38, 9.42, 5.11, 16.62, 10.52]
+
+
+def dense_outputs(batch, classes, thresh=1e-3, seed=0):
+    """Decodes random network outputs, a low `thresh` leaves nearly every cell a candidate"""
+    rng = np.random.default_rng(seed)
+    meta = {'out_size': [GRID, GRID, 5 * (classes + 5)], 'classes': classes,
+            'num': 5, 'thresh': thresh, 'anchors': ANCHORS}
+    decoded = [box_decoder(meta, rng.normal(size=meta['out_size']).astype(np.float32)) for _ in range(batch)]
+    probs, bbox = zip(*decoded)
+    return np.stack(probs), np.stack(bbox)
+
+
+def time_nms(nms, probs, bbox, repeats):
+    """Returns mean seconds per call of `nms`"""
+    with Timer() as t:
+        for _ in range(repeats):
+            nms(probs, bbox)
+    return t.elapsed_secs / repeats
+
+
+def run(batch=8, classes=20, repeats=5, iou_threshold=numpy_nms.NMS_THRESHOLD, method=numpy_nms.NMS_METHODS[0]):
+    """Returns {engine: images/s}, engines that were not compiled are left out"""
+    probs, bbox = dense_outputs(batch, classes)
+    engines = {'numpy': lambda p, b: numpy_nms.batch_nms(p, b, iou_threshold, method)}
+    try:
+        from beagles.backend.net.frameworks.extensions.nms import batch_nms
+    except ImportError:
+        pass
+    else:
+        engines['per image'] = lambda p, b: [batch_nms(p[i:i + 1], b[i:i + 1], iou_threshold, method)
+                                             for i in range(len(p))]
+        engines['batched'] = lambda p, b: batch_nms(p, b, iou_threshold, method)
+    return {engine: batch / time_nms(nms, probs, bbox, repeats) for engine, nms in engines.items()}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--iou', type=float, default=numpy_nms.NMS_THRESHOLD)
+    parser.add_argument('--method', choices=numpy_nms.NMS_METHODS, default=numpy_nms.NMS_METHODS[0])
+    args = parser.parse_args(argv[1:])
+    for engine, rate in run(args.batch, args.classes, args.repeats, args.iou, args.method).items():
+        print(f'{engine:>9}: {rate:.2f} images/s')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,67 @@
+"""
+Times PASCAL VOC annotation parsing on a synthetic dataset,
+serially, with a process pool and from the annotation index.
+"""
+import os
+import sys
+import random
+import logging
+import argparse
+from collections import namedtuple
+from tempfile import TemporaryDirectory
+from beagles.base.flags import Flags
+from beagles.base.timer import Timer
+from beagles.io.pascalVoc import PascalVocWriter
+from beagles.base.box import PostprocessedBox
+from beagles.backend.io.pascal_voc_clean_xml import pascal_voc_clean_xml, ANNOTATION_INDEX
+
+LABELS = ['RBC', 'WBC', 'Platelets']
+
+
+def make_dataset(annotation_dir, files, boxes=8, seed=0):
+    """Writes `files` synthetic 416x416 annotations with up to `boxes` objects each"""
+    rng = random.Random(seed)
+    for i in range(files):
+        writer = PascalVocWriter(annotation_dir, f'{i:06d}.jpg', (416, 416, 3))
+        for _ in range(rng.randint(1, boxes)):
+            xmin, ymin = rng.randint(0, 380), rng.randint(0, 380)
+            xmax, ymax = rng.randint(xmin + 1, 416), rng.randint(ymin + 1, 416)
+            writer.boxes.append(PostprocessedBox(xmin, ymin, xmax, ymax, rng.choice(LABELS), False))
+        writer.save(os.path.join(annotation_dir, f'{i:06d}.xml'))
+
+
+def time_parse(annotation_dir, workers, cached=False):
+    """Returns seconds taken by :func:`pascal_voc_clean_xml`, removing the index unless `cached`"""
+    index = os.path.join(annotation_dir, ANNOTATION_INDEX)
+    if not cached and os.path.exists(index):
+        os.remove(index)
+    flags = Flags()
+    flags.workers = workers
+    parser = namedtuple('Parser', ['logger', 'flags'])(logging.getLogger('benchmark'), flags)
+    with Timer() as t:
+        pascal_voc_clean_xml(parser, annotation_dir, LABELS)
+    return t.elapsed_secs
+
+
+def run(files=50000, workers=0):
+    """Returns {mode: seconds} for serial, parallel and cached parsing of `files` annotations"""
+    with TemporaryDirectory() as annotation_dir:
+        make_dataset(annotation_dir, files)
+        return {
+            'serial': time_parse(annotation_dir, 1),
+            'parallel': time_parse(annotation_dir, workers),
+            'cached': time_parse(annotation_dir, workers, cached=True)
+        }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=0, help='0 uses one process per CPU')
+    args = parser.parse_args(argv[1:])
+    for mode, secs in run(args.files, args.workers).items():
+        print(f'{mode:>8}: {secs:.2f}s ({args.files / secs:.0f} files/s)')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,73 @@
+"""
+Benchmark result files and their comparison against a stored baseline.
+
+Results are {section: {metric: value}}. Metrics named `*_per_sec` are rates
+where higher is better, every other metric is a time or a size where lower is better.
+"""
+import os
+import json
+import platform
+from datetime import datetime
+
+RATE = '_per_sec'
+TOLERANCE = 0.1
+""":obj:`float`: relative change in the worse direction that counts as a regression"""
+
+
+def environment():
+    """Returns the versions and host the results were measured with"""
+    import numpy as np
+    import tensorflow as tf
+    return {'time': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'tensorflow': tf.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+
+def write(path, results, env=None):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump({'environment': env or dict(), 'results': results}, file, indent=2)
+
+
+def load(path):
+    """Returns the results stored in `path`"""
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def flatten(results):
+    """Returns {section.metric: value} of every numeric metric in `results`"""
+    return {f'{section}.{metric}': value for section, metrics in results.items()
+            for metric, value in metrics.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+def higher_is_better(name):
+    return name.endswith(RATE)
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Compares every metric measured in both `results` and `baseline`.
+
+    Returns:
+        list of (name, baseline value, value, relative change, regressed) tuples
+    """
+    current, previous = flatten(results), flatten(baseline)
+    rows = list()
+    for name in sorted(current.keys() & previous.keys()):
+        value, base = current[name], previous[name]
+        change = (value - base) / abs(base) if base else 0.
+        worse = -change if higher_is_better(name) else change
+        rows.append((name, base, value, change, worse > tolerance))
+    return rows
+
+
+def report(rows):
+    """Returns the rows of :func:`compare` as a table"""
+    width = max([len(row[0]) for row in rows] + [6])
+    lines = [f'{"metric":<{width}} {"baseline":>12} {"current":>12} {"change":>8}']
+    for name, base, value, change, regressed in rows:
+        flag = '  REGRESSED' if regressed else ''
+        lines.append(f'{name:<{width}} {base:>12.4g} {value:>12.4g} {change:>+8.1%}{flag}')
+    return '\n'.join(lines)
@@ -0,0 +1,270 @@
+"""
+Runs every backend throughput benchmark offline against the BCCD dataset and
+the test model, writes the results to JSON and compares them to a baseline.
+
+Sections measure annotation parsing, batch assembly, train steps, prediction,
+video annotation, box decoding and NMS latency and peak resident memory, as well
+as the :mod:`benchmarks.inference` and :mod:`benchmarks.nms` engine comparisons.
+A synthetic dataset of the same layout is used if the BCCD archive is missing.
+Exits with 1 if a section fails or a metric regressed past the tolerance.
+"""
+import os
+import sys
+import random
+import shutil
+import argparse
+import resource
+import traceback
+from itertools import cycle, islice
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
+import cv2
+import numpy as np
+import tensorflow as tf
+from beagles.base.timer import Timer
+from beagles.io.flags import SharedFlagIO
+from beagles.io.metrics import METRICS
+from beagles.backend.io.pascal_voc_clean_xml import ANNOTATION_INDEX
+from beagles.backend.net import Net, NetBuilder, predict, annotate
+from beagles.backend.net.framework import Framework
+from benchmarks import inference, nms, results
+from benchmarks.parse import make_dataset
+from benchmarks.inference import model_flags, MODEL, LABELS
+
+BCCD = 'tests/resources/BCCD.v1-resize-416x416.voc.zip'
+VIDEO = 'tests/resources/test.mp4'
+SYNTHETIC_IMAGES = 64
+SECTIONS = ['parse', 'batch', 'train', 'predict', 'annotate', 'postprocess', 'inference', 'nms']
+RESULTS = os.path.join('data', 'benchmarks', 'results.json')
+
+
+def extract_dataset(archive, target, images=SYNTHETIC_IMAGES, seed=0):
+    """
+    Extracts the BCCD `archive` into `target`, or writes `images` synthetic train
+    images and annotations and a quarter as many test ones if it is missing.
+
+    Returns:
+        `bccd` or `synthetic`
+    """
+    if os.path.isfile(archive):
+        with ZipFile(archive, 'r') as f:
+            f.extractall(target)
+        return 'bccd'
+    rng = np.random.default_rng(seed)
+    for split, files in [('train', images), ('test', max(1, images // 4))]:
+        directory = os.path.join(target, split)
+        os.makedirs(directory, exist_ok=True)
+        make_dataset(directory, files, seed=seed)
+        for i in range(files):
+            cv2.imwrite(os.path.join(directory, f'{i:06d}.jpg'), rng.integers(0, 256, (416, 416, 3), np.uint8))
+    return 'synthetic'
+
+
+def suite_flags(data_dir, work_dir, batch, model=MODEL, labels=LABELS):
+    """Returns :obj:`Flags` reading the dataset in `data_dir` and writing only to `work_dir`"""
+    flags = model_flags(model, labels)
+    flags.dataset = flags.annotation = os.path.join(data_dir, 'train')
+    flags.imgdir = os.path.join(data_dir, 'test')
+    flags.img_out = flags.backup = os.path.join(work_dir, 'out')
+    flags.summary = os.path.join(work_dir, 'summaries')
+    flags.project_name = 'benchmark'
+    flags.batch = batch
+    flags.epoch = 1
+    flags.output_type = []
+    return flags
+
+
+def seed_all(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    tf.random.set_seed(seed)
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def phase_ms(name):
+    """Returns the mean and p99 milliseconds of the :data:`METRICS` histogram `name`"""
+    summary = METRICS.histogram(name).summary()
+    return {f'{name}_ms': 1e3 * summary.get('mean', 0.), f'{name}_p99_ms': 1e3 * summary.get('p99', 0.)}
+
+
+def bench_parse(framework):
+    """Times parsing the train annotations without and then with the annotation index"""
+    index = os.path.join(framework.flags.annotation, ANNOTATION_INDEX)
+    if os.path.exists(index):
+        os.remove(index)
+    with Timer() as cold:
+        data, _ = framework.parse()
+    with Timer() as cached:
+        framework.parse()
+    return {'cold_secs': cold.elapsed_secs, 'cached_secs': cached.elapsed_secs,
+            'cold_files_per_sec': len(data) / cold.elapsed_secs}
+
+
+def bench_batch(framework, data, weights):
+    """Times assembling one epoch of batches with :meth:`shuffle` and the tf.data pipeline"""
+    rates = dict()
+    for mode, batches in [('shuffle', framework.shuffle), ('pipeline', framework.dataset)]:
+        METRICS.reset()
+        with Timer() as t:
+            images = sum(len(x_batch) for x_batch, _ in batches(data, weights))
+        rates[f'{mode}_images_per_sec'] = images / t.elapsed_secs
+        if mode == 'shuffle':
+            for phase in ['load', 'augment', 'encode']:
+                rates.update(phase_ms(phase))
+    return rates
+
+
+def bench_train(flags, builder, framework, data, weights, steps):
+    """Times graph mode train steps on batches assembled beforehand, after one warm up step"""
+    net = Net(builder.compile_darknet(), tf.Variable(0, trainable=False), dtype=tf.float32)
+    net.compile(loss=framework.loss, optimizer=tf.keras.optimizers.Adam(flags.lr))
+    net.build_train_step()
+    # shuffle overwrites each batch two batches later, so every batch kept is a copy
+    batches = [(x.copy(), {k: v.copy() for k, v in feed.items()})
+               for x, feed in islice(framework.shuffle(data, weights), steps)]
+    x_batch, loss_feed = batches[0]
+    net(x_batch, training=True, **loss_feed)
+    with Timer() as t:
+        for x_batch, loss_feed in islice(cycle(batches), steps):
+            float(net(x_batch, training=True, **loss_feed))
+    return {'steps_per_sec': steps / t.elapsed_secs, 'images_per_sec': steps * flags.batch / t.elapsed_secs}
+
+
+def inference_net(builder, meta):
+    """Returns an untrained traced inference :obj:`Net`, warmed up on one zero batch"""
+    net = Net(builder.compile_darknet(), tf.Variable(0, trainable=False), dtype=tf.float32)
+    net.build_inference(meta['inp_size'])
+    net.infer(np.zeros([1, *meta['inp_size']], dtype=np.float32))
+    return net
+
+
+def bench_predict(io, net, framework):
+    """Times :func:`predict` over the test images"""
+    images = [i for i in os.listdir(io.flags.imgdir) if framework.is_input(i)]
+    io.send_flags()
+    METRICS.reset()
+    with Timer() as t:
+        predict(io.flags, net, framework)
+    return {'images_per_sec': len(images) / t.elapsed_secs, **phase_ms('load'), **phase_ms('forward')}
+
+
+def bench_annotate(io, net, framework, work_dir, video=VIDEO):
+    """Times :func:`annotate` of a copy of `video` in `work_dir`, where its annotations are written"""
+    copy = os.path.join(work_dir, os.path.basename(video))
+    shutil.copy(video, copy)
+    io.flags.video = [copy]
+    io.send_flags()
+    METRICS.reset()
+    try:
+        with Timer() as t:
+            annotate(io.flags, net, framework)
+    finally:
+        io.flags.video = []
+        io.send_flags()
+    frames = METRICS.counter('frames').value
+    return {'frames_per_sec': frames / t.elapsed_secs, **phase_ms('forward')}
+
+
+def bench_postprocess(net, framework, repeats):
+    """Times :meth:`findboxes` decoding and NMS of the net output of the first test image"""
+    image = sorted(i for i in os.listdir(framework.flags.imgdir) if framework.is_input(i))[0]
+    inputs = framework.preprocess(os.path.join(framework.flags.imgdir, image))[None].astype(np.float32)
+    net_out = np.array(net.infer(inputs))[0]
+    framework.findboxes(net_out)
+    METRICS.reset()
+    for _ in range(repeats):
+        framework.findboxes(net_out)
+    return {**phase_ms('decode'), **phase_ms('nms')}
+
+
+def rates(measured, unit='images_per_sec'):
+    """Renames {mode: rate} from the engine comparison benchmarks to {mode_unit: rate}"""
+    return {f'{mode.replace(" ", "_")}_{unit}': rate for mode, rate in measured.items()}
+
+
+def run(sections=SECTIONS, archive=BCCD, batch=4, steps=10, repeats=20, seed=0):
+    """
+    Runs `sections` of the suite.
+
+    Returns:
+        ({section: {metric: value}}, dataset source, list of sections that failed)
+    """
+    measured, failed = dict(), list()
+    with TemporaryDirectory() as work_dir:
+        data_dir = os.path.join(work_dir, 'data')
+        source = extract_dataset(archive, data_dir, seed=seed)
+        flags = suite_flags(data_dir, work_dir, batch)
+        io = SharedFlagIO(flags)
+        io.send_flags()
+        try:
+            seed_all(seed)
+            builder = NetBuilder(flags)
+            meta = builder.meta
+            framework = Framework.create(meta, flags)
+            data, weights = framework.parse()
+            net = None
+
+            def section(name, benchmark, *args):
+                if name not in sections:
+                    return
+                seed_all(seed)
+                try:
+                    measured[name] = benchmark(*args)
+                except Exception:
+                    traceback.print_exc()
+                    failed.append(name)
+
+            section('parse', bench_parse, framework)
+            section('batch', bench_batch, framework, data, weights)
+            section('train', bench_train, flags, builder, framework, data, weights, steps)
+            if {'predict', 'annotate', 'postprocess'} & set(sections):
+                net = inference_net(builder, meta)
+            section('predict', bench_predict, io, net, framework)
+            section('annotate', bench_annotate, io, net, framework, work_dir)
+            section('postprocess', bench_postprocess, net, framework, repeats)
+            section('inference', lambda: rates(inference.run(batch, repeats)))
+            section('nms', lambda: rates(nms.run(batch, meta['classes'], repeats)))
+        finally:
+            io.cleanup_flags()
+    measured['memory'] = {'peak_rss_mb': peak_rss_mb()}
+    return measured, source, failed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--out', type=str, default=RESULTS, help='results JSON to write')
+    parser.add_argument('--baseline', type=str, default='', help='results JSON of an earlier run to compare to')
+    parser.add_argument('--tolerance', type=float, default=results.TOLERANCE)
+    parser.add_argument('--only', nargs='+', choices=SECTIONS, default=SECTIONS)
+    parser.add_argument('--dataset', type=str, default=BCCD, help='BCCD PASCAL VOC zip archive')
+    parser.add_argument('--batch', type=int, default=4)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv[1:])
+    measured, source, failed = run(args.only, args.dataset, args.batch, args.steps, args.repeats, args.seed)
+    for name, value in sorted(results.flatten(measured).items()):
+        print(f'{name}: {value:.4g}')
+    env = results.environment()
+    env.update(dataset=source, batch=args.batch, steps=args.steps, repeats=args.repeats, seed=args.seed)
+    results.write(args.out, measured, env)
+    print(f'Wrote {args.out}')
+    regressed = list()
+    if args.baseline:
+        rows = results.compare(measured, results.load(args.baseline), args.tolerance)
+        print(results.report(rows))
+        regressed = [row[0] for row in rows if row[-1]]
+    if failed:
+        print(f'Failed: {", ".join(failed)}')
+    if regressed:
+        print(f'Regressed: {", ".join(regressed)}')
+    return 1 if failed or regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,66 @@
+"""
+Times training steps per second of the test model on synthetic
+batches, eagerly, as a traced tf.function and XLA compiled.
+"""
+import sys
+import argparse
+import numpy as np
+import tensorflow as tf
+from beagles.base.timer import Timer
+from beagles.backend.net.framework import Framework
+from beagles.backend.net.frameworks.yolo.data import encode_targets
+from benchmarks.inference import build_net, model_flags, MODEL
+
+
+def synthetic_batch(framework, batch, boxes=10, seed=0):
+    """Returns an (x_batch, loss_feed) tuple of random images and boxes"""
+    rng = np.random.default_rng(seed)
+    meta = framework.meta
+    h, w, c = meta['inp_size']
+    x_batch = rng.uniform(size=[batch, h, w, c]).astype(np.float32)
+    loss_feed = framework.feed_buffers(batch)
+    for i in range(batch):
+        xmin, ymin = rng.integers(0, w // 2, boxes), rng.integers(0, h // 2, boxes)
+        classes = rng.integers(0, meta['classes'], boxes)
+        objs = np.stack([classes, xmin, ymin, xmin + w // 4, ymin + h // 4], 1)
+        feed = {key: value[i] for key, value in loss_feed.items()}
+        encode_targets(objs, (w, h), framework.grid(), meta['num'], meta['classes'], feed)
+    return x_batch, loss_feed
+
+
+def time_steps(net, x_batch, loss_feed, steps):
+    """Returns training steps per second after one warm up step"""
+    net(x_batch, training=True, **loss_feed)
+    with Timer() as t:
+        for _ in range(steps):
+            float(net(x_batch, training=True, **loss_feed))
+    return steps / t.elapsed_secs
+
+
+def run(batch=4, steps=10, model=MODEL):
+    """Returns {mode: steps/s} for eager, graph and xla train steps"""
+    results = dict()
+    for mode in ['eager', 'graph', 'xla']:
+        flags = model_flags(model)
+        net, meta = build_net(flags)
+        framework = Framework.create(meta, flags)
+        net.compile(loss=framework.loss, optimizer=tf.keras.optimizers.Adam(1e-5))
+        if mode != 'eager':
+            net.build_train_step(jit_compile=mode == 'xla')
+        x_batch, loss_feed = synthetic_batch(framework, batch)
+        results[mode] = time_steps(net, x_batch, loss_feed, steps)
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch', type=int, default=4)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--model', type=str, default=MODEL)
+    args = parser.parse_args(argv[1:])
+    for mode, rate in run(args.batch, args.steps, args.model).items():
+        print(f'{mode:>5}: {rate:.2f} steps/s')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
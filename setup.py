@@ -20,6 +20,7 @@ def module_to_path(module):
 NMS = 'beagles.backend.net.frameworks.extensions.nms'
 CY_YOLO_FINDBOXES = 'beagles.backend.net.frameworks.extensions.cy_yolo_findboxes'
 CY_YOLO2_FINDBOXES = 'beagles.backend.net.frameworks.extensions.cy_yolo2_findboxes'
+CY_YOLO3_FINDBOXES = 'beagles.backend.net.frameworks.extensions.cy_yolo3_findboxes'
 WINDOWS = 'nt'
 MAC = 'darwin'
 
@@ -41,7 +42,9 @@ if os.name == WINDOWS:
         Extension(NMS,
                   sources=module_to_path(NMS),
                   # libraries=["m"] # Unix-like specific
-                  include_dirs=[numpy.get_include()]
+                  include_dirs=[numpy.get_include()],
+                  extra_compile_args=['/fopenmp'],
+                  extra_link_args=['/fopenmp']
                   ),
         Extension(CY_YOLO2_FINDBOXES,
                   sources=module_to_path(CY_YOLO2_FINDBOXES),
@@ -50,6 +53,13 @@ if os.name == WINDOWS:
                   extra_compile_args=['/fopenmp'],
                   extra_link_args=['/fopenmp']
                   ),
+        Extension(CY_YOLO3_FINDBOXES,
+                  sources=module_to_path(CY_YOLO3_FINDBOXES),
+                  # libraries=["m"] # Unix-like specific
+                  include_dirs=[numpy.get_include()],
+                  extra_compile_args=['/fopenmp'],
+                  extra_link_args=['/fopenmp']
+                  ),
         Extension(CY_YOLO_FINDBOXES,
                   sources=module_to_path(CY_YOLO_FINDBOXES),
                   # libraries=["m"] # Unix-like specific
@@ -69,7 +79,9 @@ elif os.name == 'posix':
         Extension(NMS,
                   sources=module_to_path(NMS),
                   libraries=["m"],  # Unix-like specific
-                  include_dirs=[numpy.get_include()]
+                  include_dirs=[numpy.get_include()],
+                  extra_compile_args=compile_args,
+                  extra_link_args=linker_args
                   ),
         Extension(CY_YOLO2_FINDBOXES,
                   sources=module_to_path(CY_YOLO2_FINDBOXES),
@@ -78,6 +90,13 @@ elif os.name == 'posix':
                   extra_compile_args=compile_args,
                   extra_link_args=linker_args
                   ),
+        Extension(CY_YOLO3_FINDBOXES,
+                  sources=module_to_path(CY_YOLO3_FINDBOXES),
+                  libraries=["m"],  # Unix-like specific
+                  include_dirs=[numpy.get_include()],
+                  extra_compile_args=compile_args,
+                  extra_link_args=linker_args
+                  ),
         Extension(CY_YOLO_FINDBOXES,
                   sources=module_to_path(CY_YOLO_FINDBOXES),
                   libraries=["m"],  # Unix-like specific
@@ -94,6 +113,10 @@ else:
                   sources=module_to_path(CY_YOLO2_FINDBOXES),
                   libraries=["m"]  # Unix-like specific
                   ),
+        Extension(CY_YOLO3_FINDBOXES,
+                  sources=module_to_path(CY_YOLO3_FINDBOXES),
+                  libraries=["m"]  # Unix-like specific
+                  ),
         Extension(CY_YOLO_FINDBOXES,
                   sources=module_to_path(CY_YOLO_FINDBOXES),
                   libraries=["m"]  # Unix-like specific
@@ -0,0 +1,17 @@
+import numpy as np
+from beagles.backend.darknet import create_darkop
+
+
+def uniform(rng, shape):
+    return rng.uniform(.5, 1.5, shape)
+
+
+def create_darkops(layers, rng, weights=uniform):
+    """Returns darknet layers made by :func:`create_darkop` from the argument lists in `layers`,
+    like the ones :meth:`ConfigParser.create` yields, with every weight drawn by `weights(rng, shape)`
+    """
+    darknet = [create_darkop(*args) for args in layers]
+    for layer in darknet:
+        for var, shape in layer.wshape.items():
+            layer.w[var] = weights(rng, shape).astype(np.float32)
+    return darknet
@@ -1,7 +1,13 @@
+import os
+import tempfile
 from unittest import TestCase
+import numpy as np
 from beagles.backend.darknet import Darknet
 from beagles.backend.net.framework import Framework
 from beagles.backend.io.darknet_config_file import DarknetConfigFile
+from beagles.backend.io.darknet_weights_file import DarknetWeightsFile
+from beagles.backend.darknet import create_darkop
+from beagles.backend.net.ops import op_create
 from beagles.base.errors import DarknetConfigEmpty
 from beagles.base.flags import Flags
 from beagles.backend.darknet.layer import Layer
@@ -141,3 +147,72 @@ class TestDarknet(TestCase):
     def testEmptyDarknetConfigFile(self):
         self.assertRaises(DarknetConfigEmpty, DarknetConfigFile,
                           'tests/resources/empty.cfg')
+
+
+class TestDarknetWeightsFile(TestCase):
+    def setUp(self):
+        self.layers = [create_darkop('convolutional', 0, 3, 2, 4, 1, 1, 1, 'leaky'),
+                       create_darkop('maxpool', 1, 2, 2, 0),
+                       create_darkop('connected', 2, 8, 3, 'linear')]
+        self.floats = np.arange(4 * 4 + 3 * 3 * 2 * 4 + 3 + 8 * 3, dtype=np.float32)
+        handle, self.path = tempfile.mkstemp(suffix='.weights')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, floats, header=(0, 2, 0)):
+        with open(self.path, 'wb') as f:
+            f.write(np.asarray(header, dtype=np.int32).tobytes())
+            # darknet 0.2 and later write the seen image count as 64 bits
+            seen = np.int64(0) if header[0] * 10 + header[1] >= 2 else np.int32(0)
+            f.write(seen.tobytes())
+            f.write(floats.tobytes())
+
+    def testLoadsInFileOrderWithTransposes(self):
+        self.write(self.floats)
+        weights = DarknetWeightsFile(self.path)
+        self.assertEqual(weights.load(self.layers), 2)
+        conv, _, connected = self.layers
+        for i, par in enumerate(['biases', 'gamma', 'moving_mean', 'moving_variance']):
+            np.testing.assert_array_equal(conv.w[par], self.floats[4 * i:4 * i + 4])
+        kernel = self.floats[16:88].reshape([4, 2, 3, 3]).transpose([2, 3, 1, 0])
+        np.testing.assert_array_equal(conv.w['kernel'], kernel)
+        np.testing.assert_array_equal(connected.w['biases'], self.floats[88:91])
+        np.testing.assert_array_equal(connected.w['weights'], self.floats[91:].reshape([3, 8]).T)
+        self.assertTrue(np.shares_memory(conv.w['kernel'], weights.data))
+
+    def testOldHeader(self):
+        self.write(self.floats, header=(0, 1, 0))
+        self.assertEqual(DarknetWeightsFile(self.path).load(self.layers), 2)
+        np.testing.assert_array_equal(self.layers[0].w['biases'], self.floats[:4])
+
+    def testPartialWeights(self):
+        self.write(self.floats[:88])
+        self.assertEqual(DarknetWeightsFile(self.path).load(self.layers), 1)
+        self.assertEqual(self.layers[2].w, dict())
+
+    def testLocalBiasesKeepFileOrder(self):
+        local = create_darkop('local', 0, 3, 2, 4, 1, 1, 2, 2, 'leaky')
+        floats = np.arange(2 * 2 * 4 + 2 * 2 * 4 * 2 * 3 * 3, dtype=np.float32)
+        self.write(floats)
+        self.assertEqual(DarknetWeightsFile(self.path).load([local]), 1)
+        # the v1 loader reads the same layer, so its biases stay in darknet's channel major order
+        np.testing.assert_array_equal(local.w['biases'], floats[:16])
+        biases = op_create(local, None, 0, 0).bias_initializer()([2, 2, 4])
+        np.testing.assert_array_equal(biases, floats[:16].reshape([4, 2, 2]).transpose([1, 2, 0]))
+
+    def testDefaultWeightsPath(self):
+        flags = Flags()
+        flags.model = 'tests/resources/test.cfg'
+        flags.load = 0
+        with tempfile.TemporaryDirectory() as binary:
+            flags.binary = binary
+            open(os.path.join(binary, 'test.weights'), 'wb').close()
+            darknet = Darknet.__new__(Darknet)
+            darknet.get_weight_src(flags)
+            self.assertEqual(darknet.src_bin, os.path.abspath(os.path.join(binary, 'test.weights')))
+
+    def testSizeMismatch(self):
+        self.write(np.concatenate([self.floats, [0.]]).astype(np.float32))
+        self.assertRaises(AssertionError, DarknetWeightsFile(self.path).load, self.layers)
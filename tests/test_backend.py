@@ -1,11 +1,20 @@
 from unittest import TestCase
 import os
 import sys
+import csv
+import math
 import time
+import shutil
+from queue import Queue
+from threading import Thread
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+import cv2
+import numpy as np
 from shutil import rmtree
 from subprocess import Popen, PIPE
 from zipfile import ZipFile
-from beagles.io.flags import SharedFlagIO
+from beagles.io.flags import SharedFlagIO, subprogram_env
 from beagles.base import BACKEND_ENTRYPOINT
 
 
@@ -37,21 +46,21 @@ class TestBackend(TestCase):
         self.flags.epoch = 1
         self.flags.train = True
         self.io.io_flags()
-        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False)
+        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False, env=subprogram_env())
         proc.communicate()
         self.assertEqual(proc.returncode, 0)
         self.flags.load = 1
         self.io.io_flags()
-        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False)
+        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False, env=subprogram_env())
         proc.communicate()
         self.flags.train = False
         self.flags.imgdir = 'tests/resources/BCCD/test'
         self.io.io_flags()
-        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False)
+        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False, env=subprogram_env())
         proc.communicate()
         self.flags.video = ['tests/resources/test.mp4']
         self.io.io_flags()
-        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False)
+        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False, env=subprogram_env())
         proc.communicate()
         self.assertEqual(proc.returncode, 0)
 
@@ -70,10 +79,24 @@ class TestBackend(TestCase):
         self.flags.epoch = 1
         self.flags.train = True
         self.io.io_flags()
-        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False)
+        proc = Popen([sys.executable, BACKEND_ENTRYPOINT], stdout=PIPE, shell=False, env=subprogram_env())
         proc.communicate()
         self.assertNotEqual(proc.returncode, 0)
 
+    def testNetBuilderSkipsAnnotationsOutsideTraining(self):
+        from beagles.backend.net import NetBuilder
+        self.flags.model = 'tests/resources/yolov2-lite-3c.cfg'
+        self.flags.labels = 'tests/resources/BCCD.classes'
+        self.flags.annotation = 'tests/resources/missing'
+        self.flags.backup = 'tests/resources/ckpt'
+        self.flags.load = 0
+        self.flags.train = False
+        builder = NetBuilder(flags=self.flags)
+        net, framework, manager = builder()
+        self.assertIsNone(builder.annotation_data)
+        self.assertIsNone(builder.class_weights)
+        self.assertEqual(1, len(net.infer(np.zeros([1, *framework.meta['inp_size']], dtype=np.float32))))
+
     def tearDown(self) -> None:
         self.io.cleanup_flags()
 
@@ -89,3 +112,118 @@ class TestBackend(TestCase):
             rmtree('data/summaries/_test')
         except FileNotFoundError:
             pass
+
+
+class TestAnnotate(TestCase):
+    """Runs the threaded annotate pipeline on the test video with a stand in net and framework"""
+    def setUp(self):
+        from beagles.base.flags import Flags
+        self.tmp = TemporaryDirectory()
+        self.video = os.path.join(self.tmp.name, 'test.mp4')
+        shutil.copy('tests/resources/test.mp4', self.video)
+        self.flags = Flags()
+        self.flags.video = [self.video]
+        self.flags.summary = self.tmp.name
+        self.flags.batch = 4
+        self.net = SimpleNamespace(infer=lambda inputs: np.zeros([len(inputs), 1], dtype=np.float32))
+        self.framework = SimpleNamespace(meta={'inp_size': [8, 8, 3]},
+                                         resize_input=lambda frame: cv2.resize(frame, (8, 8)) / 255.,
+                                         findboxes=lambda out: out,
+                                         process_boxes=lambda boxes, h, w, threshold: [[w, h]])
+        capture = cv2.VideoCapture(self.video)
+        self.frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.size = [str(int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))), str(int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))]
+        capture.release()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def annotate(self):
+        """Runs annotate on a thread and fails instead of hanging if it does not finish"""
+        from beagles.backend.net import annotate
+        errors = list()
+
+        def run():
+            try:
+                annotate(self.flags, self.net, self.framework)
+            except Exception as e:
+                errors.append(e)
+        thread = Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(60)
+        self.assertFalse(thread.is_alive(), 'annotate hung')
+        return errors
+
+    def rows(self):
+        with open(os.path.join(self.tmp.name, 'test_annotations.csv')) as file:
+            return list(csv.reader(file))
+
+    def testEveryFrameIsWrittenInOrder(self):
+        self.assertEqual([], self.annotate())
+        rows = self.rows()
+        self.assertEqual(self.frames, len(rows))
+        times = [float(row[0]) for row in rows]
+        self.assertEqual(sorted(times), times)
+        self.assertEqual(self.size, rows[0][1:])
+
+    def testStride(self):
+        self.flags.stride = 10
+        self.assertEqual([], self.annotate())
+        self.assertEqual(math.ceil(self.frames / 10), len(self.rows()))
+
+    def testDecoderErrorIsRaised(self):
+        def resize_input(frame):
+            raise ValueError('corrupt frame')
+        self.framework.resize_input = resize_input
+        errors = self.annotate()
+        self.assertEqual(['corrupt frame'], [str(e) for e in errors])
+
+    def testWriterDrainsRowsAfterError(self):
+        from beagles.backend.net import _write_rows
+        writer = SimpleNamespace(writerows=lambda rows: (_ for _ in ()).throw(OSError('disk full')))
+        rows, errors = Queue(maxsize=2), list()
+        thread = Thread(target=_write_rows, args=(writer, rows, errors), daemon=True)
+        thread.start()
+        for _ in range(5):
+            rows.put([[0, 1, 2]])
+        rows.put(None)
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(['disk full'], [str(e) for e in errors])
+
+
+class TestLoadCheckpoint(TestCase):
+    """Restores a checkpoint saved with optimizer slots into a net without an optimizer"""
+    def setUp(self):
+        import tensorflow as tf
+        self.tmp = TemporaryDirectory()
+        weight = tf.Variable(1.)
+        optimizer = tf.keras.optimizers.Adam()
+        optimizer.apply_gradients([(tf.constant(1.), weight)])
+        self.manager = tf.train.CheckpointManager(tf.train.Checkpoint(weight=weight, optimizer=optimizer),
+                                                  self.tmp.name, max_to_keep=1)
+        self.manager.save()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def restore(self, train):
+        import gc
+        import logging
+        import tensorflow as tf
+        from beagles.backend.net import NetBuilder
+        builder = SimpleNamespace(flags=SimpleNamespace(load=-1, train=train), logger=logging.getLogger('test'),
+                                  checkpoint=tf.train.Checkpoint(weight=tf.Variable(0.)))
+        NetBuilder.load_checkpoint(builder, self.manager)
+        weight = float(builder.checkpoint.weight.numpy())
+        del builder
+        gc.collect()
+        return weight
+
+    def testInferenceRestoreExpectsPartial(self):
+        with self.assertNoLogs('tensorflow', level='WARNING'):
+            self.assertAlmostEqual(self.restore(train=False), .999, places=5)
+
+    def testTrainRestoreWarnsAboutUnmatchedSlots(self):
+        with self.assertLogs('tensorflow', level='WARNING'):
+            self.restore(train=True)
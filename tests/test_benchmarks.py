@@ -0,0 +1,28 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from benchmarks import results
+
+
+class TestResults(TestCase):
+    def setUp(self):
+        self.baseline = {'predict': {'images_per_sec': 100., 'forward_ms': 10.},
+                         'memory': {'peak_rss_mb': 500.}, 'train': {'error': 'failed'}}
+
+    def testCompareDirections(self):
+        current = {'predict': {'images_per_sec': 80., 'forward_ms': 9.},
+                   'memory': {'peak_rss_mb': 560.}, 'parse': {'cold_secs': 1.}}
+        rows = {name: (change, regressed) for name, _, _, change, regressed
+                in results.compare(current, self.baseline, tolerance=.1)}
+        self.assertEqual(set(rows), {'predict.images_per_sec', 'predict.forward_ms', 'memory.peak_rss_mb'})
+        self.assertTrue(rows['predict.images_per_sec'][1])
+        self.assertAlmostEqual(rows['predict.images_per_sec'][0], -.2)
+        self.assertFalse(rows['predict.forward_ms'][1])
+        self.assertTrue(rows['memory.peak_rss_mb'][1])
+        self.assertIn('REGRESSED', results.report(results.compare(current, self.baseline)))
+
+    def testWriteAndLoad(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'benchmarks', 'results.json')
+            results.write(path, self.baseline, {'dataset': 'synthetic'})
+            self.assertEqual(results.load(path), self.baseline)
@@ -0,0 +1,67 @@
+from unittest import TestCase
+import numpy as np
+from beagles.base.box import PreprocessedBox, PreprocessedBoxes, ProcessedBox, ProcessedBoxes
+
+
+def loop_process_box(b, h, w, threshold, labels):
+    """Per-box process_box ProcessedBoxes.from_boxes replaced"""
+    max_idx = np.argmax(b.probs)
+    max_prob = b.probs[max_idx]
+    if max_prob > threshold:
+        left = int((b.x - b.w / 2.) * w)
+        right = int((b.x + b.w / 2.) * w)
+        top = int((b.y - b.h / 2.) * h)
+        bot = int((b.y + b.h / 2.) * h)
+        left = 0 if left < 0 else left
+        right = w - 1 if right > w - 1 else right
+        top = 0 if top < 0 else top
+        bot = h - 1 if bot > h - 1 else bot
+        return ProcessedBox(left, right, top, bot, labels[max_idx], max_idx, max_prob)
+    return None
+
+
+class TestBoxArray(TestCase):
+    labels = ['RBC', 'WBC', 'Platelets']
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        array = np.zeros(200, dtype=PreprocessedBoxes.dtype(len(self.labels)))
+        array['x'], array['y'] = rng.uniform(.1, .9, 200), rng.uniform(.1, .9, 200)
+        array['w'], array['h'] = rng.uniform(0., .2, 200), rng.uniform(0., .2, 200)
+        array['c'] = rng.uniform(size=200)
+        array['probs'] = rng.uniform(size=[200, len(self.labels)]) * (rng.uniform(size=[200, 1]) > .5)
+        self.boxes = PreprocessedBoxes(array)
+
+    def testIteratesAsNamedTuples(self):
+        boxes = list(self.boxes)
+        self.assertEqual(len(boxes), len(self.boxes))
+        self.assertIsInstance(boxes[3], PreprocessedBox)
+        self.assertEqual(boxes[3].x, self.boxes.x[3])
+        np.testing.assert_array_equal(self.boxes[3].probs, self.boxes.probs[3])
+        self.assertIsInstance(self.boxes[10:20], PreprocessedBoxes)
+        self.assertEqual(len(self.boxes[self.boxes.c > .5]), np.count_nonzero(self.boxes.c > .5))
+
+    def testFromBoxesMatchesProcessBox(self):
+        h, w, threshold = 480, 640, .3
+        expected = [loop_process_box(b, h, w, threshold, self.labels) for b in self.boxes]
+        actual = ProcessedBoxes.from_boxes(self.boxes, h, w, threshold, self.labels)
+        self.assertEqual(list(actual), list(filter(None, expected)))
+        self.assertEqual(type(actual[0].left), int)
+        self.assertEqual(type(actual[0].label), str)
+
+    def testFromBoxesMatchesProcessBoxAtEdges(self):
+        h, w = 100, 200
+        array = np.zeros(5, dtype=PreprocessedBoxes.dtype(1))
+        array['x'], array['y'] = [1.5, -.5, .0012, .9987, .5], [-.5, 1.5, .9951, .0049, .5]
+        array['w'], array['h'] = [.6, .6, .0049, .0049, 1.], [.4, .4, .0197, .0197, 1.]
+        array['probs'] = 1.
+        expected = [loop_process_box(b, h, w, .5, ['RBC']) for b in PreprocessedBoxes(array)]
+        actual = ProcessedBoxes.from_boxes(PreprocessedBoxes(array), h, w, .5, ['RBC'])
+        self.assertEqual(list(actual), expected)
+        array[0] = (1e12, -1e12, 1., 1., 1., [1.])
+        box, = ProcessedBoxes.from_boxes(PreprocessedBoxes(array[:1]), h, w, .5, ['RBC'])
+        self.assertEqual((box.left, box.right, box.top, box.bot), (np.iinfo(np.int32).max, w - 1, 0, -2 ** 31))
+
+    def testFromNoBoxes(self):
+        empty = PreprocessedBoxes(np.zeros(0, dtype=PreprocessedBoxes.dtype(3)))
+        self.assertEqual(list(ProcessedBoxes.from_boxes(empty, 10, 10, .1, self.labels)), [])
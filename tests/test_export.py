@@ -0,0 +1,59 @@
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+import numpy as np
+import tensorflow as tf
+from beagles.base.flags import Flags
+from beagles.backend.net import Net
+from beagles.backend.net.ops import op_create
+from beagles.backend.net.export import SavedGraph, export, versions
+from tests.helpers import create_darkops
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        darknet = create_darkops([
+            ('convolutional', 0, 3, 3, 8, 1, 1, 1, 'leaky'),
+            ('maxpool', 1, 2, 2, 0),
+            ('convolutional', 2, 1, 8, 4, 1, 0, 0, 'linear'),
+        ], rng)
+        self.net = Net([op_create(layer, None, i, 0) for i, layer in enumerate(darknet)],
+                       tf.Variable(0, trainable=False), dtype=tf.float32)
+        self.meta = {'name': 'tiny', 'model': 'tiny.cfg', 'inp_size': [16, 16, 3],
+                     'labels': ['a', 'b'], 'anchors': [1.5, 2.0], 'colors': [(127.0, 0.0, 254.0)]}
+        self.framework = SimpleNamespace(meta=self.meta)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.flags = Flags()
+        self.flags.model = 'tiny.cfg'
+        self.flags.built_graph = self.tmp.name
+        self.x = rng.normal(size=(2, 16, 16, 3)).astype(np.float32)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def testExportIsVersionedAndReloads(self):
+        self.assertFalse(SavedGraph.exists(self.flags))
+        expected = self.net.forward(self.x)
+        export(self.flags, self.net, self.framework)
+        path = export(self.flags, self.net, self.framework)
+        self.assertEqual([1, 2], versions(self.flags))
+        self.assertEqual(os.path.join(self.tmp.name, 'tiny', '2'), path)
+        graph = SavedGraph(self.flags)
+        self.assertEqual(path, graph.path)
+        self.assertEqual(self.meta['labels'], graph.meta['labels'])
+        self.assertEqual(self.meta['inp_size'], graph.meta['inp_size'])
+        np.testing.assert_allclose(graph.infer(self.x), expected, rtol=1e-5, atol=1e-5)
+        serving = graph.model.signatures['serving_default']
+        np.testing.assert_allclose(list(serving(input=self.x).values())[0], expected, rtol=1e-5, atol=1e-5)
+
+    def testQuantizedExport(self):
+        self.flags.quantize = 'float16'
+        path = export(self.flags, self.net, self.framework)
+        self.assertTrue(os.path.isfile(os.path.join(path, 'tiny.float16.tflite')))
+
+    def testUnknownQuantizationWritesNothing(self):
+        self.flags.quantize = 'int4'
+        self.assertRaises(ValueError, export, self.flags, self.net, self.framework)
+        self.assertEqual([], versions(self.flags))
@@ -1,10 +1,19 @@
 import os
 import sys
+import json
+import logging
 from collections import namedtuple
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 from beagles.io.pascalVoc import PascalVocWriter, PascalVocReader
 from beagles.io.yolo import YoloWriter, YoloReader
 from beagles.base.box import PostprocessedBox
+from beagles.base.flags import Flags
+from beagles.io.flags import SharedFlagIO, subprogram_env, FLAG_BLOCK, FLAG_BLOCK_ENV, SEQUENCE, STATUS_OFFSET
+from beagles.io.progress import ProgressEvents
+from beagles.io.logs import get_logger, Throttle
+from beagles.io.metrics import Metrics, Histogram, Profiler
+from beagles.backend.io.pascal_voc_clean_xml import pascal_voc_clean_xml, ANNOTATION_INDEX
 
 class Image(object):
     def __init__(self, h, w, c):
@@ -68,4 +77,171 @@ class TestIO(TestCase):
         self.assertEqual(face[1],
                          [(113, 40), (450, 40), (450, 402), (113, 402)])
 
-
+    def testPascalVocAnnotationIndex(self):
+        parser = namedtuple('Parser', ['logger', 'flags'])(logging.getLogger('test'), Flags())
+        with TemporaryDirectory() as annotation_dir:
+            for i in range(3):
+                writer = PascalVocWriter(annotation_dir, f'{i}.jpg', (512, 512, 3))
+                writer.boxes.append(PostprocessedBox(60, 40, 430, 504, 'person', 0))
+                writer.boxes.append(PostprocessedBox(113 + i, 40, 450, 403, 'face', 0))
+                writer.save(os.path.join(annotation_dir, f'{i}.xml'))
+            dumps, weights = pascal_voc_clean_xml(parser, annotation_dir, ['person', 'face'])
+            self.assertTrue(os.path.isfile(os.path.join(annotation_dir, ANNOTATION_INDEX)))
+            self.assertEqual(sorted(dumps)[1], ['1.jpg', [512, 512, [['person', 60, 40, 430, 504],
+                                                                    ['face', 114, 40, 450, 403]]]])
+            self.assertEqual(weights, {'person': .5, 'face': .5})
+            cached, _ = pascal_voc_clean_xml(parser, annotation_dir, ['person', 'face'])
+            self.assertEqual(cached, dumps)
+            writer = PascalVocWriter(annotation_dir, '1.jpg', (512, 512, 3))
+            writer.boxes.append(PostprocessedBox(1, 2, 3, 4, 'face', 0))
+            writer.save(os.path.join(annotation_dir, '1.xml'))
+            os.remove(os.path.join(annotation_dir, '2.xml'))
+            updated, weights = pascal_voc_clean_xml(parser, annotation_dir, ['person', 'face'])
+            self.assertEqual(sorted(updated), [['0.jpg', [512, 512, [['person', 60, 40, 430, 504],
+                                                                     ['face', 113, 40, 450, 403]]]],
+                                               ['1.jpg', [512, 512, [['face', 1, 2, 3, 4]]]]])
+            self.assertEqual(weights, {'person': 1 / 3, 'face': 2 / 3})
+
+    def testPascalVocParallelParse(self):
+        parser = namedtuple('Parser', ['logger', 'flags'])(logging.getLogger('test'), Flags())
+        with TemporaryDirectory() as annotation_dir:
+            for i in range(5):
+                writer = PascalVocWriter(annotation_dir, f'{i}.jpg', (512, 512, 3))
+                writer.boxes.append(PostprocessedBox(60, 40, 430, 504, 'person', 0))
+                writer.boxes.append(PostprocessedBox(113 + i, 40, 450, 403, 'face', 0))
+                writer.save(os.path.join(annotation_dir, f'{i}.xml'))
+            serial, weights = pascal_voc_clean_xml(parser, annotation_dir, ['person', 'face'])
+            os.remove(os.path.join(annotation_dir, ANNOTATION_INDEX))
+            parser.flags.workers = 2
+            parallel, parallel_weights = pascal_voc_clean_xml(parser, annotation_dir, ['person', 'face'])
+            self.assertEqual(sorted(parallel), sorted(serial))
+            self.assertEqual(parallel_weights, weights)
+
+    def testSharedFlagIO(self):
+        parent = SharedFlagIO()
+        parent.flags.model = 'tests/resources/test.cfg'
+        parent.flags.batch = 3
+        parent.send_flags()
+        try:
+            child = SharedFlagIO(subprogram=True)
+            self.assertEqual(child.flags.model, 'tests/resources/test.cfg')
+            self.assertEqual(child.flags.batch, 3)
+            child.flags.progress = 42.0
+            child.flags.error = 'Error'
+            child.flags.batch = 5
+            child.send_flags()
+            flags = parent.read_flags()
+            self.assertEqual(flags.progress, 42.0)
+            self.assertEqual(flags.error, 'Error')
+            self.assertEqual(flags.batch, 3)
+            parent.flags.kill = True
+            parent.send_flags()
+            self.assertTrue(child.read_flags().kill)
+            self.assertEqual(child.read_flags().progress, 42.0)
+            parent.flags.progress = 0.0
+            parent.send_flags()
+            self.assertEqual(child.read_flags().progress, 0.0)
+        finally:
+            parent.cleanup_flags()
+
+    def testSharedFlagIOTornRecord(self):
+        parent = SharedFlagIO()
+        parent.send_flags()
+        try:
+            child = SharedFlagIO(subprogram=True)
+            child.flags.progress = 42.0
+            child.send_flags()
+            self.assertEqual(parent.read_flags().progress, 42.0)
+            # a writer that died after marking the status record as being written
+            SEQUENCE.pack_into(parent.block.buf, STATUS_OFFSET, 7)
+            self.assertEqual(parent.read_flags().progress, 42.0)
+            with self.assertRaises(TimeoutError):
+                SharedFlagIO(subprogram=True)
+        finally:
+            parent.cleanup_flags()
+
+    def testSharedFlagBlockOwnership(self):
+        self.assertEqual(subprogram_env()[FLAG_BLOCK_ENV], f'{FLAG_BLOCK}_{os.getpid()}')
+        parent = SharedFlagIO()
+        parent.send_flags()
+        try:
+            other = SharedFlagIO()
+            other.read_flags()
+            other.cleanup_flags()
+            self.assertIsNotNone(SharedFlagIO(subprogram=True).read_flags())
+        finally:
+            parent.cleanup_flags()
+        self.assertIsNone(SharedFlagIO(subprogram=True).block)
+
+    def testProgressEvents(self):
+        read_fd, write_fd = os.pipe()
+        events = ProgressEvents(f'/dev/fd/{write_fd}')
+        os.close(write_fd)
+        events.progress('step', 25, 100, loss=1.5)
+        events.emit('done')
+        events.close()
+        with os.fdopen(read_fd) as pipe:
+            step, done = [json.loads(line) for line in pipe]
+        self.assertEqual(step['event'], 'step')
+        self.assertEqual(step['progress'], 25.0)
+        self.assertEqual(step['loss'], 1.5)
+        self.assertGreater(step['rate'], 0)
+        self.assertAlmostEqual(step['eta'], 75 / step['rate'])
+        self.assertEqual(done['event'], 'done')
+        ProgressEvents('').emit('ignored')
+
+    def testProgressEventsCloseOnError(self):
+        read_fd, write_fd = os.pipe()
+        with self.assertRaises(RuntimeError):
+            with ProgressEvents(f'/dev/fd/{write_fd}') as events:
+                os.close(write_fd)
+                events.emit('step')
+                raise RuntimeError('failed')
+        self.assertIsNone(events.file)
+        # the pipe only reaches end of file once the writer closed it
+        with os.fdopen(read_fd) as pipe:
+            self.assertEqual([json.loads(line)['event'] for line in pipe], ['step'])
+
+    def testCachedQueueLogger(self):
+        logger = get_logger()
+        self.assertIs(logger, get_logger())
+        self.assertEqual(logger.name, 'TestIO')
+        self.assertEqual([type(h).__name__ for h in logger.handlers], ['QueueHandler'])
+
+    def testThrottle(self):
+        every_third = Throttle(steps=3)
+        self.assertEqual([every_third() for _ in range(7)], [True, False, False, True, False, False, True])
+        once = Throttle(seconds=3600.)
+        self.assertEqual([once() for _ in range(3)], [True, False, False])
+
+    def testMetrics(self):
+        metrics = Metrics()
+        for _ in range(3):
+            with metrics.timed('forward'):
+                pass
+        self.assertEqual(list(metrics.timed_iter('data', range(4))), [0, 1, 2, 3])
+        metrics.counter('images').inc(8)
+        summary = metrics.summary()
+        self.assertEqual(summary['counters'], {'images': 8})
+        self.assertEqual(summary['histograms']['forward']['count'], 3)
+        self.assertEqual(summary['histograms']['data']['count'], 5)
+        histogram = Histogram()
+        for value in [.001] * 90 + [1.] * 10:
+            histogram.observe(value)
+        self.assertLess(histogram.quantile(.5), .002)
+        self.assertEqual(histogram.quantile(.99), 1.)
+        self.assertAlmostEqual(histogram.summary()['mean'], .1009)
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'summary', 'metrics.json')
+            metrics.write_json(path)
+            with open(path) as file:
+                self.assertEqual(json.load(file), json.loads(json.dumps(summary)))
+
+    def testCProfileWindow(self):
+        with TemporaryDirectory() as tmp:
+            profiler = Profiler('cprofile', tmp, start=1, steps=2)
+            for _ in range(4):
+                profiler.step()
+                self.assertEqual(profiler.active, profiler.count in [2, 3])
+            self.assertTrue(os.path.isfile(os.path.join(tmp, 'profile.prof')))
+        self.assertRaises(ValueError, Profiler, 'gprof', '')
@@ -0,0 +1,129 @@
+import gc
+import tracemalloc
+from types import SimpleNamespace
+from unittest import TestCase
+import numpy as np
+import tensorflow as tf
+from beagles.backend.darknet import create_darkop
+from beagles.backend.io.config_parser import ConfigParser
+from beagles.backend.net import Net, NetBuilder
+from beagles.backend.net.ops import op_create, fuse
+from tests.helpers import create_darkops
+
+
+class TestConvolutional(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.layer, = create_darkops([('convolutional', 0, 3, 3, 8, 1, 1, 1, 'leaky')], rng)
+        self.op = op_create(self.layer, None, 0, 0)
+        self.x = tf.constant(rng.normal(size=(2, 16, 16, 3)), tf.float32)
+
+    def testFoldedBatchNormMatchesInference(self):
+        w = self.layer.w
+        conv = tf.nn.conv2d(tf.pad(self.x, [[0, 0], [1, 1], [1, 1], [0, 0]]), w['kernel'], 1, 'VALID')
+        normed = (conv - w['moving_mean']) / np.sqrt(w['moving_variance'] + 1e-5) * w['gamma']
+        expected = tf.nn.leaky_relu(normed + w['biases'], alpha=.1)
+        np.testing.assert_allclose(self.op(self.x), expected, rtol=1e-4, atol=1e-4)
+
+    def testForwardPassesDoNotGrowMemory(self):
+        forward = tf.function(lambda x: self.op(x))
+        forward(self.x)
+        weights = len(self.op.weights)
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(1000):
+            forward(self.x)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual(weights, len(self.op.weights))
+        self.assertLess(after - before, 1 << 20)
+
+
+class TestFuse(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        darknet = create_darkops([
+            ('convolutional', 0, 3, 3, 8, 1, 1, 1, 'leaky'),
+            ('linear', 1),
+            ('maxpool', 2, 2, 2, 0),
+            ('convolutional', 3, 3, 8, 8, 1, 1, 1, 'leaky'),
+            ('route', 4, [3, 2]),
+            ('convolutional', 5, 1, 16, 4, 1, 0, 0, 'linear'),
+        ], rng)
+        self.layers = [op_create(layer, None, i, 0) for i, layer in enumerate(darknet)]
+        self.net = Net(self.layers, tf.Variable(0, trainable=False), dtype=tf.float32)
+        self.x = tf.constant(rng.normal(size=(2, 16, 16, 3)), tf.float32)
+
+    def testFusedNetMatchesNet(self):
+        expected = self.net.forward(self.x)
+        fused = self.net.optimize([16, 16, 3])
+        self.assertEqual(['convolutional', 'maxpool', 'convolutional', 'route', 'convolutional'],
+                         [layer.lay.type for layer in fused.layers])
+        self.assertEqual(0, len(fused.trainable_weights))
+        np.testing.assert_allclose(fused.forward(self.x), expected, rtol=1e-4, atol=1e-3)
+
+    def testRoutedIdentityIsKept(self):
+        self.net.forward(self.x)
+        self.layers[4].lay.routes = [3, 1]
+        fused = fuse(self.layers)
+        self.assertEqual(['convolutional', 'linear', 'maxpool', 'convolutional', 'route', 'convolutional'],
+                         [layer.lay.type for layer in fused])
+
+    def testParsedNetMatchesNet(self):
+        rng = np.random.default_rng(0)
+        meta, *darknet = ConfigParser.create('data/cfg/yolov2-lite-batchnorm.cfg')
+        darknet = create_darkops(darknet, rng)
+        net = Net([op_create(layer, None, i, 0) for i, layer in enumerate(darknet)],
+                  tf.Variable(0, trainable=False), dtype=tf.float32)
+        x = tf.constant(rng.uniform(size=(1, *meta['inp_size'])), tf.float32)
+        expected = net.forward(x)
+        fused = net.optimize(meta['inp_size'])
+        self.assertEqual([layer.type for layer in darknet], [layer.lay.type for layer in fused.layers])
+        np.testing.assert_allclose(fused.forward(x), expected, rtol=1e-4)
+
+
+class TestConvolutionalActivation(TestCase):
+    """YOLOv2 outputs with activations applied by Convolutional, against the standalone activation
+    ops the config parser yields after every convolution and that were dropped before"""
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        sections = list(ConfigParser.create('tests/resources/yolov2-lite-3c.cfg'))
+        self.meta = sections[0]
+        # zero centred weights, so activations see negative inputs
+        self.darknet = create_darkops(sections[1:], rng,
+                                      lambda rng, shape: rng.normal(size=shape) / np.sqrt(np.prod(shape[:-1])))
+        self.layers = [op_create(layer, None, i, 0) for i, layer in enumerate(self.darknet)]
+        self.x = tf.constant(rng.normal(size=(2, *self.meta['inp_size'])), tf.float32)
+
+    def testLeakyConvolutionsMatchStandaloneActivation(self):
+        expected = self.x
+        for layer in self.layers:
+            if layer.lay.type != 'convolutional':
+                expected = layer(expected)
+                continue
+            activation = layer.activation
+            layer.activation = 'linear'
+            before = layer(expected)
+            layer.activation = activation
+            expected = op_create(create_darkop(activation, layer.lay.number), None, layer.lay.number, 0)(before)
+        self.assertEqual('linear', self.darknet[-1].activation)
+        self.assertIn('leaky', [layer.activation for layer in self.darknet if layer.type == 'convolutional'])
+        net = Net(self.layers, tf.Variable(0, trainable=False), dtype=tf.float32)
+        np.testing.assert_allclose(net.forward(self.x), expected, rtol=1e-4, atol=1e-4)
+
+    def testBuilderGatesActivations(self):
+        sections = list(ConfigParser.create('data/cfg/yolov3-tiny.cfg'))
+        yolov3 = sections[0], create_darkops(sections[1:], np.random.default_rng(0))
+        for activations, (meta, darknet), linear in [(False, (self.meta, self.darknet), True),
+                                                     (True, (self.meta, self.darknet), False),
+                                                     (False, yolov3, False)]:
+            builder = SimpleNamespace(flags=SimpleNamespace(activations=activations), meta=meta,
+                                      darknet=SimpleNamespace(layers=darknet),
+                                      num_layer=len(darknet), ntrain=len(darknet))
+            convolutions = [(layer.lay.activation, layer.activation) for layer in NetBuilder.compile_darknet(builder)
+                            if layer.lay.type == 'convolutional']
+            self.assertIn('leaky', [lay for lay, _ in convolutions])
+            for lay, activation in convolutions:
+                self.assertEqual('linear' if linear else lay, activation)
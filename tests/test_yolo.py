@@ -0,0 +1,347 @@
+import sys
+import logging
+import importlib
+from types import SimpleNamespace
+from unittest import TestCase
+import numpy as np
+from beagles.backend.net.frameworks.yolo import data as yolo_data
+from beagles.backend.net.frameworks.yolo.data import encode_targets
+from beagles.backend.net.frameworks.yolov2 import predict
+from beagles.backend.net.frameworks.yolov3 import data as yolov3_data, predict as yolov3_predict
+from beagles.backend.io.config_parser import ConfigParser
+from beagles.backend.net.frameworks.extensions import numpy_nms
+
+
+def loop_targets(allobj, w, h, H, W, B, C, labels):
+    """Per-object regression target loop encode_targets replaced"""
+    allobj = [list(obj) for obj in allobj]
+    cellx = 1. * w / W
+    celly = 1. * h / H
+    for obj in allobj:
+        centerx = .5 * (obj[1] + obj[3])  # xmin, xmax
+        centery = .5 * (obj[2] + obj[4])  # ymin, ymax
+        cx = centerx / cellx
+        cy = centery / celly
+        if cx >= W or cy >= H:
+            return None
+        obj[3] = float(obj[3] - obj[1]) / w
+        obj[4] = float(obj[4] - obj[2]) / h
+        obj[3] = np.sqrt(obj[3])
+        obj[4] = np.sqrt(obj[4])
+        obj[1] = cx - np.floor(cx)  # centerx
+        obj[2] = cy - np.floor(cy)  # centery
+        obj += [int(np.floor(cy) * W + np.floor(cx))]
+
+    probs = np.zeros([H * W, B, C])
+    confs = np.zeros([H * W, B])
+    coord = np.zeros([H * W, B, 4])
+    proid = np.zeros([H * W, B, C])
+    prear = np.zeros([H * W, 4])
+    for obj in allobj:
+        probs[obj[5], :, :] = [[0.] * C] * B
+        probs[obj[5], :, labels.index(obj[0])] = 1.
+        proid[obj[5], :, :] = [[1.] * C] * B
+        coord[obj[5], :, :] = [obj[1:5]] * B
+        prear[obj[5], 0] = obj[1] - obj[3] ** 2 * .5 * W  # xleft
+        prear[obj[5], 1] = obj[2] - obj[4] ** 2 * .5 * H  # yup
+        prear[obj[5], 2] = obj[1] + obj[3] ** 2 * .5 * W  # xright
+        prear[obj[5], 3] = obj[2] + obj[4] ** 2 * .5 * H  # ybot
+        confs[obj[5], :] = [1.] * B
+
+    upleft = np.expand_dims(prear[:, 0:2], 1)
+    botright = np.expand_dims(prear[:, 2:4], 1)
+    wh = botright - upleft
+    area = wh[:, :, 0] * wh[:, :, 1]
+    upleft = np.concatenate([upleft] * B, 1)
+    botright = np.concatenate([botright] * B, 1)
+    areas = np.concatenate([area] * B, 1)
+    return {
+        '_probs': probs, '_confs': confs,
+        '_coord': coord, '_proid': proid,
+        '_areas': areas, '_upleft': upleft,
+        '_botright': botright
+    }
+
+
+class TestYoloTargets(TestCase):
+    labels = ['RBC', 'WBC', 'Platelets']
+
+    def random_objects(self, rng, n, w, h):
+        objs = list()
+        for _ in range(n):
+            x0, y0 = rng.integers(0, w - 1), rng.integers(0, h - 1)
+            x1, y1 = rng.integers(x0 + 1, w + 1), rng.integers(y0 + 1, h + 1)
+            label = self.labels[rng.integers(len(self.labels))]
+            objs.append([label, int(x0), int(y0), int(x1), int(y1)])
+        return objs
+
+    def assertTargetsEqual(self, allobj, w, h, grid, B):
+        H, W = (grid, grid) if np.isscalar(grid) else grid[:2]
+        C = len(self.labels)
+        expected = loop_targets(allobj, w, h, H, W, B, C, self.labels)
+        boxes = [[self.labels.index(obj[0])] + obj[1:5] for obj in allobj]
+        actual = encode_targets(boxes, (w, h), grid, B, C)
+        for key, value in expected.items():
+            self.assertEqual(actual[key].dtype, value.dtype, key)
+            np.testing.assert_array_equal(actual[key], value, key)
+
+    def testEncodeTargetsMatchesLoopYoloV2(self):
+        rng = np.random.default_rng(0)
+        for n in [1, 2, 12, 60]:
+            allobj = self.random_objects(rng, n, 416, 416)
+            self.assertTargetsEqual(allobj, 416, 416, [13, 13, 40], 5)
+
+    def testEncodeTargetsMatchesLoopYolo(self):
+        rng = np.random.default_rng(1)
+        for n in [1, 7, 49]:
+            allobj = self.random_objects(rng, n, 640, 480)
+            self.assertTargetsEqual(allobj, 640, 480, 7, 2)
+
+    def testEncodeTargetsSharedCell(self):
+        allobj = [['RBC', 10, 10, 20, 20], ['WBC', 12, 12, 18, 30], ['Platelets', 300, 300, 400, 400]]
+        self.assertTargetsEqual(allobj, 416, 416, [13, 13, 40], 5)
+
+    def testEncodeTargetsEmpty(self):
+        feed = encode_targets([], (416, 416), 13, 5, 3)
+        self.assertTrue(all(not value.any() for value in feed.values()))
+
+    def testEncodeTargetsOutsideGrid(self):
+        boxes = [[0, 10, 10, 20, 20], [1, 400, 400, 500, 500]]
+        self.assertIsNone(encode_targets(boxes, (416, 416), 13, 5, 3))
+
+    def testEncodeTargetsInPlace(self):
+        shape = [13 * 13, 5, 3]
+        feed = {'_probs': np.zeros(shape, np.float32), '_confs': np.zeros(shape[:2], np.float32),
+                '_coord': np.zeros(shape[:2] + [4], np.float32), '_proid': np.zeros(shape, np.float32),
+                '_areas': np.zeros(shape[:2], np.float32), '_upleft': np.zeros(shape[:2] + [2], np.float32),
+                '_botright': np.zeros(shape[:2] + [2], np.float32)}
+        result = encode_targets([[2, 10, 10, 40, 40]], (416, 416), 13, 5, 3, feed)
+        self.assertIs(result, feed)
+        self.assertEqual(feed['_probs'][0, :, 2].tolist(), [1.] * 5)
+
+
+class TestDataset(TestCase):
+    def setUp(self):
+        flags = SimpleNamespace(batch=4, epoch=2, parallel_calls=2, size=0)
+        self.framework = SimpleNamespace(flags=flags, logger=logging.getLogger('test'), meta={'inp_size': [2, 2, 3]},
+                                         feed_buffers=lambda size: {'_confs': np.zeros([size, 5], np.float32)},
+                                         batch=self.instance)
+
+    @staticmethod
+    def instance(chunk, feed=None):
+        """Instances named `bad` have a box outside the grid"""
+        if chunk[0] == 'bad':
+            return None, None
+        return np.full([2, 2, 3], chunk[1], np.float32), {'_confs': np.full([5], chunk[1], np.float32)}
+
+    def testSkippedInstancesKeepBatchesFull(self):
+        data = [('good', i) for i in range(10)]
+        data[3] = data[7] = ('bad', -1)
+        pipeline = yolo_data.dataset(self.framework, data)
+        x_spec, feed_spec = pipeline.element_spec
+        self.assertEqual([4, 2, 2, 3], x_spec.shape.as_list())
+        self.assertEqual([4, 5], feed_spec['_confs'].shape.as_list())
+        batches = list(pipeline)
+        # 10 instances make 2 batches of 4 per epoch, bad ones are replaced by the next good one
+        self.assertEqual(4, len(batches))
+        for x_batch, feed in batches:
+            self.assertEqual([4, 2, 2, 3], x_batch.shape.as_list())
+            self.assertEqual([4, 5], feed['_confs'].shape.as_list())
+            self.assertTrue((x_batch.numpy() >= 0).all())
+
+
+class TestYoloV2Decoder(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.meta = {'out_size': [13, 13, 40], 'classes': 3, 'num': 5, 'thresh': .1,
+                     'nms_thresh': .4, 'nms_method': 'hard', 'nms_sigma': .5,
+                     'anchors': rng.uniform(.5, 5., 10).tolist()}
+        self.net_out = rng.normal(0., 2., [13, 13, 40]).astype(np.float32)
+
+    def testSoftmaxMatchesPerAnchor(self):
+        probs, bbox = predict.box_decoder(self.meta, self.net_out)
+        cells = self.net_out.reshape([13 * 13 * 5, 8]).astype(np.float64)
+        for cell, prob, box in zip(cells, probs, bbox):
+            conf = 1. / (1. + np.exp(-cell[4]))
+            expected = np.exp(cell[5:] - cell[5:].max()) / np.exp(cell[5:] - cell[5:].max()).sum() * conf
+            expected = expected.astype(np.float32)
+            expected[expected <= np.float32(self.meta['thresh'])] = 0.
+            np.testing.assert_array_equal(prob, expected)
+            self.assertEqual(box[4], np.float32(conf))
+
+    def testCompiledDecoderMatchesNumpy(self):
+        if predict.box_constructor is None:
+            self.skipTest('cy_yolo2_findboxes is not compiled')
+        from beagles.backend.net.frameworks.extensions.cy_yolo2_findboxes import box_decoder
+        for actual, expected in zip(box_decoder(self.meta, self.net_out),
+                                    predict.box_decoder(self.meta, self.net_out)):
+            np.testing.assert_array_equal(actual, expected)
+        compiled = predict.box_constructor(self.meta, self.net_out)
+        fallback = predict.numpy_box_constructor(self.meta, self.net_out)
+        self.assertEqual([(b.x, b.y, b.w, b.h) for b in compiled], [(b.x, b.y, b.w, b.h) for b in fallback])
+
+    def testCompiledFindboxesAcceptsReadOnlyOutput(self):
+        if predict.box_constructor is None:
+            self.skipTest('cy_yolo2_findboxes is not compiled')
+        net_out = self.net_out.copy()
+        net_out.setflags(write=False)
+        found = predict.findboxes(SimpleNamespace(meta=self.meta), net_out)
+        expected = predict.numpy_box_constructor(self.meta, self.net_out)
+        self.assertEqual([(b.x, b.y, b.w, b.h) for b in found], [(b.x, b.y, b.w, b.h) for b in expected])
+        np.testing.assert_array_equal(net_out, self.net_out)
+
+
+class TestYoloV3(TestCase):
+    def setUp(self):
+        self.meta = {'heads': [[13, 13, [3, 4, 5]], [26, 26, [0, 1, 2]]], 'classes': 3, 'num': 6,
+                     'inp_size': [416, 416, 3], 'thresh': .5,
+                     'nms_thresh': .4, 'nms_method': 'hard', 'nms_sigma': .5,
+                     'anchors': [10, 14, 23, 27, 37, 58, 81, 82, 135, 169, 344, 319]}
+        self.rows = 13 * 13 * 3 + 26 * 26 * 3
+
+    def testConfigHeads(self):
+        config = ConfigParser.create('data/cfg/yolov3-tiny.cfg')
+        meta = next(config)
+        layers = list(config)
+        self.assertEqual(meta['type'], '[yolo]')
+        self.assertEqual(meta['heads'], [[13, 13, [3, 4, 5]], [26, 26, [0, 1, 2]]])
+        self.assertEqual(layers[19], ['upsample', 19, 2, 26, 26])
+        self.assertEqual(layers[20], ['route', 20, [19, 8]])
+        self.assertEqual(layers[21][3], 128 + 256)
+
+    def testEncodedTargetsDecodeAcrossScales(self):
+        w, h = 832, 416
+        # the large box is matched to an anchor of the 13x13 head, the small one to the 26x26 head
+        boxes = np.array([[2, 300, 50, 700, 380], [1, 100, 100, 130, 130]], dtype=np.float64)
+        feed = yolov3_data.encode_targets(boxes, (w, h), self.meta)
+        self.assertEqual(feed['_confs'].sum(), 2)
+        slots = np.flatnonzero(feed['_confs'])
+        self.assertTrue(slots[0] < 13 * 13 * 3 <= slots[1])
+
+        net_out = np.full([self.rows, 8], -20., dtype=np.float32)
+        coord = feed['_coord'][slots]
+        net_out[slots, 0:2] = np.log(coord[:, 0:2] / (1. - coord[:, 0:2]))
+        net_out[slots, 2:4] = coord[:, 2:4]
+        net_out[slots, 4] = 20.
+        net_out[slots, 5:] = np.where(feed['_probs'][slots] > 0, 20., -20.)
+        found = yolov3_predict.numpy_box_constructor(self.meta, net_out.ravel())
+        self.assertEqual(len(found), 2)
+        expected = [[500 / w, 215 / h, 400 / w, 330 / h], [115 / w, 115 / h, 30 / w, 30 / h]]
+        np.testing.assert_allclose(np.stack([found.x, found.y, found.w, found.h], 1), expected, atol=1e-5)
+        np.testing.assert_array_equal(np.argmax(found.probs, 1), [2, 1])
+
+    def testEncodeTargetsOutsideImage(self):
+        self.assertIsNone(yolov3_data.encode_targets([[0, 410, 0, 430, 10]], (416, 416), self.meta))
+
+    def testCompiledDecoderMatchesNumpy(self):
+        if yolov3_predict.box_constructor is None:
+            self.skipTest('cy_yolo3_findboxes is not compiled')
+        from beagles.backend.net.frameworks.extensions.cy_yolo3_findboxes import box_decoder
+        net_out = np.random.default_rng(3).normal(0., 2., self.rows * 8).astype(np.float32)
+        for actual, expected in zip(box_decoder(self.meta, net_out), yolov3_predict.box_decoder(self.meta, net_out)):
+            np.testing.assert_array_equal(actual, expected)
+        compiled = yolov3_predict.box_constructor(self.meta, net_out)
+        fallback = yolov3_predict.numpy_box_constructor(self.meta, net_out)
+        self.assertEqual([(b.x, b.y, b.w, b.h) for b in compiled], [(b.x, b.y, b.w, b.h) for b in fallback])
+
+    def testCompiledFindboxesAcceptsReadOnlyOutput(self):
+        if yolov3_predict.box_constructor is None:
+            self.skipTest('cy_yolo3_findboxes is not compiled')
+        net_out = np.random.default_rng(3).normal(0., 2., self.rows * 8).astype(np.float32)
+        net_out.setflags(write=False)
+        found = yolov3_predict.findboxes(SimpleNamespace(meta=self.meta), net_out)
+        expected = yolov3_predict.numpy_box_constructor(self.meta, net_out)
+        self.assertEqual([(b.x, b.y, b.w, b.h) for b in found], [(b.x, b.y, b.w, b.h) for b in expected])
+
+
+class TestNMS(TestCase):
+    # three boxes of class 0, the second overlaps the first by IOU .54, the third is disjoint
+    bbox = np.array([[.3, .3, .2, .2, .9], [.36, .3, .2, .2, .8], [.8, .8, .1, .1, .7]], dtype=np.float32)
+    probs = np.array([[.5, 0.], [.9, .2], [.3, 0.]], dtype=np.float32)
+
+    def engines(self):
+        engines = [numpy_nms.batch_nms]
+        try:
+            from beagles.backend.net.frameworks.extensions.nms import batch_nms
+        except ImportError:
+            pass
+        else:
+            engines.append(batch_nms)
+        return engines
+
+    def testSuppressesLowerScoreOfSameClass(self):
+        for batch_nms in self.engines():
+            boxes, = batch_nms(self.probs[None], self.bbox[None], .4)
+            np.testing.assert_array_equal(boxes.probs, self.probs[1:])
+            self.assertEqual(boxes[0].x, np.float32(.36))
+
+    def testIOUThreshold(self):
+        for batch_nms in self.engines():
+            boxes, = batch_nms(self.probs[None], self.bbox[None], .7)
+            self.assertEqual(len(boxes), 3)
+            self.assertEqual(boxes[0].probs[0], np.float32(.5))
+
+    def testSoftNMSDecaysOverlappingScores(self):
+        iou = .028 / .052
+        for batch_nms in self.engines():
+            linear, = batch_nms(self.probs[None], self.bbox[None], .4, 'linear')
+            self.assertAlmostEqual(float(linear[0].probs[0]), .5 * (1. - iou), places=6)
+            gaussian, = batch_nms(self.probs[None], self.bbox[None], .4, 'gaussian', .5)
+            self.assertAlmostEqual(float(gaussian[0].probs[0]), .5 * np.exp(-iou ** 2 / .5), places=6)
+            pruned, = batch_nms(self.probs[None], self.bbox[None], .4, 'linear', .5, .3)
+            self.assertEqual(len(pruned), 2)
+
+    def testDIoUPenalizesCenterDistance(self):
+        # the first pair has IOU .538 and DIoU .505 once their center distance is taken off
+        for batch_nms in self.engines():
+            self.assertEqual(len(batch_nms(self.probs[None], self.bbox[None], .52, 'hard')[0]), 2)
+            self.assertEqual(len(batch_nms(self.probs[None], self.bbox[None], .52, 'diou')[0]), 3)
+            self.assertEqual(len(batch_nms(self.probs[None], self.bbox[None], .5, 'diou')[0]), 2)
+
+    def testUnknownMethod(self):
+        for batch_nms in self.engines():
+            with self.assertRaises(ValueError):
+                batch_nms(self.probs[None], self.bbox[None], .4, 'box')
+
+    def testBatchMatchesSingleImages(self):
+        probs = np.stack([self.probs, np.zeros_like(self.probs), self.probs[::-1]])
+        bbox = np.stack([self.bbox, self.bbox, self.bbox[::-1]])
+        for batch_nms in self.engines():
+            batched = batch_nms(probs, bbox, .4)
+            self.assertEqual(len(batched), 3)
+            self.assertEqual(len(batched[1]), 0)
+            for i, boxes in enumerate(batched):
+                np.testing.assert_array_equal(boxes, numpy_nms.nms(probs[i], bbox[i], .4))
+
+
+class TestWithoutExtensions(TestCase):
+    EXTENSIONS = ['nms', 'cy_yolo_findboxes', 'cy_yolo2_findboxes', 'cy_yolo3_findboxes']
+    PREDICT = ['yolo', 'yolov2', 'yolov3']
+
+    def setUp(self):
+        # a None entry makes importing the module raise ImportError
+        names = [f'beagles.backend.net.frameworks.extensions.{name}' for name in self.EXTENSIONS]
+        names += [f'beagles.backend.net.frameworks.{name}.predict' for name in self.PREDICT]
+        self.saved = {name: sys.modules.pop(name, None) for name in names}
+        sys.modules.update({name: None for name in names[:len(self.EXTENSIONS)]})
+
+    def tearDown(self):
+        for name, module in self.saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+    def testPredictFallsBackToNumpy(self):
+        yolo, yolov2, yolov3 = [importlib.import_module(f'beagles.backend.net.frameworks.{name}.predict')
+                                for name in self.PREDICT]
+        self.assertIsNone(yolo.yolo_box_constructor)
+        self.assertIsNone(yolov2.box_constructor)
+        self.assertIsNone(yolov3.box_constructor)
+        decoder = TestYoloV2Decoder()
+        decoder.setUp()
+        found = yolov2.findboxes(SimpleNamespace(meta=decoder.meta), decoder.net_out)
+        expected = yolov2.numpy_box_constructor(decoder.meta, decoder.net_out)
+        self.assertGreater(len(found), 0)
+        self.assertEqual([(b.x, b.y, b.w, b.h) for b in found], [(b.x, b.y, b.w, b.h) for b in expected])
+        self.assertRaises(ImportError, yolo.findboxes, SimpleNamespace(meta={}, flags=SimpleNamespace(threshold=.1)), [])